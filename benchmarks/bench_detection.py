@@ -0,0 +1,139 @@
+"""
+Component construction and type detection benchmark for streamlit_rich_message_history.
+
+Measures how long creating a MessageComponent and detecting its type take for
+a sample of every built-in component type, and how detection time grows with
+the number of registered custom detectors: value-dependent ones, which run for
+every piece of content, cacheable ones, whose result is memoized per class,
+and ones with a ``types`` hint that does not match the content.
+
+Usage:
+    python -m benchmarks.bench_detection [--number N] [--detectors N [N ...]]
+"""
+
+import argparse
+import json
+from typing import Any, Dict, Mapping, Sequence, Tuple
+
+from benchmarks.common import restore_registry, snapshot_registry, time_per_call
+from streamlit_rich_message_history import MessageComponent
+from streamlit_rich_message_history.enums import ComponentRegistry
+
+
+def builtin_samples() -> Dict[str, Tuple[Any, Mapping[str, Any]]]:
+    """
+    Create a piece of content for every built-in component type.
+
+    Returns:
+        dict: Mapping of type name to (content, kwargs)
+    """
+    import matplotlib
+
+    matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+    import pandas as pd
+    import plotly.graph_objects as go
+
+    fig, ax = plt.subplots()
+    ax.plot([1, 2, 3])
+    return {
+        "text": ("Hello, **world**!", {}),
+        "error": ("Something went wrong", {"is_error": True}),
+        "code": ("print('hello')", {"is_code": True, "language": "python"}),
+        "html": ("<b>bold</b>", {"is_html": True}),
+        "dataframe": (pd.DataFrame({"a": range(10), "b": range(10)}), {}),
+        "series": (pd.Series(range(10)), {}),
+        "matplotlib_figure": (fig, {}),
+        "plotly_figure": (go.Figure(go.Bar(y=[1, 2, 3])), {}),
+        "number": (42, {}),
+        "metric": (42, {"is_metric": True, "title": "Answer"}),
+        "table": ([["a", 1], ["b", 2]], {"is_table": True}),
+        "json": ({"key": "value"}, {"is_json": True}),
+        "list": (["one", "two"], {}),
+        "tuple": (("one", "two"), {}),
+        "dict": ({"one": 1}, {}),
+    }
+
+
+def measure_construction(number: int = 20000, repeat: int = 5) -> dict:
+    """
+    Measure construction and detection time for every built-in type.
+
+    Args:
+        number: Number of components created per sample
+        repeat: Number of samples
+
+    Returns:
+        dict: Microseconds per construction and per detection, by type
+    """
+    construct = {}
+    detect = {}
+    for name, (content, kwargs) in builtin_samples().items():
+        component = MessageComponent(content, **kwargs)
+        construct[name] = 1e6 * time_per_call(
+            lambda: MessageComponent(content, **kwargs), number, repeat
+        )
+        detect[name] = 1e6 * time_per_call(
+            lambda: component._detect_component_type(content), number, repeat
+        )
+    return {"construct_us": construct, "detect_us": detect}
+
+
+def measure_custom_detectors(
+    counts: Sequence[int] = (0, 10, 100), number: int = 20000, repeat: int = 5
+) -> dict:
+    """
+    Measure text component construction with registered custom detectors.
+
+    None of the detectors match, so every construction falls through all of
+    them to the built-in type, which is the slowest case.
+
+    Args:
+        counts: Numbers of custom detectors to register
+        number: Number of components created per sample
+        repeat: Number of samples
+
+    Returns:
+        dict: Microseconds per construction for each kind and number of
+              detectors
+    """
+    kinds = {
+        "value": {},
+        "cacheable": {"cacheable": True},
+        "typed": {"types": bytes},
+    }
+    results: Dict[str, Dict[str, float]] = {f"{kind}_us": {} for kind in kinds}
+    snapshot = snapshot_registry()
+    try:
+        for kind, options in kinds.items():
+            for count in counts:
+                restore_registry(snapshot)
+                for i in range(count):
+                    comp_type = ComponentRegistry.register_component_type(
+                        f"bench_{kind}_{i}"
+                    )
+                    ComponentRegistry.register_detector(
+                        comp_type, lambda content, kwargs: False, **options
+                    )
+                results[f"{kind}_us"][str(count)] = 1e6 * time_per_call(
+                    lambda: MessageComponent("Hello"), number, repeat
+                )
+    finally:
+        restore_registry(snapshot)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--number", type=int, default=20000)
+    parser.add_argument("--detectors", type=int, nargs="+", default=[0, 10, 100])
+    args = parser.parse_args()
+    results = {
+        **measure_construction(args.number),
+        "custom_detectors": measure_custom_detectors(args.detectors, args.number),
+    }
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
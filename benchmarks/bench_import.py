@@ -0,0 +1,63 @@
+"""
+Import-time benchmark for streamlit_rich_message_history.
+
+Each sample runs in a fresh interpreter and measures how long importing the
+package takes on top of ``import streamlit``, which every app pays anyway.
+
+Usage:
+    python -m benchmarks.bench_import [--repeat N]
+"""
+
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+
+PROBE = """
+import json, sys, time
+import streamlit
+before = set(sys.modules)
+start = time.perf_counter()
+import streamlit_rich_message_history
+elapsed = time.perf_counter() - start
+print(json.dumps({"seconds": elapsed, "modules": len(set(sys.modules) - before)}))
+"""
+
+
+def measure_import(repeat: int = 5) -> dict:
+    """
+    Measure the package import time in fresh interpreters.
+
+    Args:
+        repeat: Number of interpreters to sample
+
+    Returns:
+        dict: Median and minimum import time in milliseconds, and the number of
+              modules the package import added to ``sys.modules``
+    """
+    samples = []
+    modules = 0
+    for _ in range(repeat):
+        result = subprocess.run(
+            [sys.executable, "-c", PROBE], capture_output=True, text=True, check=True
+        )
+        sample = json.loads(result.stdout)
+        samples.append(sample["seconds"] * 1000)
+        modules = sample["modules"]
+    return {
+        "median_ms": statistics.median(samples),
+        "min_ms": min(samples),
+        "modules_loaded": modules,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+    print(json.dumps(measure_import(args.repeat), indent=2))
+
+
+if __name__ == "__main__":
+    main()
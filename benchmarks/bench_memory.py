@@ -0,0 +1,162 @@
+"""
+Per-component memory benchmark for streamlit_rich_message_history.
+
+Measures the memory held by MessageComponent and Message objects themselves
+(their content is shared between samples and not counted) and compares it with
+the attribute layout used before the classes were slotted, with an instance
+``__dict__`` per object. It also
+measures the memory allocated per message including its content, for a few
+typical message shapes.
+
+Usage:
+    python -m benchmarks.bench_memory [--count N]
+"""
+
+import argparse
+import json
+import tracemalloc
+from typing import Callable, List
+
+from streamlit_rich_message_history import (
+    AssistantMessage,
+    Message,
+    MessageComponent,
+    UserMessage,
+)
+
+
+class DictLayoutComponent:
+    """The attributes of MessageComponent in an instance __dict__, as before __slots__."""
+
+    def __init__(self, component: MessageComponent):
+        self.content = component.content
+        self.kwargs = dict(component.kwargs)
+        self.component_type = component.component_type
+        self.title = component.title
+        self.description = component.description
+        self.expanded = component.expanded
+        self._children = None
+        self._memory_usage = None
+        self._lazy = None
+        self._key = None
+        self._spill_file = None
+
+
+class DictLayoutMessage:
+    """Message attribute layout before __slots__."""
+
+    def __init__(self, user: str, avatar: str):
+        self.user = user
+        self.avatar = avatar
+        self.components: List = []
+
+
+def bytes_per_object(factory: Callable[[], object], count: int) -> float:
+    """
+    Measure the average memory allocated per object created by factory.
+
+    Args:
+        factory: Zero-argument callable creating one object
+        count: Number of objects to create
+
+    Returns:
+        float: Average number of bytes allocated per object
+    """
+    tracemalloc.start()
+    baseline, _ = tracemalloc.get_traced_memory()
+    objects = [factory() for _ in range(count)]
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    # Exclude the list holding the objects
+    overhead = current - baseline - objects.__sizeof__()
+    return overhead / count
+
+
+def measure_memory(count: int = 10000) -> dict:
+    """
+    Measure per-object overhead of the current and the dict-based layouts.
+
+    Args:
+        count: Number of objects to create per measurement
+
+    Returns:
+        dict: Bytes per object for each layout and the relative saving
+    """
+    text = "Hello, **world**!"
+    sample = MessageComponent(text)
+    results = {
+        "component_bytes": bytes_per_object(lambda: MessageComponent(text), count),
+        "component_bytes_dict_layout": bytes_per_object(
+            lambda: DictLayoutComponent(sample), count
+        ),
+        "message_bytes": bytes_per_object(lambda: Message("user", "👤"), count),
+        "message_bytes_dict_layout": bytes_per_object(
+            lambda: DictLayoutMessage("user", "👤"), count
+        ),
+    }
+    results["component_saving"] = 1 - (
+        results["component_bytes"] / results["component_bytes_dict_layout"]
+    )
+    results["message_saving"] = 1 - (
+        results["message_bytes"] / results["message_bytes_dict_layout"]
+    )
+    return results
+
+
+def measure_message_memory(count: int = 2000) -> dict:
+    """
+    Measure the memory allocated per message, content included.
+
+    Args:
+        count: Number of messages to create per measurement
+
+    Returns:
+        dict: Bytes per message for a user text message, an assistant message
+              with text, code and a list, and one with a 100-row DataFrame, and
+              per message of a history as built by the render benchmark
+    """
+    import pandas as pd
+
+    from benchmarks.bench_render import build_history
+
+    def assistant_message() -> Message:
+        message = AssistantMessage("🤖")
+        message.add_text("Answer with **markdown**")
+        message.add_code("SELECT * FROM table", language="sql")
+        message.add_list(["first", "second", 3])
+        return message
+
+    def dataframe_message() -> Message:
+        message = AssistantMessage("🤖")
+        message.add_dataframe(pd.DataFrame({"a": range(100), "b": range(100)}))
+        return message
+
+    history_count = max(count // 10, 1)
+    tracemalloc.start()
+    baseline, _ = tracemalloc.get_traced_memory()
+    history = build_history(history_count)
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    assert len(history.messages) == history_count
+
+    return {
+        "user_text_bytes": bytes_per_object(
+            lambda: UserMessage("👤", "Question"), count
+        ),
+        "assistant_bytes": bytes_per_object(assistant_message, count),
+        "dataframe_bytes": bytes_per_object(dataframe_message, count // 10 or 1),
+        "history_bytes": (current - baseline) / history_count,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--count", type=int, default=10000)
+    args = parser.parse_args()
+    results = measure_memory(args.count)
+    results["per_message"] = measure_message_memory()
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
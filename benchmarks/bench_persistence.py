@@ -0,0 +1,186 @@
+"""
+Persistence benchmark for streamlit_rich_message_history.
+
+Measures the storage backends on histories as built by the render benchmark:
+saving and loading a history file, appending to and replaying a MessageLog,
+and appending to, reopening and querying a SQLiteMessageStore. Replayed and
+queried messages are rendered once with the NullBackend standing in for
+Streamlit, so that decoding them and reading their DataFrames is counted.
+
+Usage:
+    python -m benchmarks.bench_persistence [--size N] [--repeat N]
+"""
+
+import argparse
+import itertools
+import json
+import os
+import tempfile
+from typing import Iterable
+
+from benchmarks.bench_render import build_history
+from benchmarks.common import time_per_call
+from streamlit_rich_message_history.backends import NullBackend, use_render_backend
+from streamlit_rich_message_history.message_log import MessageLog
+from streamlit_rich_message_history.messages import Message
+from streamlit_rich_message_history.serialization import (
+    load_messages,
+    save_messages,
+)
+from streamlit_rich_message_history.sqlite_store import SQLiteMessageStore
+
+
+def render_messages(messages: Iterable[Message]) -> None:
+    """
+    Render messages with the NullBackend, reading their deferred payloads.
+
+    Args:
+        messages: The messages to render
+    """
+    with use_render_backend(NullBackend()):
+        for message in messages:
+            message.render()
+
+
+def measure_save_load(size: int = 1000, repeat: int = 3) -> dict:
+    """
+    Measure saving a history to a file and loading it back.
+
+    Args:
+        size: Number of messages
+        repeat: Number of samples
+
+    Returns:
+        dict: Milliseconds to save, to load the message index, and to load and
+              render every message, and the size of the file
+    """
+    messages = list(build_history(size).messages)
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "history.srmh")
+        save = time_per_call(lambda: save_messages(messages, path), 1, repeat)
+        load = time_per_call(lambda: load_messages(path), 1, repeat)
+        load_render = time_per_call(
+            lambda: render_messages(load_messages(path)), 1, repeat
+        )
+        file_bytes = os.path.getsize(path)
+    return {
+        "save_ms": save * 1e3,
+        "load_ms": load * 1e3,
+        "load_and_render_ms": load_render * 1e3,
+        "file_bytes": file_bytes,
+    }
+
+
+def measure_message_log(size: int = 1000, repeat: int = 3) -> dict:
+    """
+    Measure appending to a MessageLog and replaying it.
+
+    Args:
+        size: Number of messages
+        repeat: Number of samples
+
+    Returns:
+        dict: Microseconds per appended message, milliseconds to reopen the log,
+              which only reads the record headers, and to reopen it and render
+              every message
+    """
+    messages = list(build_history(size).messages)
+    with tempfile.TemporaryDirectory() as directory:
+        paths = (os.path.join(directory, f"{i}.log") for i in itertools.count())
+        path = ""
+
+        def append_all() -> None:
+            nonlocal path
+            path = next(paths)
+            log = MessageLog(path)
+            for message in messages:
+                log.append(message)
+            log.close()
+
+        def replay(render: bool) -> None:
+            log = MessageLog(path)
+            if render:
+                render_messages(log)
+            log.close()
+
+        append = time_per_call(append_all, 1, repeat)
+        reopen = time_per_call(lambda: replay(False), 1, repeat)
+        replay_render = time_per_call(lambda: replay(True), 1, repeat)
+    return {
+        "append_us": append * 1e6 / size,
+        "reopen_ms": reopen * 1e3,
+        "replay_and_render_ms": replay_render * 1e3,
+    }
+
+
+def measure_sqlite_store(size: int = 1000, repeat: int = 3, last: int = 20) -> dict:
+    """
+    Measure appending to a SQLiteMessageStore, and reading it after reopening.
+
+    Args:
+        size: Number of messages
+        repeat: Number of samples
+        last: Number of messages read by the "last N" query
+
+    Returns:
+        dict: Microseconds per appended message, and milliseconds to reopen the
+              store and render the last ``last`` messages, every message, and
+              the user messages
+    """
+    messages = list(build_history(size).messages)
+    with tempfile.TemporaryDirectory() as directory:
+        paths = (os.path.join(directory, f"{i}.db") for i in itertools.count())
+        path = ""
+
+        def append_all() -> None:
+            nonlocal path
+            path = next(paths)
+            store = SQLiteMessageStore(path)
+            for message in messages:
+                store.append(message)
+            store.close()
+
+        def query(read) -> None:
+            store = SQLiteMessageStore(path)
+            render_messages(read(store))
+            store.close()
+
+        append = time_per_call(append_all, 1, repeat)
+        results = {"append_us": append * 1e6 / size}
+        for name, read in (
+            ("last_ms", lambda store: store.last(last)),
+            ("render_all_ms", iter),
+            ("by_role_ms", lambda store: store.by_role("user")),
+        ):
+            results[name] = time_per_call(lambda: query(read), 1, repeat) * 1e3
+    return results
+
+
+def measure_persistence(size: int = 1000, repeat: int = 3) -> dict:
+    """
+    Run every persistence benchmark.
+
+    Args:
+        size: Number of messages
+        repeat: Number of samples
+
+    Returns:
+        dict: The results of each benchmark, by storage
+    """
+    return {
+        "save_load": measure_save_load(size, repeat),
+        "message_log": measure_message_log(size, repeat),
+        "sqlite": measure_sqlite_store(size, repeat),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--size", type=int, default=1000)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+    print(json.dumps(measure_persistence(args.size, args.repeat), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,150 @@
+"""
+Render benchmark for streamlit_rich_message_history.
+
+Measures the time this package spends rendering, with the NullBackend standing
+in for Streamlit so that only the work done before the element calls is
+counted: MessageHistory.render_all at several history sizes, the rendering of
+collection components, through their prebuilt children and through
+MessageComponent._render_collection_item, and the cost of render listeners.
+
+Usage:
+    python -m benchmarks.bench_render [--sizes N [N ...]] [--repeat N]
+"""
+
+import argparse
+import json
+from typing import Sequence
+
+from benchmarks.common import time_per_call
+from streamlit_rich_message_history import MessageComponent, MessageHistory
+from streamlit_rich_message_history.backends import NullBackend, use_render_backend
+from streamlit_rich_message_history.instrumentation import listen_to_renders
+
+
+def build_history(size: int) -> MessageHistory:
+    """
+    Build a history of alternating user and assistant messages.
+
+    Assistant messages hold text, code and a list; every tenth one also holds a
+    small DataFrame.
+
+    Args:
+        size: Number of messages
+
+    Returns:
+        MessageHistory: The history
+    """
+    import pandas as pd
+
+    frame = pd.DataFrame({"a": range(5), "b": list("abcde")})
+    history = MessageHistory()
+    for i in range(size):
+        if i % 2 == 0:
+            history.add_user_message_create("👤", f"Question {i}")
+            continue
+        message = history.add_assistant_message_create("🤖")
+        message.add_text(f"Answer {i} with **markdown**")
+        message.add_code("SELECT * FROM table", language="sql")
+        message.add_list(["first", "second", 3])
+        if i % 20 == 1:
+            message.add_dataframe(frame)
+    return history
+
+
+def measure_render(sizes: Sequence[int] = (100, 1000, 10000), repeat: int = 3) -> dict:
+    """
+    Measure MessageHistory.render_all at several history sizes.
+
+    Args:
+        sizes: Numbers of messages
+        repeat: Number of samples per size
+
+    Returns:
+        dict: Milliseconds per render_all and microseconds per message, by size
+    """
+    render_all = {}
+    per_message = {}
+    with use_render_backend(NullBackend()):
+        for size in sizes:
+            history = build_history(size)
+            # The first render builds collection children and caches
+            history.render_all()
+            seconds = time_per_call(history.render_all, 1, repeat)
+            render_all[str(size)] = seconds * 1e3
+            per_message[str(size)] = seconds * 1e6 / size
+    return {"render_all_ms": render_all, "per_message_us": per_message}
+
+
+def measure_instrumentation(size: int = 1000, repeat: int = 3) -> dict:
+    """
+    Measure render_all with and without a render listener attached.
+
+    Args:
+        size: Number of messages
+        repeat: Number of samples
+
+    Returns:
+        dict: Microseconds per message without listeners and with a listener
+              collecting every RenderRecord
+    """
+    history = build_history(size)
+    records: list = []
+    results = {}
+    with use_render_backend(NullBackend()):
+        history.render_all()
+        results["off"] = time_per_call(history.render_all, 1, repeat) * 1e6 / size
+        with listen_to_renders(records.append):
+            history.render_all()
+            results["on"] = time_per_call(history.render_all, 1, repeat) * 1e6 / size
+    return {"per_message_us": results}
+
+
+def measure_collections(items: int = 100, number: int = 200, repeat: int = 5) -> dict:
+    """
+    Measure rendering list and dict components.
+
+    Args:
+        items: Number of items per collection
+        number: Number of renders per sample
+        repeat: Number of samples
+
+    Returns:
+        dict: Microseconds per item for prebuilt children and for
+              _render_collection_item building a component per item
+    """
+    values = [f"item {i}" if i % 2 else i for i in range(items)]
+    mapping = {f"key {i}": value for i, value in enumerate(values)}
+    list_component = MessageComponent(values)
+    dict_component = MessageComponent(mapping)
+
+    def render_items():
+        for index, item in enumerate(values):
+            MessageComponent._render_collection_item(item, index)
+
+    results = {}
+    with use_render_backend(NullBackend()):
+        for name, func in (
+            ("list_prebuilt", list_component._render_content),
+            ("dict_prebuilt", dict_component._render_content),
+            ("render_collection_item", render_items),
+        ):
+            func()
+            results[name] = 1e6 * time_per_call(func, number, repeat) / items
+    return {"per_item_us": results}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100, 1000, 10000])
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+    results = {
+        **measure_render(args.sizes, args.repeat),
+        "collections": measure_collections(),
+        "instrumentation": measure_instrumentation(repeat=args.repeat),
+    }
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,54 @@
+"""
+Shared helpers for the streamlit_rich_message_history benchmarks.
+"""
+
+import timeit
+from typing import Any, Callable, Dict
+
+
+def time_per_call(func: Callable[[], Any], number: int, repeat: int = 5) -> float:
+    """
+    Measure the time of one call of func.
+
+    The fastest sample is used, as slower ones mostly measure interference from
+    the rest of the system rather than the code under test.
+
+    Args:
+        func: Zero-argument callable to time
+        number: Number of calls per sample
+        repeat: Number of samples
+
+    Returns:
+        float: Seconds per call in the fastest sample
+    """
+    samples = timeit.repeat(func, number=number, repeat=repeat)
+    return min(samples) / number
+
+
+def snapshot_registry() -> Dict[str, Dict]:
+    """
+    Copy the ComponentRegistry tables benchmarks may register into.
+
+    Returns:
+        dict: The copied tables, to pass to restore_registry
+    """
+    from streamlit_rich_message_history.enums import ComponentRegistry
+
+    return {
+        name: dict(getattr(ComponentRegistry, name))
+        for name in ("_custom_types", "_type_detectors", "_detector_options")
+    }
+
+
+def restore_registry(snapshot: Dict[str, Dict]) -> None:
+    """
+    Restore ComponentRegistry tables copied by snapshot_registry.
+
+    Args:
+        snapshot: The copied tables
+    """
+    from streamlit_rich_message_history.enums import ComponentRegistry
+
+    for name, table in snapshot.items():
+        setattr(ComponentRegistry, name, dict(table))
+    ComponentRegistry.clear_detection_cache()
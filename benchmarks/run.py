@@ -0,0 +1,230 @@
+"""
+Benchmark suite runner for streamlit_rich_message_history.
+
+Runs the benchmarks in this directory and writes their results as one JSON
+document, together with the Python, Streamlit and package versions they were
+measured with. With ``--compare``, the results are compared with a saved
+baseline metric by metric, and the runner exits with status 1 if a time or
+memory metric grew by more than ``--threshold``, so regressions can be caught
+before a release. Micro-benchmarks vary between runs on a busy machine, so the
+default threshold of 20% is deliberately loose; compare runs made on the same
+machine.
+
+Usage:
+    python -m benchmarks.run [--suite NAME [NAME ...]] [--quick] [--output FILE]
+    python -m benchmarks.run --compare BASELINE [--current FILE] [--threshold 0.2]
+"""
+
+import argparse
+import json
+import platform
+import sys
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+# Metrics with these suffixes are times or sizes, where lower is better
+LOWER_IS_BETTER = ("_ms", "_us", "_bytes")
+
+
+def _import_suite(quick: bool) -> dict:
+    from benchmarks.bench_import import measure_import
+
+    return measure_import(repeat=2 if quick else 5)
+
+
+def _detection_suite(quick: bool) -> dict:
+    from benchmarks.bench_detection import (
+        measure_construction,
+        measure_custom_detectors,
+    )
+
+    number = 2000 if quick else 20000
+    return {
+        **measure_construction(number),
+        "custom_detectors": measure_custom_detectors(
+            (0, 10) if quick else (0, 10, 100), number
+        ),
+    }
+
+
+def _render_suite(quick: bool) -> dict:
+    from benchmarks.bench_render import (
+        measure_collections,
+        measure_instrumentation,
+        measure_render,
+    )
+
+    return {
+        **measure_render((100, 1000) if quick else (100, 1000, 10000)),
+        "collections": measure_collections(number=20 if quick else 200),
+        "instrumentation": measure_instrumentation(),
+    }
+
+
+def _memory_suite(quick: bool) -> dict:
+    from benchmarks.bench_memory import measure_memory, measure_message_memory
+
+    count = 1000 if quick else 10000
+    return {
+        **measure_memory(count),
+        "per_message": measure_message_memory(count // 5),
+    }
+
+
+def _persistence_suite(quick: bool) -> dict:
+    from benchmarks.bench_persistence import measure_persistence
+
+    return measure_persistence(size=200 if quick else 2000)
+
+
+SUITES: Dict[str, Callable[[bool], dict]] = {
+    "import": _import_suite,
+    "detection": _detection_suite,
+    "render": _render_suite,
+    "memory": _memory_suite,
+    "persistence": _persistence_suite,
+}
+
+
+def run_suites(names: List[str], quick: bool = False) -> dict:
+    """
+    Run benchmark suites.
+
+    Args:
+        names: Names of the suites to run, from SUITES
+        quick: Whether to use fewer samples and smaller sizes
+
+    Returns:
+        dict: The environment under ``meta`` and each suite's results under
+              ``results``
+    """
+    import streamlit
+
+    import streamlit_rich_message_history
+
+    results = {}
+    for name in names:
+        print(f"Running {name} benchmarks...", file=sys.stderr)
+        results[name] = SUITES[name](quick)
+    return {
+        "meta": {
+            "package_version": streamlit_rich_message_history.__version__,
+            "streamlit_version": streamlit.__version__,
+            "python_version": platform.python_version(),
+            "platform": platform.platform(),
+            "quick": quick,
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        },
+        "results": results,
+    }
+
+
+def flatten(results: Dict[str, Any], prefix: str = "") -> Dict[str, float]:
+    """
+    Flatten nested results to dotted metric names.
+
+    Args:
+        results: Nested dicts of numbers
+        prefix: Prefix for the metric names
+
+    Returns:
+        dict: Mapping of dotted metric name to value
+    """
+    flat = {}
+    for key, value in results.items():
+        name = f"{prefix}{key}"
+        if isinstance(value, dict):
+            flat.update(flatten(value, f"{name}."))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            flat[name] = float(value)
+    return flat
+
+
+def compare(baseline: dict, current: dict, threshold: float = 0.2) -> dict:
+    """
+    Compare benchmark results with a baseline.
+
+    Only metrics present in both are compared. A time or memory metric whose
+    value grew by more than the threshold is a regression; other metrics, like
+    counts and ratios, are reported without being judged.
+
+    Args:
+        baseline: Results of run_suites to compare with
+        current: Results of run_suites to check
+        threshold: Relative growth above which a metric counts as regressed
+
+    Returns:
+        dict: ``metrics`` mapping each metric to its baseline and current
+              values and relative change, and the sorted names of the
+              ``regressions`` and ``improvements``
+    """
+    old = flatten(baseline["results"])
+    new = flatten(current["results"])
+    metrics: Dict[str, Dict[str, Optional[float]]] = {}
+    regressions = []
+    improvements = []
+    for name in sorted(old.keys() & new.keys()):
+        before, after = old[name], new[name]
+        change = (after - before) / before if before else None
+        metrics[name] = {"baseline": before, "current": after, "change": change}
+        judged = any(part.endswith(LOWER_IS_BETTER) for part in name.split("."))
+        if not judged or change is None:
+            continue
+        if change > threshold:
+            regressions.append(name)
+        elif change < -threshold:
+            improvements.append(name)
+    return {
+        "threshold": threshold,
+        "metrics": metrics,
+        "regressions": regressions,
+        "improvements": improvements,
+    }
+
+
+def _load(path: str) -> dict:
+    with open(path) as f:
+        return json.load(f)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument(
+        "--suite", nargs="+", choices=sorted(SUITES), default=list(SUITES)
+    )
+    parser.add_argument("--quick", action="store_true")
+    parser.add_argument("--output", help="write the results to this file")
+    parser.add_argument("--compare", metavar="BASELINE")
+    parser.add_argument(
+        "--current", help="with --compare, results to use instead of running"
+    )
+    parser.add_argument("--threshold", type=float, default=0.2)
+    args = parser.parse_args()
+
+    if args.current:
+        current = _load(args.current)
+    else:
+        current = run_suites(args.suite, args.quick)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(current, f, indent=2)
+
+    if args.compare is None:
+        print(json.dumps(current, indent=2))
+        return
+
+    report = compare(_load(args.compare), current, args.threshold)
+    print(json.dumps(report, indent=2))
+    for name in report["regressions"]:
+        metric = report["metrics"][name]
+        print(
+            f"Regression: {name} {metric['baseline']:.4g} -> "
+            f"{metric['current']:.4g} ({metric['change']:+.1%})",
+            file=sys.stderr,
+        )
+    if report["regressions"]:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -10,6 +10,7 @@ __version__ = "0.1.0"
 from .components import MessageComponent
 from .enums import ComponentType
 from .history import MessageHistory
+from .lazy import LazyContent
 from .messages import AssistantMessage, ErrorMessage, Message, UserMessage
 
 __all__ = [
@@ -20,4 +21,5 @@ __all__ = [
     "AssistantMessage",
     "ErrorMessage",
     "MessageHistory",
+    "LazyContent",
 ]
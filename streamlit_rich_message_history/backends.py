@@ -0,0 +1,346 @@
+"""
+Render backends for the streamlit_rich_message_history package.
+
+Rendering code calls the Streamlit element API (``st.markdown``,
+``st.dataframe``, ``st.expander`` and so on) through the ``st`` proxy defined
+here, which forwards every attribute lookup to the render backend of the
+current context. StreamlitBackend, the default, forwards to Streamlit itself.
+RecordingBackend captures the element calls instead, which lets tests assert
+on what a message emits and benchmarks measure the time spent in this package
+without Streamlit.
+
+The backend is held in a context variable, so setting it only affects the
+current thread: the script threads of other Streamlit sessions keep rendering
+with Streamlit.
+"""
+
+import contextlib
+import contextvars
+from typing import Any, Callable, Dict, Iterator, List, NamedTuple, Optional, Tuple
+
+import streamlit
+
+
+class RenderBackend:
+    """
+    Base class for the targets messages and components are rendered to.
+
+    A backend provides the attributes of the Streamlit module that rendering
+    uses: element functions like ``markdown`` or ``dataframe``, containers like
+    ``expander``, ``chat_message``, ``container`` and ``empty``, ``button``,
+    ``fragment`` and ``session_state``.
+
+    Attributes:
+        is_streamlit: Whether the backend renders with Streamlit
+    """
+
+    is_streamlit = False
+
+    def __init__(self) -> None:
+        """Initialize the backend."""
+        self._fragments: Dict[Callable, Callable] = {}
+
+    def fragment_for(self, func: Callable) -> Callable:
+        """
+        Get a function wrapped as a fragment of this backend.
+
+        The wrapped function is cached, so it is only wrapped once per backend.
+
+        Args:
+            func: The function to wrap
+
+        Returns:
+            The function wrapped with the ``fragment`` of this backend
+        """
+        wrapped = self._fragments.get(func)
+        if wrapped is None:
+            wrapped = self._fragments[func] = getattr(self, "fragment")(func)
+        return wrapped
+
+
+class StreamlitBackend(RenderBackend):
+    """
+    Backend rendering with Streamlit; the default.
+
+    Attributes:
+        module: The module element calls are forwarded to
+    """
+
+    is_streamlit = True
+
+    def __init__(self, module: Any = streamlit):
+        """
+        Initialize the backend.
+
+        Args:
+            module: The module element calls are forwarded to, the streamlit
+                    module by default
+        """
+        super().__init__()
+        self.module = module
+
+    def __getattr__(self, name: str) -> Any:
+        if name == "module":
+            raise AttributeError(name)
+        return getattr(self.module, name)
+
+
+class RenderCall(NamedTuple):
+    """
+    An element call captured by a RecordingBackend.
+
+    Attributes:
+        name: Name of the function called, e.g. "markdown"; attributes looked
+              up on the module before the call are joined with dots, as in
+              "components.v1.html"
+        args: Positional arguments of the call
+        kwargs: Keyword arguments of the call
+        parent: Index of the call that created the container the element was
+                added to, or None for the top level
+    """
+
+    name: str
+    args: Tuple[Any, ...]
+    kwargs: Dict[str, Any]
+    parent: Optional[int]
+
+
+# Widgets that report not having been interacted with
+_UNTOUCHED_WIDGETS = frozenset({"button", "checkbox", "toggle", "form_submit_button"})
+
+
+class RecordingBackend(RenderBackend):
+    """
+    Backend capturing element calls instead of rendering them.
+
+    Every call is appended to ``calls``. Calls return a recorded element that
+    can be used as a container, as in ``with st.expander(...)``, or have
+    elements added to it, as in ``st.empty().markdown(...)``; the calls made
+    inside it record it as their parent. Widgets report no interaction,
+    ``columns`` and ``tabs`` return one element per column or tab, and
+    ``fragment`` returns the function unchanged.
+
+    Attributes:
+        calls: The captured calls, in order
+        session_state: Dictionary standing in for ``st.session_state``
+
+    Examples:
+        >>> backend = RecordingBackend()
+        >>> with use_render_backend(backend):
+        ...     message.render()
+        >>> backend.names()
+        ['chat_message', 'markdown', 'dataframe']
+    """
+
+    def __init__(self) -> None:
+        """Initialize a backend with no calls recorded."""
+        super().__init__()
+        self.calls: List[RenderCall] = []
+        self.session_state: Dict[str, Any] = {}
+        self._stack: List[Optional[int]] = []
+
+    def __getattr__(self, name: str) -> Any:
+        if name.startswith("__"):
+            raise AttributeError(name)
+        return _RecordedElement(self, name, None, None)
+
+    def _record(
+        self,
+        name: str,
+        args: Tuple[Any, ...],
+        kwargs: Dict[str, Any],
+        parent: Optional[int],
+    ) -> Optional[int]:
+        """Capture a call, returning its index."""
+        if parent is None and self._stack:
+            parent = self._stack[-1]
+        self.calls.append(RenderCall(name, args, kwargs, parent))
+        return len(self.calls) - 1
+
+    def names(self) -> List[str]:
+        """
+        Get the names of the captured calls.
+
+        Returns:
+            list: The name of every call, in order
+        """
+        return [call.name for call in self.calls]
+
+    def find(self, name: str) -> List[RenderCall]:
+        """
+        Get the captured calls with a name.
+
+        Args:
+            name: The name to look for, e.g. "dataframe"
+
+        Returns:
+            list: The matching calls, in order
+        """
+        return [call for call in self.calls if call.name == name]
+
+    def clear(self) -> None:
+        """Forget the captured calls."""
+        self.calls.clear()
+        self._stack.clear()
+
+
+class NullBackend(RecordingBackend):
+    """
+    Backend discarding element calls.
+
+    It behaves like RecordingBackend without keeping the calls, which makes it
+    suited to measuring the time spent in this package alone.
+    """
+
+    def _record(
+        self,
+        name: str,
+        args: Tuple[Any, ...],
+        kwargs: Dict[str, Any],
+        parent: Optional[int],
+    ) -> Optional[int]:
+        return None
+
+
+class _RecordedElement:
+    """
+    An element returned by a RecordingBackend, or an attribute path on it.
+
+    Path elements, like ``st.components.v1``, have no index and record calls
+    under their dotted name; elements created by a call record the calls made
+    on them with themselves as parent.
+    """
+
+    __slots__ = ("_backend", "_name", "_index", "_parent")
+
+    def __init__(
+        self,
+        backend: RecordingBackend,
+        name: str,
+        index: Optional[int],
+        parent: Optional[int],
+    ):
+        self._backend = backend
+        self._name = name
+        self._index = index
+        self._parent = parent
+
+    def __getattr__(self, name: str) -> "_RecordedElement":
+        if name.startswith("__"):
+            raise AttributeError(name)
+        if self._index is None:
+            return _RecordedElement(
+                self._backend, f"{self._name}.{name}", None, self._parent
+            )
+        return _RecordedElement(self._backend, name, None, self._index)
+
+    def __call__(self, *args: Any, **kwargs: Any) -> Any:
+        backend = self._backend
+        index = backend._record(self._name, args, kwargs, self._parent)
+        leaf = self._name.rsplit(".", 1)[-1]
+        if leaf in _UNTOUCHED_WIDGETS:
+            return False
+        if leaf == "fragment":
+            if args and callable(args[0]):
+                return args[0]
+            return lambda func: func
+        if leaf in ("columns", "tabs"):
+            spec = args[0] if args else kwargs.get("spec", kwargs.get("tabs", 1))
+            count = spec if isinstance(spec, int) else len(spec)
+            return [_RecordedElement(backend, "", index, None) for _ in range(count)]
+        return _RecordedElement(backend, self._name, index, None)
+
+    def __enter__(self) -> "_RecordedElement":
+        self._backend._stack.append(self._index)
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        self._backend._stack.pop()
+
+    def __repr__(self) -> str:
+        return f"RecordedElement({self._name!r}, index={self._index})"
+
+
+_DEFAULT_BACKEND = StreamlitBackend()
+_current_backend: contextvars.ContextVar[RenderBackend] = contextvars.ContextVar(
+    "render_backend", default=_DEFAULT_BACKEND
+)
+
+
+def get_render_backend() -> RenderBackend:
+    """
+    Get the render backend of the current context.
+
+    Returns:
+        RenderBackend: The backend, StreamlitBackend unless another one was set
+    """
+    return _current_backend.get()
+
+
+def set_render_backend(backend: RenderBackend) -> contextvars.Token:
+    """
+    Set the render backend of the current context.
+
+    Args:
+        backend: The backend to render with
+
+    Returns:
+        A token to pass to reset_render_backend to restore the previous backend
+    """
+    return _current_backend.set(backend)
+
+
+def reset_render_backend(token: contextvars.Token) -> None:
+    """
+    Restore the render backend that was set before set_render_backend.
+
+    Args:
+        token: The token returned by set_render_backend
+    """
+    _current_backend.reset(token)
+
+
+@contextlib.contextmanager
+def use_render_backend(backend: RenderBackend) -> Iterator[RenderBackend]:
+    """
+    Render with a backend for the duration of a with block.
+
+    Args:
+        backend: The backend to render with
+
+    Yields:
+        RenderBackend: The backend
+
+    Examples:
+        >>> with use_render_backend(RecordingBackend()) as backend:
+        ...     history.render_all()
+    """
+    token = _current_backend.set(backend)
+    try:
+        yield backend
+    finally:
+        _current_backend.reset(token)
+
+
+class _BackendProxy:
+    """Stand-in for a module forwarding attribute lookups to the current backend."""
+
+    __slots__ = ("_path",)
+
+    def __init__(self, path: Tuple[str, ...] = ()):
+        self._path = path
+
+    def __getattr__(self, name: str) -> Any:
+        backend = _current_backend.get()
+        target = backend.module if isinstance(backend, StreamlitBackend) else backend
+        for part in self._path:
+            target = getattr(target, part)
+        return getattr(target, name)
+
+    def __repr__(self) -> str:
+        return f"BackendProxy({'.'.join(('st',) + self._path)})"
+
+
+# What rendering code uses in place of ``streamlit`` and ``streamlit.components.v1``
+st: Any = _BackendProxy()
+st_components: Any = _BackendProxy(("components", "v1"))
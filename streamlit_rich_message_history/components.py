@@ -5,15 +5,43 @@ This module defines the core MessageComponent class that detects, processes, and
 renders different types of content in a Streamlit application.
 """
 
+import os
+import time
 import traceback
-from typing import Any, Optional, Union
+import uuid
+from typing import Any, Dict, List, Mapping, Optional, Tuple, Union
 
-import matplotlib.pyplot as plt
-import pandas as pd
-import plotly.graph_objects as go
-import streamlit as st
-
-from .enums import ComponentRegistry, ComponentType
+from .backends import st
+from .enums import ComponentRegistry, ComponentType, DetectionPlan
+from .figures import RasterizedFigure, SerializedPlotlyFigure
+from .frames import ArrowFrame
+from .instrumentation import (
+    RenderRecord,
+    current_message,
+    emit_render_record,
+    is_instrumented,
+)
+from .lazy import LazyContent
+from .memory import estimate_size
+from .renderers import (
+    BUILTIN_RENDERERS,
+    TITLED_RENDERERS,
+    _rendering_component,
+    render_fallback,
+)
+from .spill import (
+    DeferredPayload,
+    SpilledPayload,
+    content_fingerprint,
+    spill_payload,
+)
+from .utils import (
+    detection_flags,
+    is_dataframe,
+    is_matplotlib_figure,
+    is_plotly_figure,
+    is_series,
+)
 
 
 class MessageComponent:
@@ -30,8 +58,31 @@ class MessageComponent:
         description: Optional description text for the component
         expanded: Whether expandable sections should be expanded by default
         kwargs: Additional keyword arguments for rendering
+        children: For LIST, TUPLE and DICT components, the (index or key, component)
+                  pairs of the items, built on first render and reused afterwards
+        key: Stable identity of the component, kept when it is saved and loaded,
+             which widget state such as the choice to show a preview in full is
+             tied to
+
+    Content can be given as LazyContent, in which case it is produced when the
+    component is first rendered. Its type is the declared type of the
+    LazyContent, or detected once the content has been produced.
     """
 
+    __slots__ = (
+        "content",
+        "component_type",
+        "title",
+        "description",
+        "expanded",
+        "kwargs",
+        "_children",
+        "_memory_usage",
+        "_lazy",
+        "_key",
+        "_spill_file",
+    )
+
     def __init__(
         self,
         content: Any,
@@ -39,6 +90,7 @@ class MessageComponent:
         title: Optional[str] = None,
         description: Optional[str] = None,
         expanded: bool = False,
+        key: Optional[str] = None,
         **kwargs,
     ):
         """
@@ -50,6 +102,8 @@ class MessageComponent:
             title: Optional title for the component (creates an expander if provided)
             description: Optional description text for the component
             expanded: Whether expandable sections should be expanded by default
+            key: Optional stable key for the widget state of the component; by
+                 default it is derived from its position in the history
             **kwargs: Additional keyword arguments that control rendering behavior
                       Special flags include:
                       - is_error: Treat string content as an error message
@@ -61,10 +115,20 @@ class MessageComponent:
                       - is_html: Treat string content as HTML
         """
         self.content = content
-        self.kwargs = kwargs
+        self.kwargs: Dict[str, Any] = kwargs
+        self._children: Optional[List[Tuple[Union[int, str], MessageComponent]]] = None
+        self._memory_usage: Optional[Dict[bool, int]] = None
+        self._lazy = content if isinstance(content, LazyContent) else None
+        self._key = key
+        # The file the content was read back from, the content read from it and
+        # its fingerprint, so that it is only written again if it changed
+        self._spill_file: Optional[Tuple[SpilledPayload, Any, Any]] = None
 
         if component_type is None:
-            component_type = self._detect_component_type(content)
+            if self._lazy is not None:
+                component_type = self._lazy.component_type or ComponentType.LAZY
+            else:
+                component_type = self._detect_component_type(content)
 
         self.component_type = component_type
         self.title = title
@@ -77,7 +141,12 @@ class MessageComponent:
 
         This method uses a combination of registered custom detectors and built-in
         type detection logic to determine the most appropriate component type
-        for the given content.
+        for the given content. The outcome of cacheable detectors and of the
+        built-in logic is memoized per content class and set of ``is_*`` flags,
+        so repeated content types only run the value-dependent detectors.
+        pandas, matplotlib and plotly types are only checked if the respective
+        library has already been imported, so detection never triggers one of
+        those imports.
 
         Args:
             content: The content to detect the type for
@@ -85,13 +154,66 @@ class MessageComponent:
         Returns:
             ComponentType: The detected component type
         """
-        # First try custom detectors
-        for comp_type in ComponentRegistry._type_detectors:
-            detector = ComponentRegistry.get_detector(comp_type)
-            if detector and detector(content, self.kwargs):
+        key = (type(content), detection_flags(self.kwargs))
+        plan = ComponentRegistry.get_detection_plan(key)
+        if plan is None:
+            plan = self._build_detection_plan(content)
+            ComponentRegistry.set_detection_plan(key, plan)
+
+        checks, resolved_type, _ = plan
+        for comp_type, detector in checks:
+            if ComponentRegistry.run_detector(
+                comp_type, detector, content, self.kwargs
+            ):
                 return comp_type
+        return resolved_type
+
+    def _build_detection_plan(self, content: Any) -> DetectionPlan:
+        """
+        Build the detection plan for the class and flags of the given content.
+
+        Only the custom detectors that can match the content class are walked,
+        in priority order. Value-dependent detectors are kept in the plan to be
+        run for every piece of content, while cacheable detectors are resolved
+        once, here. If no cacheable detector matches, the plan falls back to the
+        built-in detection result.
+
+        Args:
+            content: A representative piece of content
+
+        Returns:
+            DetectionPlan: The value-dependent checks, the resolved fallback type
+            and the outcomes of the cacheable detectors that were run
+        """
+        checks = []
+        outcomes = []
+        for comp_type, detector, cacheable in ComponentRegistry.get_detectors_for(
+            type(content)
+        ):
+            if not cacheable:
+                checks.append((comp_type, detector))
+                continue
+            matched = ComponentRegistry.run_detector(
+                comp_type, detector, content, self.kwargs
+            )
+            outcomes.append((comp_type, matched))
+            if matched:
+                return tuple(checks), comp_type, tuple(outcomes)
+        return tuple(checks), self._detect_builtin_type(content), tuple(outcomes)
+
+    def _detect_builtin_type(self, content: Any) -> ComponentType:
+        """
+        Detect the built-in component type of the content.
 
-        # Then do built-in detection logic
+        The result only depends on the class of the content and the ``is_*``
+        flags in kwargs, which is what allows it to be cached.
+
+        Args:
+            content: The content to detect the type for
+
+        Returns:
+            ComponentType: The detected built-in component type
+        """
         if isinstance(content, (list, tuple)) and not self.kwargs.get(
             "is_table", False
         ):
@@ -110,15 +232,19 @@ class MessageComponent:
                 return ComponentType.HTML
             else:
                 return ComponentType.TEXT
-        elif isinstance(content, pd.DataFrame):
+        elif is_dataframe(content) or isinstance(content, ArrowFrame):
             return ComponentType.DATAFRAME
-        elif isinstance(content, pd.Series):
+        elif is_series(content):
             return ComponentType.SERIES
-        elif isinstance(content, plt.Figure):
+        elif is_matplotlib_figure(content) or isinstance(content, RasterizedFigure):
             return ComponentType.MATPLOTLIB_FIGURE
-        elif isinstance(content, go.Figure) or (
-            isinstance(content, dict)
-            and isinstance(getattr(content, "data", None), (list, tuple))
+        elif (
+            is_plotly_figure(content)
+            or isinstance(content, SerializedPlotlyFigure)
+            or (
+                isinstance(content, dict)
+                and isinstance(getattr(content, "data", None), (list, tuple))
+            )
         ):
             return ComponentType.PLOTLY_FIGURE
         elif isinstance(content, (int, float)) and not self.kwargs.get(
@@ -140,98 +266,81 @@ class MessageComponent:
 
         If a title is provided, the component is wrapped in an expander.
         If a description is provided, it's shown before the content.
+        If render listeners are registered, a RenderRecord is sent to them
+        afterwards; see the instrumentation module.
         """
+        if not is_instrumented():
+            self._render_framed()
+            return
+
+        start = time.perf_counter()
+        succeeded = self._render_framed()
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        renderer = ComponentRegistry.get_renderer(self.component_type)
+        if renderer is None:
+            renderer = render_fallback
+        emit_render_record(
+            RenderRecord(
+                kind="component",
+                elapsed_ms=elapsed_ms,
+                component_type=self.component_type,
+                renderer=f"{renderer.__module__}.{renderer.__qualname__}",
+                payload_bytes=self.memory_usage(),
+                failed=not succeeded,
+                component=self,
+                message=current_message(),
+            )
+        )
+
+    def _render_framed(self) -> bool:
+        """Render the content in its expander and after its description."""
         if self.title:
             with st.expander(self.title, expanded=self.expanded):
                 if self.description:
                     st.markdown(self.description)
-                self._render_content()
-        else:
-            if self.description:
-                st.markdown(self.description)
-            self._render_content()
+                return self._render_content()
+        if self.description:
+            st.markdown(self.description)
+        return self._render_content()
 
-    def _render_content(self):
+    def _render_content(self) -> bool:
         """
         Render the component based on its detected type.
 
-        This method handles the rendering of all built-in component types
-        and delegates to custom renderers for custom component types.
-        It also includes error handling to prevent component rendering errors
-        from breaking the entire application.
+        The renderer is looked up in the ComponentRegistry renderer table, which
+        holds the built-in renderers alongside custom ones, so every render costs a
+        single dictionary lookup. Content spilled to disk or stored in a saved
+        history is read back first, and lazy content is produced, detecting its
+        type if it was not declared. Renderers registered with ``takes_title``
+        get the component title as a third argument. Collections rendered by the
+        built-in renderers reuse their prebuilt child components. It also includes
+        error handling to prevent component rendering errors from breaking the
+        entire application.
+
+        Returns:
+            bool: False if an error was caught and shown instead of the content
         """
         try:
-            # First check if there's a custom renderer
-            custom_renderer = ComponentRegistry.get_renderer(self.component_type)
-            if custom_renderer:
-                custom_renderer(self.content, self.kwargs)
-                return
-
-            # Standard component rendering
-            if (
-                self.component_type == ComponentType.LIST
-                or self.component_type == ComponentType.TUPLE
-            ):
-                for idx, item in enumerate(self.content):
-                    self._render_collection_item(item, idx)
-            elif self.component_type == ComponentType.DICT:
-                for key, value in self.content.items():
-                    self._render_collection_item(value, key)
-            else:
-                if self.component_type == ComponentType.TEXT:
-                    st.markdown(self.content)
-                elif self.component_type == ComponentType.ERROR:
-                    st.error(self.content)
-                elif self.component_type == ComponentType.CODE:
-                    language = self.kwargs.get("language", "python")
-                    st.code(self.content, language=language)
-                elif self.component_type == ComponentType.DATAFRAME:
-                    use_container_width = self.kwargs.get("use_container_width", True)
-                    height = self.kwargs.get("height", None)
-                    st.dataframe(
-                        self.content,
-                        use_container_width=use_container_width,
-                        height=height,
-                    )
-                elif self.component_type == ComponentType.SERIES:
-                    st.dataframe(self.content.to_frame())
-                elif self.component_type == ComponentType.MATPLOTLIB_FIGURE:
-                    st.pyplot(self.content)
-                elif self.component_type == ComponentType.PLOTLY_FIGURE:
-                    use_container_width = self.kwargs.get("use_container_width", True)
-                    height = self.kwargs.get("height", None)
-                    st.plotly_chart(
-                        self.content,
-                        use_container_width=use_container_width,
-                        height=height,
-                    )
-                elif self.component_type == ComponentType.NUMBER:
-                    format_str = self.kwargs.get("format", None)
-                    if format_str:
-                        st.write(
-                            f"{self.title or 'Result'}: {format_str.format(self.content)}"
-                        )
-                    else:
-                        st.write(f"{self.title or 'Result'}: {self.content}")
-                elif self.component_type == ComponentType.METRIC:
-                    delta = self.kwargs.get("delta", None)
-                    delta_color = self.kwargs.get("delta_color", "normal")
-                    st.metric(
-                        label=self.title or "Metric",
-                        value=self.content,
-                        delta=delta,
-                        delta_color=delta_color,
-                    )
-                elif self.component_type == ComponentType.TABLE:
-                    st.table(self.content)
-                elif self.component_type == ComponentType.JSON:
-                    st.json(self.content)
-                elif self.component_type == ComponentType.HTML:
-                    height = self.kwargs.get("height", None)
-                    scrolling = self.kwargs.get("scrolling", False)
-                    st.html(self.content, height=height, scrolling=scrolling)
+            if isinstance(self.content, DeferredPayload):
+                self._load_deferred()
+            if self.component_type is ComponentType.LAZY:
+                self.component_type = self._detect_component_type(self.content)
+            renderer = ComponentRegistry.get_renderer(self.component_type)
+            if renderer is render_sequence or renderer is render_mapping:
+                for index, child in self.children:
+                    self._render_collection_item(child, index)
+                return True
+            token = _rendering_component.set(self)
+            try:
+                if renderer is None:
+                    render_fallback(self.content, self.kwargs)
+                elif ComponentRegistry.renderer_takes_title(self.component_type):
+                    renderer(self.content, self.kwargs, self.title)
                 else:
-                    st.write(str(self.content))
+                    renderer(self.content, self.kwargs)
+            finally:
+                _rendering_component.reset(token)
+            return True
         except Exception as e:
             error_message = f"Error rendering component of type {self.component_type.value}: {str(e)}"
             stack_trace = traceback.format_exc()
@@ -248,20 +357,204 @@ class MessageComponent:
                         st.code(str(self.content), language="python")
                 except Exception as e:
                     st.error(f"Unable to display component content: {e}")
+            return False
+
+    @property
+    def children(self) -> List[Tuple[Union[int, str], "MessageComponent"]]:
+        """
+        Get the child components of a LIST, TUPLE or DICT component.
+
+        Each item becomes its own component with the parent's keyword arguments.
+        The children are built on first access and reused afterwards. If the
+        number of items changes they are all rebuilt, otherwise only the
+        children whose item has been replaced in place are.
+
+        Returns:
+            list: (index or key, component) pairs, empty for other component types
+        """
+        content = self.content
+        if self.component_type == ComponentType.DICT:
+            items = content.items()
+        elif self.component_type in (ComponentType.LIST, ComponentType.TUPLE):
+            items = enumerate(content)
+        else:
+            return []
+        children = self._children
+        if children is None or len(children) != len(content):
+            self._children = [
+                (key, self._build_child(key, item)) for key, item in items
+            ]
+            return self._children
+        for position, (key, item) in enumerate(items):
+            child_key, child = children[position]
+            if child_key != key or (
+                child.content is not item and child._lazy is not item
+            ):
+                children[position] = (key, self._build_child(key, item))
+        return children
+
+    def _load_deferred(self) -> None:
+        """Replace deferred content with the payload it holds."""
+        payload = self.content
+        self.content = payload.load()
+        self._memory_usage = None
+        if isinstance(payload, SpilledPayload):
+            # The file is kept for when the content is spilled again, as are
+            # the size estimates of what it holds
+            self._spill_file = (
+                payload,
+                self.content,
+                content_fingerprint(self.content),
+            )
+            self._memory_usage = payload.sizes
+
+    def _build_child(self, key: Union[int, str], item: Any) -> "MessageComponent":
+        """Build the component of a collection item, keyed below this component."""
+        child = MessageComponent(item, **self.kwargs)
+        if self._key is not None:
+            child._key = f"{self._key}/{key}"
+        return child
+
+    @property
+    def key(self) -> str:
+        """
+        Get the stable identity of the component.
+
+        MessageHistory derives the key of a component from the positions of the
+        component and its message before rendering it, unless one was passed to
+        the constructor, so it is the same on every rerun even if the history is
+        rebuilt. A component rendered outside of a history gets a random key on
+        first access instead. Saved histories, logs and SQLite stores keep the
+        key of DataFrame, Series, table and collection components, and the
+        children of a collection derive theirs from it.
 
+        Returns:
+            str: The key
+        """
+        if self._key is None:
+            self._assign_key(uuid.uuid4().hex)
+        assert self._key is not None
+        return self._key
+
+    def _assign_key(self, key: str) -> None:
+        """Set the key of the component and of the children built so far."""
+        self._key = key
+        for child_key, child in self._children or ():
+            child._assign_key(f"{key}/{child_key}")
+
+    def memory_usage(self, deep: bool = True, refresh: bool = False) -> int:
+        """
+        Estimate the number of bytes held by the content of this component.
+
+        The estimate is computed on first call and cached, so it is cheap to
+        query on every rerun. Pass ``refresh`` after changing the content in
+        place.
+
+        Args:
+            deep: Whether to count the objects referenced from object columns and
+                  collection items, rather than only their containers
+            refresh: Whether to recompute a cached estimate
+
+        Returns:
+            int: The estimated size in bytes; see memory.estimate_size
+        """
+        if self._memory_usage is None or refresh:
+            self._memory_usage = {}
+        size = self._memory_usage.get(deep)
+        if size is None:
+            size = self._memory_usage[deep] = estimate_size(self.content, deep)
+        return size
+
+    @property
+    def is_spilled(self) -> bool:
+        """Whether the content has been spilled to disk and not read back yet."""
+        return isinstance(self.content, SpilledPayload)
+
+    def spill(self, directory: str) -> bool:
+        """
+        Write heavy content to a file and release it from memory.
+
+        Only DataFrame, Series and figure content is spilled; it is read back
+        transparently the next time the component is rendered. Matplotlib
+        figures are closed and come back as PNG images, and plotly figures as
+        their serialized spec. The file is kept after it is read back, and
+        spilling the same content again reuses it unless the content changed.
+
+        Args:
+            directory: Existing directory to write the file to
+
+        Returns:
+            bool: True if the content was spilled
+        """
+        if isinstance(self.content, DeferredPayload):
+            return False
+        spill_file = self._spill_file
+        if (
+            spill_file is not None
+            and spill_file[1] is self.content
+            and spill_file[2] == content_fingerprint(self.content)
+            and os.path.exists(spill_file[0].path)
+        ):
+            payload: Optional[SpilledPayload] = spill_file[0]
+        else:
+            self.discard_spill_file()
+            payload = spill_payload(self.content, directory)
+            if payload is None:
+                return False
+        self.content = payload
+        self._spill_file = None
+        self._memory_usage = None
+        return True
+
+    def discard_spill_file(self) -> None:
+        """Delete the file the content is spilled to or was read back from."""
+        if isinstance(self.content, SpilledPayload):
+            self.content.discard()
+        if self._spill_file is not None:
+            self._spill_file[0].discard()
+            self._spill_file = None
+
+    def evict(self) -> bool:
+        """
+        Release content produced from LazyContent.
+
+        The content is produced again the next time the component is rendered.
+        This is meant for content that is cheaper to recompute than to keep,
+        for example the result of a query that is rarely looked at again.
+
+        Returns:
+            bool: True if produced content was released, False if the component
+            does not hold lazy content or it has not been produced
+        """
+        lazy = self._lazy
+        if lazy is None or (self.content is lazy and not lazy.evaluated):
+            return False
+        self.discard_spill_file()
+        lazy.reset()
+        self.content = lazy
+        self._memory_usage = None
+        self._children = None
+        return True
+
+    @staticmethod
     def _render_collection_item(
-        self, item: Any, index: Optional[Union[int, str]] = None
+        item: Any,
+        index: Optional[Union[int, str]] = None,
+        kwargs: Optional[Mapping[str, Any]] = None,
     ):
         """
         Render a single item from a collection.
 
         Args:
-            item: The item to render
+            item: The item to render, or its prebuilt MessageComponent
             index: Optional index or key for error reporting
+            kwargs: Keyword arguments for the item component if it has to be built
         """
         try:
-            # Create a new MessageComponent for the item
-            item_component = MessageComponent(item)
+            if isinstance(item, MessageComponent):
+                item_component = item
+            else:
+                item_component = MessageComponent(item, **(kwargs or {}))
             # Render the item
             item_component._render_content()
         except Exception as e:
@@ -274,6 +567,54 @@ class MessageComponent:
             st.error(error_message)
             with st.expander("Item Debug View", expanded=False):
                 try:
+                    if isinstance(item, MessageComponent):
+                        item = item.content
                     st.code(repr(item), language="python")
                 except Exception as e:
                     st.error(f"Unable to display item content: {e}")
+
+
+def render_sequence(content: Any, kwargs: Mapping[str, Any]) -> None:
+    """
+    Render each item of a list or tuple as its own component.
+
+    MessageComponent renders collections through their prebuilt children and
+    only calls this directly if the renderer has been wrapped, in which case the
+    item components are built on every call.
+    """
+    for idx, item in enumerate(content):
+        MessageComponent._render_collection_item(item, idx, kwargs)
+
+
+def render_mapping(content: Any, kwargs: Mapping[str, Any]) -> None:
+    """
+    Render each value of a dictionary as its own component.
+
+    Like render_sequence, this is only called directly for wrapped renderers.
+    """
+    for key, value in content.items():
+        MessageComponent._render_collection_item(value, key, kwargs)
+
+
+def render_lazy(content: Any, kwargs: Mapping[str, Any]) -> None:
+    """
+    Render lazy content as the component its result is detected as.
+
+    MessageComponent detects the type of lazy content before looking up a
+    renderer, so this is only called directly for wrapped renderers.
+    """
+    if isinstance(content, LazyContent):
+        content = content.read()
+    MessageComponent(content, **kwargs)._render_content()
+
+
+for _comp_type, _renderer in {
+    **BUILTIN_RENDERERS,
+    ComponentType.LIST: render_sequence,
+    ComponentType.TUPLE: render_sequence,
+    ComponentType.DICT: render_mapping,
+    ComponentType.LAZY: render_lazy,
+}.items():
+    ComponentRegistry.register_renderer(
+        _comp_type, _renderer, takes_title=_comp_type in TITLED_RENDERERS
+    )
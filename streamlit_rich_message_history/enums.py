@@ -5,8 +5,29 @@ This module defines the core component types and provides a registry system
 for extending the package with custom component types, detectors, and renderers.
 """
 
+import time
 from enum import Enum
-from typing import Any, Callable, Dict, Optional
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    FrozenSet,
+    List,
+    Mapping,
+    Optional,
+    Set,
+    Tuple,
+    Union,
+)
+
+Detector = Callable[[Any, Mapping[str, Any]], bool]
+DetectorEntry = Tuple["ComponentType", Detector, bool]
+DetectionKey = Tuple[type, FrozenSet[str]]
+DetectionPlan = Tuple[
+    Tuple[Tuple["ComponentType", Callable[[Any, Mapping[str, Any]], bool]], ...],
+    "ComponentType",
+    Tuple[Tuple["ComponentType", bool], ...],
+]
 
 
 class ComponentType(Enum):
@@ -32,6 +53,7 @@ class ComponentType(Enum):
         LIST: List of items
         TUPLE: Tuple of items
         DICT: Dictionary of items
+        LAZY: Lazy content whose type is detected once it has been produced
     """
 
     TEXT = "text"
@@ -49,6 +71,7 @@ class ComponentType(Enum):
     LIST = "list"
     TUPLE = "tuple"
     DICT = "dict"
+    LAZY = "lazy"
 
 
 class ComponentRegistry:
@@ -61,11 +84,28 @@ class ComponentRegistry:
     - Rendering functions that display specific content types
 
     The registry is a central point for extending the package with custom components.
+
+    It also holds the detection caches used by MessageComponent: a per-class
+    index of the detectors that can match a content class, ordered by priority,
+    and a cache mapping a content class and the set of ``is_*`` flags to a
+    detection plan. Both are cleared whenever a detector is registered.
     """
 
     _custom_types: Dict[str, ComponentType] = {}
-    _type_detectors: Dict[ComponentType, Callable[[Any, Dict[str, Any]], bool]] = {}
-    _renderers: Dict[ComponentType, Callable[[Any, Dict[str, Any]], None]] = {}
+    _type_detectors: Dict[ComponentType, Detector] = {}
+    _detector_options: Dict[
+        ComponentType, Tuple[Optional[Tuple[type, ...]], int, bool]
+    ] = {}
+    _renderers: Dict[ComponentType, Callable[..., None]] = {}
+    _titled_renderers: Set[ComponentType] = set()
+
+    _detector_index: Dict[type, Tuple[DetectorEntry, ...]] = {}
+    _detection_cache: Dict[DetectionKey, DetectionPlan] = {}
+    _detection_cache_source: Optional[Dict] = None
+    _detection_cache_limit = 1024
+
+    _collect_detector_stats = False
+    _detector_stats: Dict[ComponentType, List[float]] = {}
 
     @classmethod
     def register_component_type(cls, name: str) -> ComponentType:
@@ -116,37 +156,242 @@ class ComponentRegistry:
 
     @classmethod
     def register_detector(
-        cls, comp_type: ComponentType, detector: Callable[[Any, Dict[str, Any]], bool]
+        cls,
+        comp_type: ComponentType,
+        detector: Detector,
+        cacheable: bool = False,
+        types: Optional[Union[type, Tuple[type, ...]]] = None,
+        priority: int = 0,
     ) -> None:
         """
         Register a detector function for a component type.
 
         The detector function determines if content should be treated as this component type.
 
+        Detectors are value-dependent by default and run for every piece of
+        content. A detector whose answer only depends on the class of the content
+        and on the ``is_*`` flags in kwargs can be declared cacheable; its result
+        is then memoized per content class and flag set.
+
+        Detectors with ``types`` hints are only run for content that is an
+        instance of one of those classes. Detectors run in order of descending
+        priority, and in registration order for equal priorities.
+
         Args:
             comp_type: The component type to register a detector for
             detector: Function that takes content and kwargs and returns True if the
                     content should be handled as this component type
+            cacheable: Whether the detector is type-pure and its result may be cached
+            types: Optional class or tuple of classes the detector can match
+            priority: Detectors with a higher priority run first (default: 0)
 
         Examples:
             >>> def image_detector(content, kwargs):
                     return isinstance(content, PIL.Image.Image)
-            >>> ComponentRegistry.register_detector(IMAGE_TYPE, image_detector)
+            >>> ComponentRegistry.register_detector(
+                    IMAGE_TYPE, image_detector, cacheable=True, types=PIL.Image.Image
+                )
         """
+        if isinstance(types, type):
+            types = (types,)
         cls._type_detectors[comp_type] = detector
+        cls._detector_options[comp_type] = (types, priority, cacheable)
+        cls.clear_detection_cache()
+
+    @classmethod
+    def get_detectors_for(cls, content_class: type) -> Tuple[DetectorEntry, ...]:
+        """
+        Get the detectors that can match content of the given class.
+
+        The result is computed once per class and ordered by descending priority,
+        then registration order.
+
+        Args:
+            content_class: The class of the content to detect
+
+        Returns:
+            tuple: (component type, detector, cacheable) entries to run in order
+        """
+        if cls._detection_cache_source is not cls._type_detectors:
+            # The detector table was replaced wholesale, the index is stale
+            cls.clear_detection_cache()
+        entries = cls._detector_index.get(content_class)
+        if entries is None:
+            ranked = []
+            for order, (comp_type, detector) in enumerate(cls._type_detectors.items()):
+                types, priority, cacheable = cls._detector_options.get(
+                    comp_type, (None, 0, False)
+                )
+                if types is None or issubclass(content_class, types):
+                    ranked.append((-priority, order, (comp_type, detector, cacheable)))
+            ranked.sort(key=lambda item: item[:2])
+            entries = tuple(entry for _, _, entry in ranked)
+            cls._detector_index[content_class] = entries
+        return entries
+
+    @classmethod
+    def run_detector(
+        cls,
+        comp_type: ComponentType,
+        detector: Detector,
+        content: Any,
+        kwargs: Mapping[str, Any],
+    ) -> bool:
+        """
+        Run a detector, recording its statistics if collection is enabled.
+
+        Args:
+            comp_type: The component type the detector belongs to
+            detector: The detector function
+            content: The content to detect
+            kwargs: The keyword arguments of the component
+
+        Returns:
+            bool: The result of the detector
+        """
+        if not cls._collect_detector_stats:
+            return bool(detector(content, kwargs))
+        start = time.perf_counter()
+        matched = detector(content, kwargs)
+        elapsed = time.perf_counter() - start
+        stats = cls._detector_stats.setdefault(comp_type, [0, 0, 0.0])
+        stats[0] += 1
+        stats[1] += 1 if matched else 0
+        stats[2] += elapsed
+        return bool(matched)
+
+    @classmethod
+    def enable_detector_stats(cls, enabled: bool = True) -> None:
+        """
+        Enable or disable collection of detector statistics.
+
+        Collection is disabled by default, as timing every detector call adds a
+        small overhead to each detection.
+
+        Args:
+            enabled: Whether statistics should be collected
+        """
+        cls._collect_detector_stats = enabled
+
+    @classmethod
+    def get_detector_stats(cls) -> Dict[ComponentType, Dict[str, float]]:
+        """
+        Get the collected detector statistics.
+
+        Cacheable detectors are counted for every detection that consults them,
+        including detections that reuse their cached result; reused results add
+        no time.
+
+        Returns:
+            dict: Mapping of component type to a dict with ``calls``, ``hits``,
+                  ``hit_rate``, ``total_ms`` and ``mean_ms``, sorted by total
+                  time spent, slowest first
+
+        Examples:
+            >>> ComponentRegistry.enable_detector_stats()
+            >>> # ... add some messages ...
+            >>> for comp_type, stats in ComponentRegistry.get_detector_stats().items():
+                    print(comp_type.value, stats["hit_rate"], stats["total_ms"])
+        """
+        report = {}
+        for comp_type, (calls, hits, seconds) in sorted(
+            cls._detector_stats.items(), key=lambda item: item[1][2], reverse=True
+        ):
+            report[comp_type] = {
+                "calls": calls,
+                "hits": hits,
+                "hit_rate": hits / calls if calls else 0.0,
+                "total_ms": seconds * 1000,
+                "mean_ms": seconds * 1000 / calls if calls else 0.0,
+            }
+        return report
+
+    @classmethod
+    def reset_detector_stats(cls) -> None:
+        """Discard all collected detector statistics."""
+        cls._detector_stats = {}
+
+    @classmethod
+    def get_detection_plan(cls, key: DetectionKey) -> Optional[DetectionPlan]:
+        """
+        Get the cached detection plan for a content class and flag set.
+
+        A plan is a tuple of the value-dependent detectors that still have to run
+        for every piece of content, the component type to use if none of them
+        matches, and the (component type, matched) outcomes of the cacheable
+        detectors that were run to resolve that type. If statistics are being
+        collected, each use of a cached plan counts those outcomes again.
+
+        Args:
+            key: Tuple of the content class and the frozenset of active flags
+
+        Returns:
+            DetectionPlan: The cached plan if present, None otherwise
+        """
+        if cls._detection_cache_source is not cls._type_detectors:
+            # The detector table was replaced wholesale, the plans are stale
+            cls.clear_detection_cache()
+            return None
+        plan = cls._detection_cache.get(key)
+        if plan is not None and cls._collect_detector_stats:
+            for comp_type, matched in plan[2]:
+                stats = cls._detector_stats.setdefault(comp_type, [0, 0, 0.0])
+                stats[0] += 1
+                stats[1] += 1 if matched else 0
+        return plan
+
+    @classmethod
+    def set_detection_plan(cls, key: DetectionKey, plan: DetectionPlan) -> None:
+        """
+        Cache the detection plan for a content class and flag set.
+
+        Args:
+            key: Tuple of the content class and the frozenset of active flags
+            plan: The detection plan to cache
+        """
+        if len(cls._detection_cache) >= cls._detection_cache_limit:
+            cls._detection_cache.clear()
+        cls._detection_cache[key] = plan
+
+    @classmethod
+    def clear_detection_cache(cls) -> None:
+        """
+        Clear the per-class detector index and all cached detection plans.
+
+        If the detector table has been replaced since the caches were built, the
+        options of detectors that are no longer in it are dropped as well.
+        """
+        if cls._detection_cache_source is not cls._type_detectors:
+            cls._detector_options = {
+                comp_type: options
+                for comp_type, options in cls._detector_options.items()
+                if comp_type in cls._type_detectors
+            }
+        cls._detector_index = {}
+        cls._detection_cache = {}
+        cls._detection_cache_source = cls._type_detectors
 
     @classmethod
     def register_renderer(
-        cls, comp_type: ComponentType, renderer: Callable[[Any, Dict[str, Any]], None]
+        cls,
+        comp_type: ComponentType,
+        renderer: Callable[..., None],
+        takes_title: bool = False,
     ) -> None:
         """
         Register a renderer function for a component type.
 
         The renderer function handles displaying the content in a Streamlit app.
+        Built-in component types are rendered through the same table, so this
+        also overrides the renderer of a built-in type. To wrap a renderer
+        instead, fetch the current one with get_renderer first and call it from
+        the new renderer.
 
         Args:
             comp_type: The component type to register a renderer for
             renderer: Function that takes content and kwargs and renders it in Streamlit
+            takes_title: Whether the renderer takes the component title, which may
+                    be None, as a third argument
 
         Examples:
             >>> def image_renderer(content, kwargs):
@@ -155,6 +400,23 @@ class ComponentRegistry:
             >>> ComponentRegistry.register_renderer(IMAGE_TYPE, image_renderer)
         """
         cls._renderers[comp_type] = renderer
+        if takes_title:
+            cls._titled_renderers.add(comp_type)
+        else:
+            cls._titled_renderers.discard(comp_type)
+
+    @classmethod
+    def renderer_takes_title(cls, comp_type: ComponentType) -> bool:
+        """
+        Check whether the renderer of a component type takes the component title.
+
+        Args:
+            comp_type: The component type to check
+
+        Returns:
+            bool: True if the renderer was registered with ``takes_title``
+        """
+        return comp_type in cls._titled_renderers
 
     @classmethod
     def get_custom_type(cls, name: str) -> Optional[ComponentType]:
@@ -197,6 +459,8 @@ class ComponentRegistry:
         """
         Get the renderer function for a component type.
 
+        Every built-in component type has a renderer registered by default.
+
         Args:
             comp_type: The component type to get the renderer for
 
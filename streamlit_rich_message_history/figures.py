@@ -0,0 +1,314 @@
+"""
+Figure payloads for the streamlit_rich_message_history package.
+
+This module defines compact stand-ins for figure objects that are expensive to
+keep alive or to re-render on every Streamlit rerun.
+"""
+
+import io
+import sys
+from typing import TYPE_CHECKING, Any, Optional, Union
+
+if TYPE_CHECKING:
+    import numpy as np
+
+RASTER_FORMATS = ("png", "svg")
+
+
+class RasterizedFigure:
+    """
+    A matplotlib figure rendered once to PNG or SVG.
+
+    Rendered through st.image, so reruns neither redraw the figure through Agg
+    nor keep the live Figure (and pyplot's reference to it) alive.
+
+    Attributes:
+        data: PNG bytes, or SVG markup as a string
+        format: Either "png" or "svg"
+    """
+
+    __slots__ = ("data", "format")
+
+    def __init__(self, data: Union[bytes, str], format: str):
+        """
+        Initialize a rasterized figure.
+
+        Args:
+            data: PNG bytes, or SVG markup as a string
+            format: Either "png" or "svg"
+        """
+        self.data = data
+        self.format = format
+
+    def __repr__(self) -> str:
+        return f"RasterizedFigure(format={self.format!r}, size={len(self.data)})"
+
+
+def rasterize_figure(
+    fig: Any, format: str = "png", dpi: Optional[float] = 200, close: bool = True
+) -> RasterizedFigure:
+    """
+    Render a matplotlib figure once and keep only the resulting image.
+
+    The defaults match what st.pyplot uses, so the image looks the same as the
+    live figure would.
+
+    Args:
+        fig: The matplotlib Figure to rasterize
+        format: "png" for a bitmap, or "svg" for vector markup
+        dpi: Resolution for PNG output
+        close: Whether to close the figure afterwards, releasing pyplot's
+               reference to it
+
+    Returns:
+        RasterizedFigure: The rendered image
+
+    Raises:
+        ValueError: If the format is not supported
+
+    Examples:
+        >>> fig, ax = plt.subplots()
+        >>> ax.plot([1, 2, 3])
+        >>> message.add(rasterize_figure(fig))
+    """
+    if format not in RASTER_FORMATS:
+        raise ValueError(
+            f"Unsupported raster format: {format!r}, expected one of {RASTER_FORMATS}"
+        )
+
+    buffer = io.BytesIO()
+    fig.savefig(buffer, format=format, dpi=dpi, bbox_inches="tight")
+    data: Union[bytes, str] = buffer.getvalue()
+    if format == "svg":
+        data = buffer.getvalue().decode("utf-8")
+
+    if close:
+        # Only figures created through pyplot are tracked by it
+        pyplot = sys.modules.get("matplotlib.pyplot")
+        if pyplot is not None:
+            pyplot.close(fig)
+
+    return RasterizedFigure(data, format)
+
+
+class SerializedPlotlyFigure:
+    """
+    A plotly figure serialized once to the JSON spec Streamlit sends to the browser.
+
+    st.plotly_chart serializes the whole figure on every rerun, which dominates
+    render time for figures with many points. The cached spec is passed to it as
+    a figure dict instead, so the figure itself does not have to be kept.
+
+    Attributes:
+        spec: The figure as a plotly JSON string
+        figure: The original figure, or None if it was dropped to free memory
+    """
+
+    __slots__ = ("spec", "figure")
+
+    def __init__(self, spec: str, figure: Any = None):
+        """
+        Initialize a serialized plotly figure.
+
+        Args:
+            spec: The figure as a plotly JSON string
+            figure: Optionally, the original figure
+        """
+        self.spec = spec
+        self.figure = figure
+
+    def __repr__(self) -> str:
+        return f"SerializedPlotlyFigure(size={len(self.spec)})"
+
+
+def serialize_plotly_figure(
+    fig: Any, keep_figure: bool = True
+) -> SerializedPlotlyFigure:
+    """
+    Serialize a plotly figure once, the same way st.plotly_chart does.
+
+    Args:
+        fig: The plotly Figure, or a figure dict, to serialize
+        keep_figure: Whether to keep a reference to the original figure; pass
+                     False to let it be garbage collected once serialized
+
+    Returns:
+        SerializedPlotlyFigure: The serialized figure
+
+    Examples:
+        >>> fig = go.Figure(data=go.Scattergl(y=np.random.randn(100_000)))
+        >>> message.add(serialize_plotly_figure(fig, keep_figure=False))
+    """
+    import plotly.io
+
+    spec = plotly.io.to_json(fig, validate=False)
+    return SerializedPlotlyFigure(spec, fig if keep_figure else None)
+
+
+# Per-point trace attributes that have to be decimated along with x and y
+_PER_POINT_PATHS = (
+    ("text",),
+    ("hovertext",),
+    ("customdata",),
+    ("marker", "color"),
+    ("marker", "size"),
+    ("marker", "symbol"),
+)
+
+
+def lttb_indices(x: Any, y: Any, n_out: int) -> "np.ndarray":
+    """
+    Select points with the Largest-Triangle-Three-Buckets algorithm.
+
+    LTTB keeps the first and last point and splits the rest into ``n_out - 2``
+    buckets. From each bucket it picks the point forming the largest triangle
+    with the point picked from the previous bucket and the mean of the next
+    bucket, which preserves the visual shape of the series. The points within a
+    bucket are evaluated with vectorized NumPy operations.
+
+    Args:
+        x: Numeric x values, sorted
+        y: Numeric y values, same length as x
+        n_out: Number of points to keep
+
+    Returns:
+        numpy.ndarray: Increasing indices of the selected points
+    """
+    import numpy as np
+
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    n = len(y)
+    if n_out >= n or n_out < 3:
+        return np.arange(n)
+
+    # Bucket j covers [edges[j], edges[j + 1]), for the n_out - 2 inner buckets
+    every = (n - 2) / (n_out - 2)
+    edges = (np.arange(n_out - 1) * every).astype(np.int64) + 1
+    edges[-1] = n - 1
+    counts = np.diff(edges)
+    mean_x = np.add.reduceat(x[:-1], edges[:-1]) / counts
+    mean_y = np.add.reduceat(y[:-1], edges[:-1]) / counts
+    # The point after the last bucket is the final point itself
+    next_x = np.append(mean_x[1:], x[-1])
+    next_y = np.append(mean_y[1:], y[-1])
+
+    selected = np.empty(n_out, dtype=np.int64)
+    selected[0] = 0
+    selected[-1] = n - 1
+    a = 0
+    for j in range(n_out - 2):
+        start, end = edges[j], edges[j + 1]
+        ax, ay = x[a], y[a]
+        areas = np.abs(
+            (ax - next_x[j]) * (y[start:end] - ay)
+            - (ax - x[start:end]) * (next_y[j] - ay)
+        )
+        a = start + int(np.argmax(np.nan_to_num(areas, nan=-1.0)))
+        selected[j + 1] = a
+    return selected
+
+
+def optimize_plotly_figure(
+    fig: Any, webgl_threshold: Optional[int] = None, max_points: Optional[int] = None
+) -> Any:
+    """
+    Make a plotly figure with very large scatter or line traces cheaper to draw.
+
+    Scatter traces with more than ``webgl_threshold`` points are switched to
+    ``scattergl``, which the browser draws with WebGL instead of SVG, unless they
+    use properties or values scattergl does not support, such as ``stackgroup``
+    or a ``spline`` line shape; those stay SVG scatter traces. Scatter and
+    scattergl traces with more than ``max_points`` points are downsampled to
+    ``max_points`` with LTTB, together with their per-point attributes such as
+    text, customdata and marker colors. Other traces are left as they are.
+
+    Args:
+        fig: The plotly Figure or figure dict to optimize
+        webgl_threshold: Optional point count above which scatter traces use WebGL
+        max_points: Optional point count above which traces are downsampled
+
+    Returns:
+        plotly.graph_objects.Figure: A new figure; the input is not modified
+
+    Examples:
+        >>> fig = go.Figure(data=go.Scatter(y=np.random.randn(2_000_000)))
+        >>> fig = optimize_plotly_figure(fig, webgl_threshold=10_000, max_points=5_000)
+    """
+    import plotly.graph_objects as go
+
+    figure = fig if isinstance(fig, go.Figure) else go.Figure(fig)
+    traces = []
+    for trace in figure.data:
+        if trace.type not in ("scatter", "scattergl") or trace.y is None:
+            traces.append(trace)
+            continue
+        props = trace.to_plotly_json()
+        n = len(props["y"])
+        if max_points is not None and n > max_points:
+            _decimate_trace(props, n, max_points)
+        if trace.type == "scatter" and webgl_threshold is not None:
+            if n > webgl_threshold:
+                traces.append(_to_scattergl(props))
+                continue
+        traces.append(props)
+
+    return go.Figure(data=traces, layout=figure.layout)
+
+
+def _to_scattergl(props: dict) -> Any:
+    """Get a scatter trace dict as a scattergl trace, if it has no scatter-only props."""
+    import plotly.graph_objects as go
+
+    try:
+        return go.Scattergl(
+            {key: value for key, value in props.items() if key != "type"}
+        )
+    except ValueError:
+        return props
+
+
+def _implicit_x(x0: Any, dx: Any, indices: Any) -> Any:
+    """Get the x values plotly places points at from x0 and dx, for some indices."""
+    import numpy as np
+
+    if isinstance(x0, str):
+        # A date x0, with dx in milliseconds as on plotly date axes
+        return np.datetime64(x0) + (indices * dx).astype("timedelta64[ms]")
+    return x0 + indices * dx
+
+
+def _decimate_trace(props: dict, n: int, max_points: int) -> None:
+    """Downsample the points of a scatter trace dict in place."""
+    import numpy as np
+
+    y = np.asarray(props["y"])
+    x = props.get("x")
+    x_numeric: "np.ndarray"
+    if x is None:
+        x_numeric = np.arange(n)
+    else:
+        x = np.asarray(x)
+        if np.issubdtype(x.dtype, np.datetime64):
+            x_numeric = x.astype("datetime64[ns]").astype(np.int64)
+        elif np.issubdtype(x.dtype, np.number):
+            x_numeric = x
+        else:
+            # Categorical x values are spaced evenly
+            x_numeric = np.arange(n)
+
+    keep = lttb_indices(x_numeric, y, max_points)
+    props["y"] = y[keep]
+    if x is None:
+        # Keep the original positions, which are implicit without x: x0 + i * dx
+        props["x"] = _implicit_x(props.pop("x0", 0), props.pop("dx", 1), keep)
+    else:
+        props["x"] = x[keep]
+
+    for path in _PER_POINT_PATHS:
+        parent = props
+        for part in path[:-1]:
+            parent = parent.get(part) or {}
+        value = parent.get(path[-1])
+        if value is not None and not isinstance(value, str) and len(value) == n:
+            parent[path[-1]] = np.asarray(value)[keep]
@@ -0,0 +1,398 @@
+"""
+Tabular payload helpers for the streamlit_rich_message_history package.
+
+This module defines the preview policy for large DataFrame, Series and table
+components: content above the policy's thresholds is rendered as a head/tail
+sample with a shape summary until the user asks for the full data. It also
+defines ArrowFrame, a DataFrame or Series serialized once to the Arrow bytes
+Streamlit sends to the browser.
+"""
+
+from typing import Any, Hashable, Mapping, Optional, Tuple
+
+from .utils import is_arrow_table, is_dataframe, is_series
+
+
+class PreviewPolicy:
+    """
+    Thresholds above which tabular content is rendered as a preview.
+
+    Attributes:
+        max_rows: Content with more rows than this is previewed
+        max_bytes: Frames using more memory than this are previewed; the size is
+                   the shallow pandas memory usage, which does not follow
+                   Python objects in object columns
+        sample_rows: Number of rows shown from both the head and the tail
+    """
+
+    __slots__ = ("max_rows", "max_bytes", "sample_rows")
+
+    def __init__(
+        self,
+        max_rows: int = 1000,
+        max_bytes: int = 5 * 1024 * 1024,
+        sample_rows: int = 5,
+    ):
+        """
+        Initialize a preview policy.
+
+        Args:
+            max_rows: Content with more rows than this is previewed
+            max_bytes: Frames using more memory than this are previewed
+            sample_rows: Number of rows shown from both the head and the tail
+        """
+        self.max_rows = max_rows
+        self.max_bytes = max_bytes
+        self.sample_rows = sample_rows
+
+    def applies_to(self, data: Any) -> bool:
+        """
+        Check whether data exceeds the thresholds of this policy.
+
+        Data that cannot be sliced into a preview, such as a pandas Styler, and
+        data with no more rows than the preview would show are always rendered
+        in full.
+
+        Args:
+            data: A DataFrame, Series, pyarrow Table, or a sequence of rows
+
+        Returns:
+            bool: True if the data should be rendered as a preview
+        """
+        if not (
+            is_dataframe(data)
+            or is_series(data)
+            or is_arrow_table(data)
+            or isinstance(data, (list, tuple))
+        ):
+            return False
+        rows, _ = data_shape(data)
+        if rows <= 2 * self.sample_rows:
+            return False
+        return rows > self.max_rows or data_nbytes(data) > self.max_bytes
+
+    def __repr__(self) -> str:
+        return (
+            f"PreviewPolicy(max_rows={self.max_rows}, max_bytes={self.max_bytes}, "
+            f"sample_rows={self.sample_rows})"
+        )
+
+
+_default_policy: Optional[PreviewPolicy] = None
+
+
+def set_preview_policy(policy: Optional[PreviewPolicy]) -> None:
+    """
+    Set the preview policy used by DATAFRAME, SERIES and TABLE components.
+
+    Previews are off by default. A component can override the default with the
+    ``preview`` keyword argument: a PreviewPolicy, True for the default
+    thresholds, or False to always render the full data.
+
+    Args:
+        policy: The policy to apply, or None to turn previews off
+
+    Examples:
+        >>> set_preview_policy(PreviewPolicy(max_rows=1000, max_bytes=5_000_000))
+        >>> message.add_dataframe(huge_df)  # rendered as a preview
+        >>> message.add_dataframe(huge_df, preview=False)  # always rendered in full
+    """
+    global _default_policy
+    _default_policy = policy
+
+
+def get_preview_policy(kwargs: Mapping[str, Any]) -> Optional[PreviewPolicy]:
+    """
+    Get the preview policy that applies to a component.
+
+    Args:
+        kwargs: The keyword arguments of the component
+
+    Returns:
+        PreviewPolicy: The applicable policy, or None if previews are off
+    """
+    preview = kwargs.get("preview", None)
+    if preview is None:
+        return _default_policy
+    if preview is True:
+        return PreviewPolicy()
+    if preview is False:
+        return None
+    return preview
+
+
+#: Frames with at most this many cells have their values checked for changes
+#: before each render; larger frames need ArrowFrame.invalidate() after values
+#: are changed in place
+VALUE_HASH_MAX_CELLS = 100_000
+
+
+def data_shape(data: Any) -> Tuple[int, int]:
+    """
+    Get the number of rows and columns of tabular data.
+
+    Args:
+        data: A DataFrame, Series, pyarrow Table, or a sequence of rows
+
+    Returns:
+        tuple: (rows, columns); columns is 1 for a Series and for rows that are
+               not sequences themselves, and excludes the index columns of a
+               pyarrow Table
+    """
+    if is_dataframe(data):
+        return data.shape
+    if is_series(data):
+        return len(data), 1
+    if is_arrow_table(data):
+        index_columns = _arrow_index_columns(data)
+        stored = sum(isinstance(column, str) for column in index_columns)
+        return data.num_rows, data.num_columns - stored
+    rows = len(data)
+    first = data[0] if rows and isinstance(data, (list, tuple)) else None
+    return rows, len(first) if isinstance(first, (list, tuple, dict)) else 1
+
+
+def data_nbytes(data: Any) -> int:
+    """
+    Get the shallow memory usage of a DataFrame, Series or pyarrow Table.
+
+    Args:
+        data: A DataFrame, Series, pyarrow Table, or a sequence of rows
+
+    Returns:
+        int: Bytes used by a DataFrame, Series or pyarrow Table, 0 for other data
+    """
+    if is_dataframe(data):
+        return int(data.memory_usage(index=True, deep=False).sum())
+    if is_series(data):
+        return int(data.memory_usage(index=True, deep=False))
+    if is_arrow_table(data):
+        return int(data.nbytes)
+    return 0
+
+
+def head_tail(data: Any, n: int) -> Any:
+    """
+    Get the first and last n rows of tabular data.
+
+    Args:
+        data: A DataFrame, Series, pyarrow Table, or a sequence of rows
+        n: Number of rows to take from the head and from the tail
+
+    Returns:
+        The head and tail rows, of the same kind as data, except that only those
+        rows of a pyarrow Table are converted to a DataFrame; pandas objects
+        keep their original index labels. Data with at most 2n rows is returned
+        as is
+    """
+    rows = data_shape(data)[0]
+    if rows <= 2 * n:
+        return data
+    if is_arrow_table(data):
+        import pandas as pd
+
+        return pd.concat(
+            [
+                _arrow_rows_to_pandas(data, 0, n),
+                _arrow_rows_to_pandas(data, rows - n, n),
+            ]
+        )
+    if is_dataframe(data) or is_series(data):
+        import pandas as pd
+
+        return pd.concat([data.head(n), data.tail(n)])
+    return list(data[:n]) + list(data[-n:])
+
+
+def _arrow_index_columns(table: Any) -> list:
+    """Get the pandas index descriptions stored in the metadata of a pyarrow Table."""
+    metadata = table.schema.pandas_metadata or {}
+    return metadata.get("index_columns", [])
+
+
+def _arrow_rows_to_pandas(table: Any, offset: int, length: int) -> Any:
+    """Convert a slice of a pyarrow Table to pandas, keeping its index labels."""
+    frame = table.slice(offset, length).to_pandas()
+    index_columns = _arrow_index_columns(table)
+    if len(index_columns) == 1 and isinstance(index_columns[0], dict):
+        # A RangeIndex is stored as metadata only, and restarts at 0 in a slice
+        import pandas as pd
+
+        index = index_columns[0]
+        start = index["start"] + offset * index["step"]
+        frame.index = pd.RangeIndex(
+            start, start + len(frame) * index["step"], index["step"], name=index["name"]
+        )
+    return frame
+
+
+class ArrowFrame:
+    """
+    A DataFrame or Series serialized once to the Arrow IPC bytes st.dataframe sends.
+
+    st.dataframe converts the frame to Arrow on every rerun, which dominates
+    render time for large frames. The pyarrow Table read from the cached bytes
+    is rendered instead. While the original frame is kept, it is checked for
+    changes before each render, and the bytes are rebuilt if it changed. Values
+    changed in place are only detected in frames of at most
+    VALUE_HASH_MAX_CELLS cells; call invalidate() after changing the values of
+    a larger frame.
+
+    Attributes:
+        data: The frame as Arrow IPC bytes
+        frame: The original DataFrame or Series, or None if it was dropped, in
+               which case data is the source of truth
+    """
+
+    __slots__ = ("data", "frame", "_fingerprint", "_table")
+
+    def __init__(self, data: bytes, frame: Any = None):
+        """
+        Initialize an Arrow frame.
+
+        Args:
+            data: The frame as Arrow IPC bytes
+            frame: Optionally, the original DataFrame or Series
+        """
+        self.data = data
+        self.frame = frame
+        self._fingerprint = None if frame is None else _frame_fingerprint(frame)
+        self._table: Any = None
+
+    @property
+    def is_stale(self) -> bool:
+        """Whether the kept frame changed since the bytes were built."""
+        return (
+            self.frame is not None
+            and _frame_fingerprint(self.frame) != self._fingerprint
+        )
+
+    def refresh(self) -> bytes:
+        """
+        Rebuild the bytes if the kept frame changed, and return them.
+
+        Returns:
+            bytes: The up-to-date Arrow IPC bytes
+        """
+        if self.is_stale:
+            self.data = _to_arrow_bytes(self.frame)
+            self._fingerprint = _frame_fingerprint(self.frame)
+            self._table = None
+        return self.data
+
+    def table(self) -> Any:
+        """
+        Get the up-to-date bytes as a pyarrow Table.
+
+        The table is read once per version of the bytes and kept. It shares
+        its buffers with the bytes, so keeping it takes no extra memory.
+
+        Returns:
+            pyarrow.Table: The frame as a pyarrow Table
+        """
+        data = self.refresh()
+        if self._table is None:
+            import pyarrow as pa
+
+            self._table = pa.ipc.open_stream(data).read_all()
+        return self._table
+
+    def invalidate(self) -> None:
+        """
+        Mark the bytes as outdated, to be rebuilt on the next render.
+
+        Changes to the shape, labels, dtypes or index of the kept frame are
+        detected automatically, and so are changed values in frames of at most
+        VALUE_HASH_MAX_CELLS cells. Call this after changing the values of a
+        larger frame in place, for example through ``df.loc[...] = ...``.
+        """
+        if self.frame is not None:
+            self._fingerprint = None
+
+    def drop_frame(self) -> None:
+        """Release the original frame, keeping only the Arrow bytes."""
+        self.refresh()
+        self.frame = None
+        self._fingerprint = None
+
+    def to_pandas(self) -> Any:
+        """
+        Get the frame as a pandas object.
+
+        Returns:
+            The kept frame, or a DataFrame read back from the Arrow bytes
+        """
+        if self.frame is not None:
+            return self.frame
+        return self.table().to_pandas()
+
+    def __repr__(self) -> str:
+        return f"ArrowFrame(size={len(self.data)}, frame={self.frame is not None})"
+
+
+def to_arrow_frame(data: Any, keep_frame: bool = True) -> ArrowFrame:
+    """
+    Serialize a DataFrame or Series once, the same way st.dataframe does.
+
+    Args:
+        data: The DataFrame or Series to serialize
+        keep_frame: Whether to keep a reference to the original frame; pass
+                    False to let it be garbage collected once serialized, in
+                    which case later changes to it are not picked up
+
+    Returns:
+        ArrowFrame: The serialized frame
+
+    Examples:
+        >>> message.add(to_arrow_frame(df, keep_frame=False))
+    """
+    return ArrowFrame(_to_arrow_bytes(data), data if keep_frame else None)
+
+
+def _to_arrow_bytes(data: Any) -> bytes:
+    """Serialize a DataFrame or Series to Arrow IPC bytes."""
+    from streamlit import dataframe_util
+
+    if is_series(data):
+        data = data.to_frame()
+    return dataframe_util.convert_pandas_df_to_arrow_bytes(data)
+
+
+def _frame_fingerprint(frame: Any) -> Tuple[Hashable, ...]:
+    """
+    Get a fingerprint of a DataFrame or Series, detecting changes to it.
+
+    The fingerprint covers the shape, column labels or name, dtypes and the
+    index object, which catches appended or removed rows and columns, dtype
+    changes and a replaced index. Frames of at most VALUE_HASH_MAX_CELLS cells
+    also have their values hashed, which catches values changed in place;
+    hashing larger ones would cost about as much as converting them again.
+    """
+    if is_series(frame):
+        structure: Tuple[Hashable, ...] = (
+            frame.shape,
+            frame.name,
+            str(frame.dtype),
+            id(frame.index),
+        )
+    else:
+        structure = (
+            frame.shape,
+            tuple(frame.columns),
+            tuple(str(dtype) for dtype in frame.dtypes),
+            id(frame.index),
+        )
+    return structure + (_values_hash(frame),)
+
+
+def _values_hash(frame: Any) -> Optional[int]:
+    """Hash the values and index of a small frame, or get None for a large one."""
+    if frame.size > VALUE_HASH_MAX_CELLS:
+        return None
+    import pandas as pd
+
+    try:
+        return int(pd.util.hash_pandas_object(frame, index=True).sum())
+    except TypeError:
+        # Unhashable values, such as lists in an object column
+        return None
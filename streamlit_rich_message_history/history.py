@@ -1,7 +1,27 @@
-from typing import Any, Callable, List, Optional
-
+import itertools
+import os
+import tempfile
+import time
+import weakref
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    List,
+    Mapping,
+    MutableSequence,
+    Optional,
+    Tuple,
+    Union,
+)
+
+from .backends import get_render_backend, st
 from .enums import ComponentRegistry, ComponentType
+from .instrumentation import RenderProfile, RenderRecord, listen_to_renders
+from .message_log import MessageLog
 from .messages import AssistantMessage, ErrorMessage, Message, UserMessage
+from .serialization import load_messages, save_messages
+from .sqlite_store import SQLiteMessageStore
 
 
 class MessageHistory:
@@ -17,11 +37,84 @@ class MessageHistory:
 
     Attributes:
         messages: A list of Message objects that comprise the conversation history
+        use_fragments: Whether each message is rendered in its own st.fragment
+        memory_budget: Optional number of bytes the component payloads may hold
+                       before heavy ones are spilled to disk
+        spill_threshold: Minimum estimated size in bytes of a payload to spill
+        profile: Whether render passes are profiled; see render_profile
+        last_profile: RenderProfile of the last profiled render pass, if any
     """
 
-    def __init__(self):
-        """Initialize an empty message history."""
-        self.messages: List[Message] = []
+    def __init__(
+        self,
+        use_fragments: bool = False,
+        memory_budget: Optional[int] = None,
+        spill_dir: Optional[str] = None,
+        spill_threshold: int = 64 * 1024,
+        log_path: Optional[str] = None,
+        db_path: Optional[str] = None,
+        conversation_id: str = "default",
+        profile: bool = False,
+    ):
+        """
+        Initialize an empty message history.
+
+        Args:
+            use_fragments: Render each message inside its own ``st.fragment``, so
+                          that a widget interaction within a message (a plotly
+                          selection, a button in a custom component) only reruns
+                          that message instead of the whole script and history
+            memory_budget: Optional number of bytes the component payloads may
+                           hold; see enforce_memory_budget
+            spill_dir: Directory for spilled payloads; a temporary directory that
+                       is removed with the history is used if not set
+            spill_threshold: Payloads with a smaller estimated size are never
+                             spilled, so text and small components stay resident
+            log_path: Optional path of an append-only log file the messages are
+                      kept in; see message_log.MessageLog. An existing log is
+                      reopened, and its messages are decoded on first access
+            db_path: Optional path of a SQLite database the messages are kept
+                     in; see sqlite_store.SQLiteMessageStore. One database can
+                     hold the conversations of many histories
+            conversation_id: With a ``db_path``, the conversation to open
+            profile: Record the render time of every message and component of
+                     each render pass in ``last_profile``; see render_profile
+
+        Raises:
+            ValueError: If both a log_path and a db_path are given
+        """
+        if log_path is not None and db_path is not None:
+            raise ValueError("Use either a log_path or a db_path, not both")
+        self.messages: MutableSequence[Message]
+        if log_path is not None:
+            self.messages = MessageLog(log_path)
+        elif db_path is not None:
+            self.messages = SQLiteMessageStore(db_path, conversation_id)
+        else:
+            self.messages = []
+        self.use_fragments = use_fragments
+        self.memory_budget = memory_budget
+        self.spill_threshold = spill_threshold
+        self._spill_dir = spill_dir
+        self._spill_tmp: Optional[tempfile.TemporaryDirectory] = None
+        self._render_clock = itertools.count()
+        self._last_rendered: "weakref.WeakKeyDictionary[Message, int]" = (
+            weakref.WeakKeyDictionary()
+        )
+        self.profile = profile
+        self.last_profile: Optional[RenderProfile] = None
+        self._profile_records: Optional[List[RenderRecord]] = None
+
+    def __getstate__(self) -> Dict[str, Any]:
+        state = self.__dict__.copy()
+        # Weak dictionaries cannot be pickled; the messages are pickled anyway
+        state["_last_rendered"] = list(self._last_rendered.items())
+        return state
+
+    def __setstate__(self, state: Dict[str, Any]) -> None:
+        last_rendered = state.pop("_last_rendered")
+        self.__dict__.update(state)
+        self._last_rendered = weakref.WeakKeyDictionary(last_rendered)
 
     def add_message(self, message: Message):
         """
@@ -33,6 +126,7 @@ class MessageHistory:
         Returns:
             Message: The added message, allowing for method chaining
         """
+        self.sync_log()
         self.messages.append(message)
         return message  # Allow method chaining or further modification
 
@@ -101,28 +195,458 @@ class MessageHistory:
         self.add_message(message)
         return message
 
-    def render_all(self):
+    def render_all(
+        self,
+        budget_ms: Optional[float] = None,
+        newest_first: bool = True,
+        key: str = "message_history",
+    ):
         """
         Render all messages in the history to the Streamlit UI.
 
         This renders each message in sequence, from first to last.
-        """
-        for message in self.messages:
-            message.render()
 
-    def render_last(self, n: int = 1):
+        With a ``budget_ms``, messages are rendered until the wall-clock budget is
+        used up. The messages that did not fit are replaced by a single button
+        offering to render the rest; once clicked, the full history is rendered
+        for the rest of the session, which the button label says. A message that
+        has started rendering is always finished, and at least one message is
+        rendered. Newest first, every rendered message reserves one container
+        above itself for the older ones, so skipped messages cost nothing.
+
+        Args:
+            budget_ms: Optional time budget for the whole history in milliseconds
+            newest_first: With a budget, whether the newest messages get the budget
+                          first (default) or the oldest ones. Messages are shown in
+                          chronological order either way
+            key: Unique key for this history's widgets and session state, needed
+                 if several histories are rendered on the same page
+
+        Examples:
+            >>> history.render_all(budget_ms=200)
+        """
+        unbudgeted_key = f"{key}_unbudgeted"
+        if budget_ms is None or st.session_state.get(unbudgeted_key, False):
+            for position, message in enumerate(self.messages):
+                self._render_message(message, f"{key}/{position}")
+            self._finish_render()
+            return
+
+        deadline = time.perf_counter() + budget_ms / 1000
+        messages = self.messages
+        rendered = 0
+        if newest_first:
+            # Each message is rendered below a container reserved for the older
+            # ones, which keeps chronological order; the last such container
+            # holds the control for the skipped messages
+            older = st.container()
+            for position in reversed(range(len(messages))):
+                parent = older
+                with parent:
+                    older = st.container()
+                    self._render_message(messages[position], f"{key}/{position}")
+                rendered += 1
+                if time.perf_counter() >= deadline:
+                    break
+        else:
+            for position, message in enumerate(messages):
+                self._render_message(message, f"{key}/{position}")
+                rendered += 1
+                if time.perf_counter() >= deadline:
+                    break
+            older = st.container()
+
+        remaining = len(messages) - rendered
+        if remaining > 0:
+            with older:
+                st.button(
+                    f"Render {remaining} remaining messages for this session",
+                    key=f"{key}_render_remaining",
+                    on_click=_set_session_value,
+                    args=(unbudgeted_key, True),
+                )
+        self._finish_render()
+
+    def render_last(self, n: int = 1, key: str = "message_history"):
         """
         Render only the last n messages in the history.
 
         Args:
             n: Number of most recent messages to render (default: 1)
+            key: Unique key for this history's widgets, needed if several
+                 histories are rendered on the same page
+        """
+        messages = self.messages[-n:]
+        start = len(self.messages) - len(messages)
+        for position, message in enumerate(messages, start):
+            self._render_message(message, f"{key}/{position}")
+        self._finish_render()
+
+    def render_window(self, page_size: int = 20, key: str = "message_history"):
         """
-        for message in self.messages[-n:]:
+        Render the most recent messages, with a control to load earlier ones.
+
+        Only the last ``page_size`` messages are rendered at first. If there are
+        older messages, a "Load earlier messages" button is shown above them,
+        which grows the window by another ``page_size`` messages. The window size
+        is kept in ``st.session_state``, so it is tracked per session.
+
+        Args:
+            page_size: Number of messages in the first window and added per click
+            key: Unique key for this history's window state and widgets, needed
+                 if several histories are rendered on the same page
+
+        Raises:
+            ValueError: If page_size is smaller than 1
+
+        Examples:
+            >>> history.render_window(page_size=50)
+        """
+        if page_size < 1:
+            raise ValueError(f"page_size must be at least 1, got {page_size}")
+
+        state_key = f"{key}_window"
+        window = st.session_state.get(state_key, page_size)
+        hidden = len(self.messages) - window
+        if hidden > 0:
+            st.button(
+                f"Load earlier messages ({hidden} hidden)",
+                key=f"{key}_load_earlier",
+                on_click=_set_session_value,
+                args=(state_key, window + page_size),
+            )
+            messages = self.messages[-window:]
+        else:
+            messages = self.messages
+
+        start = len(self.messages) - len(messages)
+        for position, message in enumerate(messages, start):
+            self._render_message(message, f"{key}/{position}")
+        self._finish_render()
+
+    def _render_message(self, message: Message, key: Optional[str] = None) -> None:
+        """
+        Render a single message, isolated in a fragment if enabled.
+
+        Args:
+            message: The message to render
+            key: The key of the message, from which its components without a key
+                 derive theirs, so that their widget state survives reruns
+        """
+        if key is not None:
+            for index, component in enumerate(message.components):
+                if component._key is None:
+                    component._assign_key(f"{key}/{index}")
+        self._last_rendered[message] = next(self._render_clock)
+        if self.profile:
+            if self._profile_records is None:
+                self._profile_records = []
+            with listen_to_renders(self._profile_records.append):
+                self._render_message_content(message)
+        else:
+            self._render_message_content(message)
+
+    def _render_message_content(self, message: Message) -> None:
+        """Render a message in a fragment if enabled, or directly."""
+        if self.use_fragments:
+            _render_message_fragment(message)
+        else:
             message.render()
 
+    def enforce_memory_budget(self) -> int:
+        """
+        Spill heavy payloads to disk until the history fits its memory budget.
+
+        This is called after every render. If the estimated size of all component
+        payloads exceeds ``memory_budget``, the DataFrame, Series and figure
+        payloads of at least ``spill_threshold`` bytes are written to the spill
+        directory, starting with the messages rendered least recently, until the
+        history fits the budget again. Spilled payloads are read back
+        transparently when their component is rendered: frames as they were,
+        matplotlib figures as PNG images, the figure itself being closed when it
+        is spilled, and plotly figures as serialized specs. Spill files are kept
+        until the history is cleared, so content spilled again unchanged on a
+        later rerun is not written again.
+
+        Returns:
+            int: The number of payloads spilled
+
+        Examples:
+            >>> history = MessageHistory(memory_budget=500 * 1024**2)
+        """
+        if self.memory_budget is None:
+            return 0
+        resident = self._resident_messages()
+        total = sum(
+            component.memory_usage()
+            for _, message in resident
+            for component in message.components
+        )
+        if total <= self.memory_budget:
+            return 0
+
+        # Messages never rendered come first, then by last render, then by age
+        resident.sort(key=lambda item: (self._last_rendered.get(item[1], -1), item[0]))
+        spilled = 0
+        for _, message in resident:
+            for component in message.components:
+                size = component.memory_usage()
+                if size < self.spill_threshold:
+                    continue
+                if component.spill(self._get_spill_dir()):
+                    total -= size - component.memory_usage()
+                    spilled += 1
+                    if total <= self.memory_budget:
+                        return spilled
+        return spilled
+
+    def _resident_messages(self) -> List[Tuple[int, Message]]:
+        """Get the (index, message) pairs of the messages held in memory."""
+        if isinstance(self.messages, (MessageLog, SQLiteMessageStore)):
+            return self.messages.materialized
+        return list(enumerate(self.messages))
+
+    def _finish_render(self) -> None:
+        """Log changed messages and enforce the memory budget after a render."""
+        if self._profile_records is not None:
+            positions = {id(message): i for i, message in self._resident_messages()}
+            self.last_profile = RenderProfile(self._profile_records, positions)
+            self._profile_records = None
+        self.sync_log()
+        self.enforce_memory_budget()
+
+    def render_profile(self, location: str = "sidebar", top: int = 10) -> None:
+        """
+        Show the render profile of the last render pass.
+
+        The panel ranks the slowest messages and components of the last render
+        and shows the cumulative time per component type and per renderer, with
+        the renderers registered outside this package marked as custom. Calling
+        it turns profiling on, so it can be put before the history is rendered:
+        the panel then shows the render of the previous rerun, and nothing until
+        the history has been rendered once.
+
+        Args:
+            location: "sidebar" to show the panel in the sidebar, or "expander"
+                      to show it in a collapsed expander where it is called
+            top: Number of messages and components to rank
+
+        Raises:
+            ValueError: If the location is not "sidebar" or "expander"
+
+        Examples:
+            >>> history = MessageHistory(profile=True)
+            >>> history.render_all()
+            >>> history.render_profile()
+        """
+        if location == "sidebar":
+            container = st.sidebar.expander("Render profile", expanded=True)
+        elif location == "expander":
+            container = st.expander("Render profile", expanded=False)
+        else:
+            raise ValueError(
+                f"location must be 'sidebar' or 'expander', got {location!r}"
+            )
+        self.profile = True
+
+        profile = self.last_profile
+        with container:
+            if profile is None:
+                st.caption("No render profiled yet, rerun to see one.")
+                return
+            st.caption(
+                f"{profile.message_count} messages and {profile.component_count} "
+                f"components rendered in {profile.total_ms:.1f} ms, "
+                f"{profile.failed_count} failed"
+            )
+            for title, rows in (
+                ("Slowest messages", profile.slowest_messages(top)),
+                ("Slowest components", profile.slowest_components(top)),
+                ("Time per component type", profile.by_type()),
+                ("Time per renderer", profile.by_renderer()),
+            ):
+                if rows:
+                    st.markdown(f"**{title}**")
+                    st.dataframe(rows, hide_index=True, use_container_width=True)
+
+    def sync_log(self) -> int:
+        """
+        Write the messages that gained components since they were stored.
+
+        This is called when a message is added and after every render, so
+        components added to the last message, for example while streaming a
+        response, are written to the log or database. With messages kept in
+        memory, this does nothing.
+
+        Returns:
+            int: The number of messages written
+        """
+        if isinstance(self.messages, (MessageLog, SQLiteMessageStore)):
+            return self.messages.sync()
+        return 0
+
+    def messages_by_role(self, role: str, limit: Optional[int] = None) -> List[Message]:
+        """
+        Get the messages with a role, oldest first.
+
+        With a database, this is an indexed query that only decodes the
+        messages returned.
+
+        Args:
+            role: The role, as in ``Message.user``, e.g. "user" or "assistant"
+            limit: Optional number of messages; the most recent ones are returned
+
+        Returns:
+            list: The messages
+
+        Examples:
+            >>> questions = history.messages_by_role("user", limit=5)
+        """
+        if isinstance(self.messages, SQLiteMessageStore):
+            return self.messages.by_role(role, limit)
+        messages = [message for message in self.messages if message.user == role]
+        if limit is not None:
+            messages = messages[-limit:] if limit > 0 else []
+        return messages
+
+    def evict_lazy_content(self, keep_last: int = 0) -> int:
+        """
+        Release the content produced from LazyContent in older messages.
+
+        Released content is produced again if its message is rendered again.
+
+        Args:
+            keep_last: Number of most recent messages whose content is kept
+
+        Returns:
+            int: The number of components whose content was released
+
+        Examples:
+            >>> history.evict_lazy_content(keep_last=10)
+        """
+        resident = self._resident_messages()
+        cutoff = len(self.messages) - keep_last
+        return sum(
+            component.evict()
+            for index, message in resident
+            if index < cutoff
+            for component in message.components
+        )
+
+    def _get_spill_dir(self) -> str:
+        """Get the directory for spilled payloads, creating it if needed."""
+        if self._spill_dir is None:
+            self._spill_tmp = tempfile.TemporaryDirectory(prefix="srmh-spill-")
+            self._spill_dir = self._spill_tmp.name
+        else:
+            os.makedirs(self._spill_dir, exist_ok=True)
+        return self._spill_dir
+
+    def memory_usage(self, deep: bool = True, refresh: bool = False) -> Dict[str, Any]:
+        """
+        Estimate the memory held by the messages in the history.
+
+        Estimates are cached per component, so this is cheap enough to call on
+        every rerun, for example to show the footprint of a session.
+
+        Args:
+            deep: Whether to count the objects referenced from object columns and
+                  collection items, rather than only their containers
+            refresh: Whether to recompute the cached per-component estimates
+
+        Returns:
+            dict: A breakdown with the keys
+                  - total: Estimated bytes held by all messages
+                  - by_type: Estimated bytes per component type value
+                  - messages: For every message, in order, a dict with its
+                    ``index``, ``user``, ``total`` and ``by_type``; with a log,
+                    only the messages decoded so far are included, since the
+                    others are not held in memory
+
+        Examples:
+            >>> usage = history.memory_usage()
+            >>> st.caption(f"History: {usage['total'] / 1e6:.1f} MB")
+        """
+        by_type: Dict[str, int] = {}
+        messages = []
+        for index, message in self._resident_messages():
+            message_by_type = message.memory_usage(deep, refresh)
+            for type_name, size in message_by_type.items():
+                by_type[type_name] = by_type.get(type_name, 0) + size
+            messages.append(
+                {
+                    "index": index,
+                    "user": message.user,
+                    "total": sum(message_by_type.values()),
+                    "by_type": message_by_type,
+                }
+            )
+        return {
+            "total": sum(by_type.values()),
+            "by_type": by_type,
+            "messages": messages,
+        }
+
+    def save(self, path: str) -> None:
+        """
+        Save the messages to a file.
+
+        The file is a versioned archive holding text and metadata in a compact
+        JSON record section, DataFrames and Series as Parquet, matplotlib figures
+        as PNG or SVG and plotly figures as their JSON spec. Component keyword
+        arguments that are not JSON-serializable are not saved.
+
+        Args:
+            path: Path of the file to write; an existing file is replaced
+
+        Raises:
+            TypeError: If a component holds content that cannot be saved
+            ValueError: If a DataFrame or Series cannot be stored as Parquet
+
+        Examples:
+            >>> history.save("chat.srmh")
+        """
+        save_messages(self.messages, path)
+
+    @classmethod
+    def load(cls, path: str, **kwargs) -> "MessageHistory":
+        """
+        Load a history saved with save.
+
+        Loading only reads the message index. DataFrames, Series and figures are
+        read from the file the first time their component is rendered, so the
+        file has to stay in place until then. Matplotlib figures are loaded as
+        images and plotly figures as serialized specs.
+
+        Args:
+            path: Path of the file to read
+            **kwargs: Arguments for the MessageHistory constructor, such as
+                      use_fragments or memory_budget
+
+        Returns:
+            MessageHistory: A new history holding the loaded messages
+
+        Raises:
+            ValueError: If the file is not a saved history, or was saved by a
+                        newer version of this package
+
+        Examples:
+            >>> history = MessageHistory.load("chat.srmh", use_fragments=True)
+        """
+        history = cls(**kwargs)
+        history.messages.extend(load_messages(path))
+        return history
+
     def clear(self):
         """Clear all messages from the history, resetting it to empty."""
-        self.messages = []
+        for _, message in self._resident_messages():
+            for component in message.components:
+                component.discard_spill_file()
+        if isinstance(self.messages, (MessageLog, SQLiteMessageStore)):
+            self.messages.clear()
+        else:
+            self.messages = []
+        self._last_rendered.clear()
 
     @staticmethod
     def register_component_type(name: str) -> ComponentType:
@@ -142,7 +666,11 @@ class MessageHistory:
 
     @staticmethod
     def register_component_detector(
-        component_type: ComponentType, detector: Callable[[Any, dict], bool]
+        component_type: ComponentType,
+        detector: Callable[[Any, Mapping[str, Any]], bool],
+        cacheable: bool = False,
+        types: Optional[Union[type, Tuple[type, ...]]] = None,
+        priority: int = 0,
     ) -> None:
         """
         Register a detector function for a component type.
@@ -154,12 +682,21 @@ class MessageHistory:
             component_type: The component type to register a detector for
             detector: A function that takes (content, kwargs) and returns True if
                      the content should be treated as this component type
+            cacheable: Whether the detector only depends on the content class and
+                      ``is_*`` flags, so its result can be cached per class
+            types: Optional class or tuple of classes the detector can match;
+                   the detector is skipped for content of any other class
+            priority: Detectors with a higher priority run first (default: 0)
         """
-        ComponentRegistry.register_detector(component_type, detector)
+        ComponentRegistry.register_detector(
+            component_type, detector, cacheable, types, priority
+        )
 
     @staticmethod
     def register_component_renderer(
-        component_type: ComponentType, renderer: Callable[[Any, dict], None]
+        component_type: ComponentType,
+        renderer: Callable[..., None],
+        takes_title: bool = False,
     ) -> None:
         """
         Register a renderer function for a component type.
@@ -170,8 +707,10 @@ class MessageHistory:
             component_type: The component type to register a renderer for
             renderer: A function that takes (content, kwargs) and renders
                      the component in the Streamlit app
+            takes_title: Whether the renderer takes the component title as a
+                     third argument, as in (content, kwargs, title)
         """
-        ComponentRegistry.register_renderer(component_type, renderer)
+        ComponentRegistry.register_renderer(component_type, renderer, takes_title)
 
     @staticmethod
     def register_component_method(
@@ -192,3 +731,18 @@ class MessageHistory:
                         (if None, a default implementation will be used)
         """
         Message.register_component_method(method_name, component_type, method_func)
+
+
+def _render_message_fragment(message: Message) -> None:
+    """Render a message as a fragment that reruns on its own."""
+    get_render_backend().fragment_for(_render_message_body)(message)
+
+
+def _render_message_body(message: Message) -> None:
+    """Render a message; wrapped as a fragment by _render_message_fragment."""
+    message.render()
+
+
+def _set_session_value(state_key: str, value: Any) -> None:
+    """Widget callback storing a value in the session state."""
+    st.session_state[state_key] = value
@@ -0,0 +1,310 @@
+"""
+Render instrumentation for the streamlit_rich_message_history package.
+
+MessageComponent.render and Message.render report a RenderRecord to the
+registered render listeners every time they run: the wall time, the component
+type and renderer, the estimated payload size and whether an error was caught
+and shown in place of the content. Without listeners, rendering only checks
+whether there are any, so instrumentation costs nothing unless it is used.
+
+Listeners added with add_render_listener receive the renders of every session;
+listen_to_renders registers a listener for the current thread only, which is
+the current session's script run in a Streamlit app. RenderProfile summarizes
+the records of one pass over a history, for MessageHistory.render_profile.
+"""
+
+import contextlib
+import contextvars
+import warnings
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    Iterator,
+    List,
+    Mapping,
+    NamedTuple,
+    Optional,
+    Sequence,
+    Tuple,
+)
+
+from .enums import ComponentType
+
+
+class RenderRecord(NamedTuple):
+    """
+    The measurements of one render of a component or message.
+
+    Attributes:
+        kind: "component" or "message"
+        elapsed_ms: Wall time of the render in milliseconds; for a message, this
+                    includes its components
+        component_type: Type of the component, None for a message
+        renderer: Qualified name of the function that rendered the component,
+                  None for a message
+        payload_bytes: Estimated size of the content, as by
+                       MessageComponent.memory_usage; for a message, the sum
+                       over its components
+        failed: Whether an exception was caught and an error shown instead
+        component: The component rendered, None for a message
+        message: The message rendered, or for a component, the message it was
+                 rendered in, if any
+    """
+
+    kind: str
+    elapsed_ms: float
+    component_type: Optional[ComponentType]
+    renderer: Optional[str]
+    payload_bytes: int
+    failed: bool
+    component: Optional[Any]
+    message: Optional[Any]
+
+
+RenderListener = Callable[[RenderRecord], None]
+
+_listeners: List[RenderListener] = []
+_context_listeners: contextvars.ContextVar[Tuple[RenderListener, ...]] = (
+    contextvars.ContextVar("render_listeners", default=())
+)
+_current_message: contextvars.ContextVar[Optional[Any]] = contextvars.ContextVar(
+    "render_message", default=None
+)
+
+
+def add_render_listener(listener: RenderListener) -> None:
+    """
+    Register a listener receiving a RenderRecord for every render.
+
+    The listener is called in the thread that renders, for the renders of all
+    sessions. It should return quickly; exceptions it raises are turned into
+    warnings so they do not break rendering.
+
+    Args:
+        listener: Callable taking a RenderRecord
+
+    Examples:
+        >>> add_render_listener(lambda record: metrics.observe(record.elapsed_ms))
+    """
+    _listeners.append(listener)
+
+
+def remove_render_listener(listener: RenderListener) -> None:
+    """
+    Unregister a listener registered with add_render_listener.
+
+    Args:
+        listener: The listener to remove
+
+    Raises:
+        ValueError: If the listener is not registered
+    """
+    _listeners.remove(listener)
+
+
+@contextlib.contextmanager
+def listen_to_renders(listener: RenderListener) -> Iterator[RenderListener]:
+    """
+    Register a listener for the renders of the current thread, within a with block.
+
+    Args:
+        listener: Callable taking a RenderRecord
+
+    Yields:
+        The listener
+
+    Examples:
+        >>> records = []
+        >>> with listen_to_renders(records.append):
+        ...     history.render_all()
+    """
+    token = _context_listeners.set(_context_listeners.get() + (listener,))
+    try:
+        yield listener
+    finally:
+        _context_listeners.reset(token)
+
+
+def is_instrumented() -> bool:
+    """
+    Check whether any render listener would receive a record.
+
+    Returns:
+        bool: True if a listener is registered globally or for this thread
+    """
+    return bool(_listeners) or bool(_context_listeners.get())
+
+
+def emit_render_record(record: RenderRecord) -> None:
+    """
+    Deliver a record to the render listeners.
+
+    Args:
+        record: The record to deliver
+    """
+    for listener in (*_listeners, *_context_listeners.get()):
+        try:
+            listener(record)
+        except Exception as e:
+            warnings.warn(f"Render listener {listener!r} failed: {e}", RuntimeWarning)
+
+
+def current_message() -> Optional[Any]:
+    """
+    Get the message being rendered with instrumentation, if any.
+
+    Returns:
+        The Message whose render is in progress in this thread, or None
+    """
+    return _current_message.get()
+
+
+class RenderProfile:
+    """
+    Summary of the render records of one pass over a message history.
+
+    The records are reduced to plain rows when the profile is created, so a
+    profile does not keep messages or their content alive.
+
+    Attributes:
+        total_ms: Wall time of all messages rendered, or of all components if no
+                  message was rendered
+        message_count: Number of messages rendered
+        component_count: Number of components rendered
+        failed_count: Number of components and messages that showed an error
+    """
+
+    def __init__(
+        self,
+        records: Sequence[RenderRecord],
+        positions: Optional[Mapping[int, int]] = None,
+    ):
+        """
+        Summarize render records.
+
+        Args:
+            records: The records of the pass, as delivered to a listener
+            positions: Optional mapping of ``id(message)`` to the position of
+                       the message in its history, used to label messages
+        """
+        positions = positions or {}
+        self._messages: List[Dict[str, Any]] = []
+        self._components: List[Dict[str, Any]] = []
+        self._by_type: Dict[str, List[float]] = {}
+        self._by_renderer: Dict[str, List[float]] = {}
+        for record in records:
+            message = record.message
+            index = None if message is None else positions.get(id(message))
+            if record.kind == "message":
+                self._messages.append(
+                    {
+                        "message": index,
+                        "user": getattr(message, "user", None),
+                        "components": len(getattr(message, "components", ())),
+                        "ms": record.elapsed_ms,
+                        "bytes": record.payload_bytes,
+                        "failed": record.failed,
+                    }
+                )
+                continue
+            type_name = getattr(record.component_type, "value", None)
+            self._components.append(
+                {
+                    "message": index,
+                    "type": type_name,
+                    "title": getattr(record.component, "title", None),
+                    "renderer": record.renderer,
+                    "ms": record.elapsed_ms,
+                    "bytes": record.payload_bytes,
+                    "failed": record.failed,
+                }
+            )
+            for table, key in (
+                (self._by_type, type_name),
+                (self._by_renderer, record.renderer),
+            ):
+                totals = table.setdefault(str(key), [0, 0.0])
+                totals[0] += 1
+                totals[1] += record.elapsed_ms
+
+        self._messages.sort(key=lambda row: row["ms"], reverse=True)
+        self._components.sort(key=lambda row: row["ms"], reverse=True)
+        self.message_count = len(self._messages)
+        self.component_count = len(self._components)
+        self.failed_count = sum(
+            row["failed"] for row in self._messages + self._components
+        )
+        rows = self._messages if self._messages else self._components
+        self.total_ms = sum(row["ms"] for row in rows)
+
+    def slowest_messages(self, n: int = 10) -> List[Dict[str, Any]]:
+        """
+        Get the slowest messages, slowest first.
+
+        Args:
+            n: Maximum number of messages
+
+        Returns:
+            list: Rows with the ``message`` position, ``user``, number of
+            ``components``, ``ms``, payload ``bytes`` and ``failed``
+        """
+        return self._messages[:n]
+
+    def slowest_components(self, n: int = 10) -> List[Dict[str, Any]]:
+        """
+        Get the slowest components, slowest first.
+
+        Args:
+            n: Maximum number of components
+
+        Returns:
+            list: Rows with the ``message`` position, component ``type``,
+            ``title``, ``renderer``, ``ms``, payload ``bytes`` and ``failed``
+        """
+        return self._components[:n]
+
+    def by_type(self) -> List[Dict[str, Any]]:
+        """
+        Get the cumulative render time per component type, slowest first.
+
+        Returns:
+            list: Rows with the ``type``, ``count``, ``total_ms`` and ``mean_ms``
+        """
+        return _totals(self._by_type, "type")
+
+    def by_renderer(self) -> List[Dict[str, Any]]:
+        """
+        Get the cumulative render time per renderer, slowest first.
+
+        Renderers outside this package, registered with
+        ComponentRegistry.register_renderer, are marked as ``custom``.
+
+        Returns:
+            list: Rows with the ``renderer``, ``custom``, ``count``,
+            ``total_ms`` and ``mean_ms``
+        """
+        rows = _totals(self._by_renderer, "renderer")
+        for row in rows:
+            row["custom"] = not row["renderer"].startswith(f"{__package__}.")
+        return rows
+
+
+def _totals(table: Dict[str, List[float]], key: str) -> List[Dict[str, Any]]:
+    """Turn (count, total) pairs into rows, slowest first."""
+    rows: List[Dict[str, Any]] = [
+        {key: name, "count": int(count), "total_ms": total, "mean_ms": total / count}
+        for name, (count, total) in table.items()
+    ]
+    rows.sort(key=lambda row: row["total_ms"], reverse=True)
+    return rows
+
+
+@contextlib.contextmanager
+def rendering_message(message: Any) -> Iterator[None]:
+    """Mark a message as being rendered, for the records of its components."""
+    token = _current_message.set(message)
+    try:
+        yield
+    finally:
+        _current_message.reset(token)
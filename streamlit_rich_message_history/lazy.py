@@ -0,0 +1,114 @@
+"""
+Lazy component content for the streamlit_rich_message_history package.
+
+This module defines LazyContent, which wraps a zero-argument callable producing
+the content of a component. The callable only runs when the component is first
+rendered, so content that is expensive to build, like the result of a query or
+a chart, costs nothing until it is shown.
+"""
+
+from typing import Any, Callable, Optional
+
+from .enums import ComponentType
+from .spill import DeferredPayload
+
+_UNSET = object()
+
+
+class LazyContent(DeferredPayload):
+    """
+    Component content produced by a callable on first render.
+
+    The result is memoized, so the callable runs at most once until reset is
+    called. MessageComponent keeps the LazyContent it was created with, which
+    lets MessageComponent.evict release the result and have it recomputed on
+    the next render.
+
+    Attributes:
+        factory: The zero-argument callable producing the content
+        component_type: The declared type of the content, or None to detect it
+                        once the content has been produced
+
+    Examples:
+        >>> message.add(LazyContent(lambda: run_query(sql)))
+        >>> message.add(LazyContent(build_chart, ComponentType.PLOTLY_FIGURE))
+    """
+
+    __slots__ = ("factory", "component_type", "_value")
+
+    def __init__(
+        self,
+        factory: Callable[[], Any],
+        component_type: Optional[ComponentType] = None,
+    ):
+        """
+        Initialize lazy content.
+
+        Args:
+            factory: Zero-argument callable producing the content
+            component_type: Optional type of the content; if not set, the type
+                            is detected from the content once it is produced
+
+        Raises:
+            TypeError: If factory is not callable
+        """
+        if not callable(factory):
+            raise TypeError(f"Lazy content needs a callable, got {type(factory)}")
+        self.factory = factory
+        self.component_type = component_type
+        self._value: Any = _UNSET
+
+    @property
+    def evaluated(self) -> bool:
+        """Whether the content has been produced and is memoized."""
+        return self._value is not _UNSET
+
+    @property
+    def value(self) -> Any:
+        """The memoized content, or None if it has not been produced yet."""
+        return None if self._value is _UNSET else self._value
+
+    def read(self) -> Any:
+        """
+        Produce the content, calling the factory only the first time.
+
+        Returns:
+            The content
+        """
+        if self._value is _UNSET:
+            self._value = self.factory()
+        return self._value
+
+    def reset(self) -> None:
+        """Release the memoized content, so the next read calls the factory again."""
+        self._value = _UNSET
+
+    def __repr__(self) -> str:
+        name = getattr(self.factory, "__qualname__", repr(self.factory))
+        state = "evaluated" if self.evaluated else "pending"
+        return f"LazyContent({name}, {state})"
+
+
+def lazy(
+    component_type: Optional[ComponentType] = None,
+) -> Callable[[Callable[[], Any]], LazyContent]:
+    """
+    Decorator turning a zero-argument function into lazy content.
+
+    Args:
+        component_type: Optional declared type of the content
+
+    Returns:
+        A decorator returning LazyContent for the decorated function
+
+    Examples:
+        >>> @lazy(ComponentType.DATAFRAME)
+        ... def monthly_revenue():
+        ...     return run_query("SELECT ...")
+        >>> message.add(monthly_revenue)
+    """
+
+    def decorator(factory: Callable[[], Any]) -> LazyContent:
+        return LazyContent(factory, component_type)
+
+    return decorator
@@ -0,0 +1,126 @@
+"""
+Memory accounting for the streamlit_rich_message_history package.
+
+This module estimates the memory held by component content: pandas objects
+report their own usage, figures are estimated from the data arrays they hold,
+and everything else is measured with sys.getsizeof, following containers.
+"""
+
+import sys
+from typing import Any, Optional, Set
+
+from .figures import RasterizedFigure, SerializedPlotlyFigure
+from .frames import ArrowFrame
+from .lazy import LazyContent
+from .utils import (
+    is_dataframe,
+    is_instance_of_loaded,
+    is_matplotlib_figure,
+    is_plotly_figure,
+    is_series,
+)
+
+
+def estimate_size(content: Any, deep: bool = True) -> int:
+    """
+    Estimate the number of bytes held by a piece of component content.
+
+    Args:
+        content: The content to measure
+        deep: Whether to count the Python objects referenced from object columns
+              and the items of collections, rather than only the containers
+
+    Returns:
+        int: The estimated size in bytes
+
+    Examples:
+        >>> estimate_size(pd.DataFrame({"a": range(1000)}))
+        8132
+    """
+    if is_dataframe(content):
+        return int(content.memory_usage(index=True, deep=deep).sum())
+    if is_series(content):
+        return int(content.memory_usage(index=True, deep=deep))
+    if isinstance(content, ArrowFrame):
+        size = len(content.data)
+        if content.frame is not None:
+            size += estimate_size(content.frame, deep)
+        return size
+    if isinstance(content, RasterizedFigure):
+        return sys.getsizeof(content.data)
+    if isinstance(content, SerializedPlotlyFigure):
+        size = sys.getsizeof(content.spec)
+        if content.figure is not None:
+            size += estimate_size(content.figure, deep)
+        return size
+    if isinstance(content, LazyContent):
+        size = sys.getsizeof(content)
+        if content.evaluated:
+            size += estimate_size(content.value, deep)
+        return size
+    if is_matplotlib_figure(content):
+        return _matplotlib_figure_size(content)
+    if is_plotly_figure(content):
+        return _plotly_figure_size(content)
+    return _sizeof(content, deep, set())
+
+
+def _sizeof(obj: Any, deep: bool, seen: Set[int]) -> int:
+    """Measure an object with sys.getsizeof, following containers if deep."""
+    if id(obj) in seen:
+        return 0
+    seen.add(id(obj))
+    if is_instance_of_loaded(obj, "numpy", "ndarray"):
+        # Views do not own their data, but keep it alive all the same
+        return sys.getsizeof(obj) + (0 if obj.base is None else obj.nbytes)
+    if is_dataframe(obj) or is_series(obj):
+        return estimate_size(obj, deep)
+    size = sys.getsizeof(obj)
+    if not deep:
+        return size
+    if isinstance(obj, dict):
+        for key, value in obj.items():
+            size += _sizeof(key, deep, seen) + _sizeof(value, deep, seen)
+    elif isinstance(obj, (list, tuple, set, frozenset)):
+        for item in obj:
+            size += _sizeof(item, deep, seen)
+    return size
+
+
+def _matplotlib_figure_size(fig: Any) -> int:
+    """
+    Estimate the memory held by a matplotlib figure.
+
+    Counts the attributes of every artist in the figure plus the data of lines,
+    collections and images, which is where large figures keep their points.
+    """
+    size = 0
+    for artist in fig.findobj():
+        size += sys.getsizeof(artist.__dict__)
+        data: Optional[Any] = None
+        if hasattr(artist, "get_xydata"):
+            data = artist.get_xydata()
+        elif hasattr(artist, "get_offsets"):
+            data = artist.get_offsets()
+        elif hasattr(artist, "get_array"):
+            data = artist.get_array()
+        size += getattr(data, "nbytes", 0)
+    return size
+
+
+def _plotly_figure_size(fig: Any) -> int:
+    """
+    Estimate the memory held by a plotly figure.
+
+    Measures the trace properties in place, without the deep copy that
+    to_dict and to_plotly_json make.
+    """
+    seen: Set[int] = set()
+    size = sys.getsizeof(fig)
+    for trace in fig.data:
+        props = getattr(trace, "_props", None)
+        if props is None:
+            props = trace.to_plotly_json()
+        size += _sizeof(props, True, seen)
+    size += _sizeof(fig.layout.to_plotly_json(), True, seen)
+    return size
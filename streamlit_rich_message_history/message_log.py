@@ -0,0 +1,582 @@
+"""
+Append-only message log for the streamlit_rich_message_history package.
+
+This module defines MessageLog, a list of messages backed by a log file. Every
+appended message is written as one framed record at the end of the file, and
+later changes to a message are written as records superseding the earlier one,
+so nothing is ever rewritten in place. Reopening a log memory-maps the file and
+only scans the record headers; messages are decoded the first time they are
+accessed, and their DataFrames and figures the first time they are rendered.
+
+File layout: an 8-byte file header, then records made of a 13-byte header (type,
+message position, body length and CRC32 of the body) followed by the body. A
+body holds the length and CRC32 of a JSON message record as made by
+serialization.encode_message, the record itself and the payload bytes it refers
+to. Decoding a message only reads and verifies its JSON record.
+"""
+
+import contextlib
+import json
+import mmap
+import os
+import struct
+import tempfile
+import zlib
+from collections.abc import MutableSequence
+from typing import (
+    Any,
+    BinaryIO,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Tuple,
+    Union,
+)
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None  # type: ignore[assignment]
+
+from .messages import Message
+from .serialization import decode_message, decode_node, encode_message
+from .spill import DeferredPayload
+
+_FILE_HEADER = b"SRMHLOG\x01"
+_RECORD_HEADER = struct.Struct("<cIII")
+_JSON_HEADER = struct.Struct("<II")
+
+_APPEND = b"A"
+_UPDATE = b"U"
+
+
+class LoggedPayload(DeferredPayload):
+    """
+    Component content stored in a message log, read on first render.
+
+    Attributes:
+        log: The log holding the payload
+        position: Position of the message in the log
+        node: The content node of the message record
+    """
+
+    __slots__ = ("log", "position", "node")
+
+    def __init__(self, log: "MessageLog", position: int, node: Dict[str, Any]):
+        """
+        Initialize a logged payload.
+
+        Args:
+            log: The log holding the payload
+            position: Position of the message in the log
+            node: The content node of the message record
+        """
+        self.log = log
+        self.position = position
+        self.node = node
+
+    def read(self) -> Any:
+        """
+        Read the content from the log.
+
+        Returns:
+            The content, with its payloads decoded
+        """
+        base = self.log._payload_base(self.position)
+        return decode_node(self.node, lambda ref: self.log._read(base + ref[0], ref[1]))
+
+    def __repr__(self) -> str:
+        return f"LoggedPayload(position={self.position})"
+
+
+class MessageLog(MutableSequence):
+    """
+    A list of messages backed by an append-only log file.
+
+    Appending a message writes a record to the end of the file. Replacing a
+    message, or calling sync after adding components to a message already in
+    the log, writes a record superseding the earlier one. Inserting or deleting
+    anywhere but at the end rewrites the log, and clear truncates it.
+    Superseded records are dropped by compact, which runs automatically once
+    they take up more than half of a file larger than ``compact_threshold``.
+
+    Several MessageLog instances, in one or more processes, can append to the
+    same file: records are written under an exclusive lock on the file, where
+    the platform supports it, after indexing the records the other instances
+    wrote. Rewriting the log replaces the file, and the other instances then
+    raise RuntimeError on their next write and have to be opened again.
+
+    Attributes:
+        path: Path of the log file
+        fsync: Whether every record is flushed to disk with os.fsync
+        compact_threshold: File size in bytes from which the log is compacted
+                           automatically
+    """
+
+    def __init__(
+        self, path: str, fsync: bool = False, compact_threshold: int = 1024 * 1024
+    ):
+        """
+        Open a message log, creating the file if it does not exist.
+
+        Only the record headers are read. A record cut off at the end of the
+        file, for example by a crash while it was written, is ignored, and
+        overwritten by the next record written.
+
+        Args:
+            path: Path of the log file
+            fsync: Whether to flush every record to disk with os.fsync; records
+                   are always flushed to the operating system
+            compact_threshold: File size in bytes from which the log is
+                               compacted automatically
+
+        Raises:
+            ValueError: If the file exists but is not a message log, or holds an
+                        invalid record before its end
+        """
+        self.path = os.path.abspath(path)
+        self.fsync = fsync
+        self.compact_threshold = compact_threshold
+        self._file: Optional[BinaryIO] = None
+        self._mmap: Optional[mmap.mmap] = None
+        self._lock_depth = 0
+        self._open()
+
+    def _open(self) -> None:
+        """Open the log file and scan its records."""
+        if not os.path.exists(self.path):
+            with open(self.path, "wb") as f:
+                f.write(_FILE_HEADER)
+        self._file = open(self.path, "r+b")
+        if self._file.read(len(_FILE_HEADER)) != _FILE_HEADER:
+            self._file.close()
+            raise ValueError(f"{self.path} is not a message log")
+
+        self._offsets: List[int] = []
+        self._lengths: List[int] = []
+        self._cache: Dict[int, Message] = {}
+        self._counts: Dict[int, int] = {}
+        self._garbage = 0
+        self._end = len(_FILE_HEADER)
+        try:
+            self._scan()
+        except ValueError:
+            self.close()
+            raise
+
+    def _scan(self) -> None:
+        """
+        Index the records written after the last indexed one.
+
+        A record extending past the end of the file is left out; it was cut off
+        by a crash, or is being written by another instance.
+
+        Raises:
+            ValueError: If a complete record is invalid
+        """
+        self._map()
+        size = len(self._mmap) if self._mmap is not None else 0
+        offset = self._end
+        while offset + _RECORD_HEADER.size <= size:
+            assert self._mmap is not None
+            kind, position, length, _ = _RECORD_HEADER.unpack_from(self._mmap, offset)
+            body = offset + _RECORD_HEADER.size
+            if body + length > size:
+                break
+            if kind == _UPDATE and position in self._cache:
+                # Superseded by another instance; its payloads are in the old record
+                _detach(self._cache.pop(position))
+                self._counts.pop(position, None)
+            if not self._apply(kind, position, body, length):
+                raise ValueError(f"Invalid record at offset {offset} in {self.path}")
+            offset = body + length
+        self._end = offset
+
+    def _refresh(self) -> int:
+        """
+        Index the records other instances wrote since the last scan.
+
+        Returns:
+            int: The size of the log file
+
+        Raises:
+            RuntimeError: If another instance replaced the file by rewriting it
+        """
+        assert self._file is not None
+        stat = os.fstat(self._file.fileno())
+        try:
+            replaced = not os.path.samestat(stat, os.stat(self.path))
+        except FileNotFoundError:
+            replaced = True
+        if replaced:
+            raise RuntimeError(
+                f"{self.path} was rewritten by another MessageLog; open it again"
+            )
+        if stat.st_size > self._end:
+            self._scan()
+        return stat.st_size
+
+    @contextlib.contextmanager
+    def _locked(self) -> Iterator[None]:
+        """Hold an exclusive lock on the log file, where the platform supports it."""
+        assert self._file is not None
+        file = self._file
+        if fcntl is not None and not self._lock_depth:
+            fcntl.flock(file.fileno(), fcntl.LOCK_EX)
+        self._lock_depth += 1
+        try:
+            yield
+        finally:
+            self._lock_depth -= 1
+            # A rewrite closes the locked file, which releases the lock
+            if fcntl is not None and not self._lock_depth and not file.closed:
+                fcntl.flock(file.fileno(), fcntl.LOCK_UN)
+
+    def _apply(self, kind: bytes, position: int, body: int, length: int) -> bool:
+        """Update the index for a record, returning False for an invalid one."""
+        if kind == _APPEND and position == len(self._offsets):
+            self._offsets.append(body)
+            self._lengths.append(length)
+        elif kind == _UPDATE and position < len(self._offsets):
+            self._garbage += _RECORD_HEADER.size + self._lengths[position]
+            self._offsets[position] = body
+            self._lengths[position] = length
+        else:
+            return False
+        return True
+
+    def _map(self) -> None:
+        """Memory-map the current contents of the log file."""
+        self._unmap()
+        assert self._file is not None
+        if os.fstat(self._file.fileno()).st_size > 0:
+            self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def _unmap(self) -> None:
+        """Release the memory map."""
+        if self._mmap is not None:
+            self._mmap.close()
+            self._mmap = None
+
+    def _read(self, offset: int, length: int) -> bytes:
+        """Read bytes from the log, mapping records appended since the last read."""
+        if self._mmap is None or len(self._mmap) < offset + length:
+            self._map()
+        assert self._mmap is not None
+        end = offset + length
+        return self._mmap[offset:end]
+
+    def _payload_base(self, position: int) -> int:
+        """Get the file offset of the payloads of the record at a position."""
+        offset = self._offsets[position]
+        json_length, _ = _JSON_HEADER.unpack(self._read(offset, _JSON_HEADER.size))
+        return offset + _JSON_HEADER.size + json_length
+
+    def _read_record(self, position: int) -> Dict[str, Any]:
+        """Read and verify the JSON message record at a position."""
+        offset = self._offsets[position]
+        json_length, crc = _JSON_HEADER.unpack(self._read(offset, _JSON_HEADER.size))
+        encoded = self._read(offset + _JSON_HEADER.size, json_length)
+        if zlib.crc32(encoded) != crc:
+            raise ValueError(f"Corrupt record for message {position} in {self.path}")
+        return json.loads(encoded)
+
+    def _read_body(self, position: int) -> bytes:
+        """Read and verify the whole body of the record at a position."""
+        offset, length = self._offsets[position], self._lengths[position]
+        body = self._read(offset, length)
+        _, _, _, crc = _RECORD_HEADER.unpack(
+            self._read(offset - _RECORD_HEADER.size, _RECORD_HEADER.size)
+        )
+        if zlib.crc32(body) != crc:
+            raise ValueError(f"Corrupt record for message {position} in {self.path}")
+        return body
+
+    def _write(self, kind: bytes, position: int, body: bytes) -> int:
+        """
+        Append a record to the file and index it.
+
+        The records other instances wrote are indexed first, so an appended
+        message takes the next free position.
+
+        Returns:
+            int: The position of the message in the record
+        """
+        assert self._file is not None
+        with self._locked():
+            size = self._refresh()
+            if kind == _APPEND:
+                position = len(self._offsets)
+            header = _RECORD_HEADER.pack(kind, position, len(body), zlib.crc32(body))
+            self._file.seek(self._end)
+            self._file.write(header + body)
+            if self._file.tell() < size:
+                # Drop what is left of a record cut off by a crash
+                self._file.truncate()
+            self._file.flush()
+            if self.fsync:
+                os.fsync(self._file.fileno())
+            offset = self._end + _RECORD_HEADER.size
+            self._end = offset + len(body)
+            self._apply(kind, position, offset, len(body))
+        return position
+
+    def _encode(self, message: Message) -> Tuple[bytes, Dict[str, Any]]:
+        """Encode a message to a record body."""
+        payloads: List[bytes] = []
+        size = 0
+
+        def write_payload(data: bytes) -> List[int]:
+            nonlocal size
+            payloads.append(data)
+            size += len(data)
+            return [size - len(data), len(data)]
+
+        record = encode_message(message, write_payload)
+        encoded = json.dumps(record, separators=(",", ":")).encode("utf-8")
+        header = _JSON_HEADER.pack(len(encoded), zlib.crc32(encoded))
+        body = b"".join([header, encoded, *payloads])
+        return body, record
+
+    def _log(self, kind: bytes, position: int, message: Message) -> None:
+        """Write a message at a position and point its payloads at the new record."""
+        body, record = self._encode(message)
+        position = self._write(kind, position, body)
+        self._cache[position] = message
+        self._counts[position] = len(message.components)
+        _rebind(message, self, position, record)
+
+    def __len__(self) -> int:
+        return len(self._offsets)
+
+    def __getitem__(self, index: Any) -> Any:
+        """
+        Get a message, decoding it from the log on first access.
+
+        Args:
+            index: Position of the message, or a slice of positions
+
+        Returns:
+            The message, or a list of messages for a slice
+        """
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        position = range(len(self))[index]
+        message = self._cache.get(position)
+        if message is None:
+            record = self._read_record(position)
+            message = decode_message(
+                record, lambda node: LoggedPayload(self, position, node)
+            )
+            self._cache[position] = message
+            self._counts[position] = len(message.components)
+        return message
+
+    def __setitem__(self, index: Any, message: Any) -> None:
+        """Replace a message, writing a record superseding the earlier one."""
+        if isinstance(index, slice):
+            messages = self[:]
+            messages[index] = message
+            self.rewrite(messages)
+            return
+        self._log(_UPDATE, range(len(self))[index], message)
+        self._maybe_compact()
+
+    def __delitem__(self, index: Any) -> None:
+        """Delete messages, rewriting the log."""
+        messages = self[:]
+        del messages[index]
+        self.rewrite(messages)
+
+    def insert(self, index: int, message: Message) -> None:
+        """
+        Insert a message; at the end, this appends a single record.
+
+        Args:
+            index: Position to insert the message at
+            message: The message to insert
+        """
+        if index >= len(self):
+            self._log(_APPEND, len(self), message)
+        else:
+            messages = self[:]
+            messages.insert(index, message)
+            self.rewrite(messages)
+
+    def append(self, message: Message) -> None:
+        """
+        Append a message to the log.
+
+        Args:
+            message: The message to append
+        """
+        self._log(_APPEND, len(self), message)
+
+    def clear(self) -> None:
+        """Remove all messages, truncating the log to an empty file."""
+        self.rewrite([])
+
+    @property
+    def materialized(self) -> List[Tuple[int, Message]]:
+        """The (position, message) pairs decoded or added so far."""
+        return sorted(self._cache.items(), key=lambda item: item[0])
+
+    def sync(self) -> int:
+        """
+        Write records for messages whose components changed since they were logged.
+
+        A message is considered changed if its number of components changed,
+        which covers adding components to a message after adding the message to
+        the history. After changing a component in place, assign the message
+        again instead, as in ``log[i] = log[i]``.
+
+        Returns:
+            int: The number of messages written
+        """
+        changed = [
+            position
+            for position, message in self._cache.items()
+            if len(message.components) != self._counts.get(position)
+        ]
+        for position in changed:
+            self._log(_UPDATE, position, self._cache[position])
+        if changed:
+            self._maybe_compact()
+        return len(changed)
+
+    @property
+    def garbage_bytes(self) -> int:
+        """Bytes taken by superseded records, which compact drops."""
+        return self._garbage
+
+    def _maybe_compact(self) -> None:
+        """Compact the log if superseded records take up most of a large file."""
+        if self._end >= self.compact_threshold and self._garbage * 2 > self._end:
+            self.compact()
+
+    def compact(self) -> None:
+        """
+        Rewrite the log with one record per message, dropping superseded ones.
+
+        Records of unchanged messages are copied as they are, without decoding
+        them. The new file replaces the old one once it is complete.
+        """
+        with self._locked():
+            self._refresh()
+            self.rewrite(list(range(len(self))))
+
+    def rewrite(self, messages: Iterable[Union[int, Message]]) -> None:
+        """
+        Replace the contents of the log.
+
+        Decoded messages that are not part of the new contents get their
+        payloads read from the log first, so they stay usable.
+
+        Args:
+            messages: The new messages, in order; an int stands for the message
+                      currently at that position, whose record is copied as is
+                      unless the message has changed
+        """
+        items = list(messages)
+        with self._locked():
+            self._refresh()
+            kept = self._replace_file(items)
+
+        self._open()
+        for position, message, new_record in kept:
+            self._cache[position] = message
+            self._counts[position] = len(message.components)
+            if new_record is None:
+                _move(message, position)
+            else:
+                _rebind(message, self, position, new_record)
+
+    def _replace_file(
+        self, items: List[Union[int, Message]]
+    ) -> List[Tuple[int, Message, Optional[Dict[str, Any]]]]:
+        """
+        Write the new contents of the log to a file replacing the log file.
+
+        Returns:
+            list: The decoded messages kept, at their new position, with their
+            new record if they were encoded again
+        """
+        kept: List[Tuple[int, Message, Optional[Dict[str, Any]]]] = []
+        fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(self.path), suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(_FILE_HEADER)
+                for position, item in enumerate(items):
+                    if isinstance(item, int) and self._is_unchanged(item):
+                        body = self._read_body(item)
+                        if item in self._cache:
+                            kept.append((position, self._cache[item], None))
+                    else:
+                        message = self[item] if isinstance(item, int) else item
+                        body, record = self._encode(message)
+                        kept.append((position, message, record))
+                    header = _RECORD_HEADER.pack(
+                        _APPEND, position, len(body), zlib.crc32(body)
+                    )
+                    f.write(header + body)
+                f.flush()
+                if self.fsync:
+                    os.fsync(f.fileno())
+
+            kept_ids = {id(message) for _, message, _ in kept}
+            for message in self._cache.values():
+                if id(message) not in kept_ids:
+                    _detach(message)
+            if fcntl is None:
+                # Windows cannot replace a file that is open
+                self.close()
+            os.replace(temp_path, self.path)
+            # Closing the replaced file only now keeps it locked until replaced
+            self.close()
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+        return kept
+
+    def _is_unchanged(self, position: int) -> bool:
+        """Whether the record at a position matches its decoded message."""
+        message = self._cache.get(position)
+        return message is None or len(message.components) == self._counts[position]
+
+    def close(self) -> None:
+        """Close the log file; decoded messages stay usable."""
+        self._unmap()
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def __repr__(self) -> str:
+        return f"MessageLog(path={self.path!r}, messages={len(self)})"
+
+
+def _rebind(
+    message: Message, log: MessageLog, position: int, record: Dict[str, Any]
+) -> None:
+    """Point the logged payloads of a message at its new record."""
+    for component, component_record in zip(message.components, record["components"]):
+        if isinstance(component.content, LoggedPayload):
+            component.content = LoggedPayload(
+                log, position, component_record["content"]
+            )
+
+
+def _move(message: Message, position: int) -> None:
+    """Point the logged payloads of a message, copied as is, at its new position."""
+    for component in message.components:
+        if isinstance(component.content, LoggedPayload):
+            component.content.position = position
+
+
+def _detach(message: Message) -> None:
+    """Read the logged payloads of a message that is removed from the log."""
+    for component in message.components:
+        if isinstance(component.content, LoggedPayload):
+            component.content = component.content.read()
@@ -5,16 +5,39 @@ This module defines the Message class and its derivatives (UserMessage, Assistan
 ErrorMessage) which represent chat messages with rich content components.
 """
 
+import asyncio
+import time
 import traceback
-from typing import Any, Callable, Dict, List, Optional, Tuple, Union
-
-import matplotlib.pyplot as plt
-import pandas as pd
-import plotly.graph_objects as go
-import streamlit as st
-
+from typing import (
+    TYPE_CHECKING,
+    Any,
+    AsyncIterable,
+    Callable,
+    Dict,
+    Iterable,
+    List,
+    Optional,
+    Tuple,
+    Union,
+)
+
+from .backends import st
 from .components import MessageComponent
 from .enums import ComponentRegistry, ComponentType
+from .figures import optimize_plotly_figure, rasterize_figure, serialize_plotly_figure
+from .frames import to_arrow_frame
+from .instrumentation import (
+    RenderRecord,
+    emit_render_record,
+    is_instrumented,
+    rendering_message,
+)
+from .lazy import LazyContent
+
+if TYPE_CHECKING:
+    import matplotlib.pyplot as plt
+    import pandas as pd
+    import plotly.graph_objects as go
 
 
 class Message:
@@ -31,6 +54,12 @@ class Message:
         components: List of MessageComponent objects in this message
     """
 
+    # Messages are long-lived in st.session_state, so the common attributes live
+    # in slots. __dict__ stays available for attributes added at runtime, such as
+    # app-specific metadata or mocks in tests, and __weakref__ for the render
+    # times MessageHistory tracks without keeping messages alive.
+    __slots__ = ("user", "avatar", "components", "__dict__", "__weakref__")
+
     def __init__(self, user: str, avatar: str):
         """
         Initialize a new message.
@@ -53,7 +82,8 @@ class Message:
         ultimately call this method with appropriate flags.
 
         Args:
-            content: The content to add to the message
+            content: The content to add to the message, or LazyContent to produce
+                     it on first render
             **kwargs: Additional keyword arguments that control rendering behavior
                       Special flags include:
                       - is_error: Treat string content as an error message
@@ -71,6 +101,33 @@ class Message:
         self.components.append(component)
         return self  # Allow method chaining
 
+    def add_lazy(
+        self,
+        factory: Callable[[], Any],
+        component_type: Optional[ComponentType] = None,
+        **kwargs,
+    ):
+        """
+        Add a component whose content is produced when it is first rendered.
+
+        The factory runs once, the first time the component is rendered, and
+        its result is kept; MessageComponent.evict releases it again. Without a
+        ``component_type``, the type is detected from the result.
+
+        Args:
+            factory: Zero-argument callable producing the content
+            component_type: Optional type of the content
+            **kwargs: Additional keyword arguments for the component
+
+        Returns:
+            Message: Self, for method chaining
+
+        Examples:
+            >>> message.add_lazy(lambda: run_query(sql), title="Raw results")
+            >>> message.add_lazy(build_chart, ComponentType.PLOTLY_FIGURE)
+        """
+        return self.add(LazyContent(factory, component_type), **kwargs)
+
     def add_text(self, text: str, **kwargs):
         """
         Add a text component to the message.
@@ -91,6 +148,89 @@ class Message:
         """
         return self.add(text, **kwargs)
 
+    def add_stream(
+        self,
+        stream: Union[Iterable[Any], AsyncIterable[Any]],
+        update_interval: float = 0.05,
+        **kwargs,
+    ):
+        """
+        Add a text component from a stream of tokens, rendering it as it arrives.
+
+        The stream is consumed immediately. While it runs, the text received so
+        far is shown in a placeholder at the current position of the Streamlit
+        app; updates are coalesced so the placeholder is redrawn at most once per
+        ``update_interval`` seconds. With a ``title`` or ``description``, the
+        placeholder shows them the same way the finished component will. Once the
+        stream is exhausted, the joined text is added as a regular TEXT
+        component, so later reruns render it like any other text without
+        streaming.
+
+        An async iterator is drained with asyncio.run, so it can only be passed
+        when no event loop is running in the current thread. From async code,
+        pass a synchronous iterator instead.
+
+        Args:
+            stream: An iterator or async iterator of text chunks; non-string
+                    chunks are converted with str()
+            update_interval: Minimum number of seconds between placeholder updates
+            **kwargs: Additional keyword arguments for the component
+
+        Returns:
+            Message: Self, for method chaining
+
+        Raises:
+            RuntimeError: If stream is an async iterator and an event loop is
+                          already running in the current thread
+
+        Examples:
+            >>> with st.chat_message("assistant"):
+            ...     message.add_stream(llm.stream(prompt))
+        """
+        if hasattr(stream, "__aiter__") and _event_loop_running():
+            raise RuntimeError(
+                "add_stream cannot consume an async iterator while an event loop "
+                "is running; pass a synchronous iterator instead"
+            )
+
+        placeholder = st.empty()
+        chunks: List[str] = []
+        last_update = time.perf_counter()
+        framed = None
+        if kwargs.get("title") or kwargs.get("description"):
+            framed = MessageComponent("", **kwargs)
+
+        def draw(text: str) -> None:
+            if framed is None:
+                placeholder.markdown(text)
+                return
+            framed.content = text
+            with placeholder.container():
+                framed._render_framed()
+
+        def on_chunk(chunk: Any) -> None:
+            nonlocal last_update
+            chunks.append(chunk if isinstance(chunk, str) else str(chunk))
+            now = time.perf_counter()
+            if now - last_update >= update_interval:
+                draw("".join(chunks))
+                last_update = now
+
+        if hasattr(stream, "__aiter__"):
+
+            async def drain() -> None:
+                async for chunk in stream:
+                    on_chunk(chunk)
+
+            asyncio.run(drain())
+        else:
+            for chunk in stream:
+                on_chunk(chunk)
+
+        text = "".join(chunks)
+        draw(text)
+        return self.add(text, **kwargs)
+
     def add_error(self, error_text: str, **kwargs):
         """
         Add an error component to the message.
@@ -125,12 +265,26 @@ class Message:
         """
         return self.add(code, is_code=True, language=language, **kwargs)
 
-    def add_dataframe(self, df: pd.DataFrame, **kwargs):
+    def add_dataframe(
+        self,
+        df: "pd.DataFrame",
+        cache_arrow: bool = False,
+        keep_frame: bool = True,
+        **kwargs,
+    ):
         """
         Add a dataframe component to the message.
 
+        By default st.dataframe converts the frame to Arrow on every rerun. With
+        ``cache_arrow``, it is converted once, here, and later reruns reuse the
+        cached bytes; see frames.ArrowFrame.
+
         Args:
             df: The pandas DataFrame to display
+            cache_arrow: Whether to convert the frame to Arrow once and cache the
+                         result
+            keep_frame: With ``cache_arrow``, whether to keep the original frame;
+                        pass False to free the memory it holds
             **kwargs: Additional keyword arguments for the component
                       Common ones include:
                       - use_container_width: Whether to use the full container width
@@ -142,15 +296,31 @@ class Message:
         Examples:
             >>> message.add_dataframe(pd.DataFrame({'A': [1, 2], 'B': [3, 4]}))
             >>> message.add_dataframe(df, height=300)
+            >>> message.add_dataframe(big_df, cache_arrow=True, keep_frame=False)
         """
+        if cache_arrow:
+            return self.add(
+                to_arrow_frame(df, keep_frame=keep_frame),
+                component_type=ComponentType.DATAFRAME,
+                **kwargs,
+            )
         return self.add(df, **kwargs)
 
-    def add_series(self, series: pd.Series, **kwargs):
+    def add_series(
+        self,
+        series: "pd.Series",
+        cache_arrow: bool = False,
+        keep_frame: bool = True,
+        **kwargs,
+    ):
         """
         Add a series component to the message.
 
         Args:
             series: The pandas Series to display
+            cache_arrow: Whether to convert the series to Arrow once and cache the
+                         result, as in add_dataframe
+            keep_frame: With ``cache_arrow``, whether to keep the original series
             **kwargs: Additional keyword arguments for the component
 
         Returns:
@@ -159,14 +329,37 @@ class Message:
         Examples:
             >>> message.add_series(pd.Series([1, 2, 3, 4]))
         """
+        if cache_arrow:
+            return self.add(
+                to_arrow_frame(series, keep_frame=keep_frame),
+                component_type=ComponentType.SERIES,
+                **kwargs,
+            )
         return self.add(series, **kwargs)
 
-    def add_matplotlib_figure(self, fig: plt.Figure, **kwargs):
+    def add_matplotlib_figure(
+        self,
+        fig: "plt.Figure",
+        rasterize: Optional[str] = None,
+        dpi: Optional[float] = 200,
+        **kwargs,
+    ):
         """
         Add a matplotlib figure component to the message.
 
+        By default the live figure is stored and drawn with st.pyplot on every
+        rerun. With ``rasterize``, the figure is rendered once to PNG or SVG, only
+        the image is kept and the figure is closed; later reruns serve the cached
+        image, saving the redraw and the memory held by the figure.
+
+        A live figure spilled to disk by a MessageHistory memory budget is
+        rasterized to PNG and closed the same way, so it comes back as an image
+        and later changes to the figure are not shown.
+
         Args:
             fig: The matplotlib Figure to display
+            rasterize: Optional "png" or "svg" to rasterize the figure once
+            dpi: Resolution used when rasterizing to PNG
             **kwargs: Additional keyword arguments for the component
 
         Returns:
@@ -176,15 +369,47 @@ class Message:
             >>> fig, ax = plt.subplots()
             >>> ax.plot([1, 2, 3, 4])
             >>> message.add_matplotlib_figure(fig)
+            >>> message.add_matplotlib_figure(fig, rasterize="png")
         """
+        if rasterize:
+            return self.add(
+                rasterize_figure(fig, format=rasterize, dpi=dpi),
+                component_type=ComponentType.MATPLOTLIB_FIGURE,
+                **kwargs,
+            )
         return self.add(fig, **kwargs)
 
-    def add_plotly_figure(self, fig: Union[go.Figure, dict], **kwargs):
+    def add_plotly_figure(
+        self,
+        fig: Union["go.Figure", dict],
+        serialize: bool = False,
+        keep_figure: bool = True,
+        webgl_threshold: Optional[int] = None,
+        max_points: Optional[int] = None,
+        **kwargs,
+    ):
         """
         Add a plotly figure component to the message.
 
+        By default st.plotly_chart serializes the whole figure on every rerun.
+        With ``serialize``, the figure is serialized once, here, and later reruns
+        reuse the cached spec, passed to st.plotly_chart as a figure dict.
+        A figure spilled to disk by a MessageHistory memory budget comes back
+        serialized the same way.
+
+        For figures with very large scatter or line traces, ``webgl_threshold``
+        and ``max_points`` opt into drawing them with WebGL and downsampling them
+        with LTTB; see figures.optimize_plotly_figure.
+
         Args:
             fig: The plotly Figure to display
+            serialize: Whether to serialize the figure once and cache the result
+            keep_figure: With ``serialize``, whether to keep the original figure;
+                         pass False to free the memory it holds
+            webgl_threshold: Optional point count above which scatter traces are
+                             switched to scattergl
+            max_points: Optional point count above which scatter traces are
+                        downsampled to that many points
             **kwargs: Additional keyword arguments for the component
                       Common ones include:
                       - use_container_width: Whether to use the full container width
@@ -196,7 +421,17 @@ class Message:
         Examples:
             >>> fig = go.Figure(data=go.Bar(y=[2, 3, 1]))
             >>> message.add_plotly_figure(fig)
-        """
+            >>> message.add_plotly_figure(fig, serialize=True, keep_figure=False)
+            >>> message.add_plotly_figure(big_fig, webgl_threshold=10_000, max_points=5_000)
+        """
+        if webgl_threshold is not None or max_points is not None:
+            fig = optimize_plotly_figure(fig, webgl_threshold, max_points)
+        if serialize:
+            return self.add(
+                serialize_plotly_figure(fig, keep_figure=keep_figure),
+                component_type=ComponentType.PLOTLY_FIGURE,
+                **kwargs,
+            )
         return self.add(fig, **kwargs)
 
     def add_number(self, number: Union[int, float], **kwargs):
@@ -384,15 +619,41 @@ class Message:
         Render the message with all its components.
 
         This method displays the message in a Streamlit app using st.chat_message
-        and renders all components within it.
+        and renders all components within it. If render listeners are
+        registered, a RenderRecord is sent to them afterwards; see the
+        instrumentation module.
 
         Raises:
             Displays an error message in the UI if rendering fails
         """
+        if not is_instrumented():
+            self._render_chat_message()
+            return
+
+        start = time.perf_counter()
+        with rendering_message(self):
+            succeeded = self._render_chat_message()
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        emit_render_record(
+            RenderRecord(
+                kind="message",
+                elapsed_ms=elapsed_ms,
+                component_type=None,
+                renderer=None,
+                payload_bytes=sum(c.memory_usage() for c in self.components),
+                failed=not succeeded,
+                component=None,
+                message=self,
+            )
+        )
+
+    def _render_chat_message(self) -> bool:
+        """Render the components in a chat message, returning False on error."""
         try:
             with st.chat_message(name=self.user, avatar=self.avatar):
                 for component in self.components:
                     component.render()
+            return True
         except Exception as e:
             error_message = f"Error rendering message from {self.user}: {str(e)}"
             stack_trace = traceback.format_exc()
@@ -401,6 +662,31 @@ class Message:
                 st.error(error_message)
                 with st.expander("Stack Trace", expanded=False):
                     st.code(stack_trace, language="python")
+            return False
+
+    def memory_usage(self, deep: bool = True, refresh: bool = False) -> Dict[str, int]:
+        """
+        Estimate the memory held by the components of this message, by type.
+
+        Args:
+            deep: Whether to count the objects referenced from object columns and
+                  collection items, rather than only their containers
+            refresh: Whether to recompute the cached per-component estimates
+
+        Returns:
+            dict: Estimated bytes per component type value
+
+        Examples:
+            >>> message.memory_usage()
+            {'text': 61, 'dataframe': 8132}
+        """
+        by_type: Dict[str, int] = {}
+        for component in self.components:
+            type_name = component.component_type.value
+            by_type[type_name] = by_type.get(type_name, 0) + component.memory_usage(
+                deep, refresh
+            )
+        return by_type
 
     @classmethod
     def register_component_method(
@@ -469,6 +755,8 @@ class UserMessage(Message):
         components: List of MessageComponent objects in this message
     """
 
+    __slots__ = ()
+
     def __init__(self, avatar: str, text: Optional[str] = None):
         """
         Initialize a new user message.
@@ -496,6 +784,8 @@ class AssistantMessage(Message):
         components: List of MessageComponent objects in this message
     """
 
+    __slots__ = ()
+
     def __init__(self, avatar: str):
         """
         Initialize a new assistant message.
@@ -520,6 +810,8 @@ class ErrorMessage(Message):
         components: List of MessageComponent objects in this message
     """
 
+    __slots__ = ()
+
     def __init__(self, avatar: str, error_text: str):
         """
         Initialize a new error message.
@@ -530,3 +822,12 @@ class ErrorMessage(Message):
         """
         super().__init__(user="error", avatar=avatar)
         self.add_error(error_text)
+
+
+def _event_loop_running() -> bool:
+    """Check whether an asyncio event loop is running in the current thread."""
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return False
+    return True
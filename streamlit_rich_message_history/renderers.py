@@ -0,0 +1,257 @@
+"""
+Built-in renderers for the streamlit_rich_message_history package.
+
+Each renderer takes the component content and its keyword arguments, exactly
+like renderers registered through ComponentRegistry.register_renderer. They are
+registered in the same renderer table as custom renderers, so a built-in type can
+be overridden or wrapped the same way as a custom one.
+
+The collection types (LIST, TUPLE, DICT) are rendered by functions defined in the
+components module, since they create a MessageComponent for every item.
+"""
+
+import contextvars
+import json
+from typing import Any, Callable, Dict, Mapping, Optional
+
+from .backends import st
+from .backends import st_components as components
+from .enums import ComponentType
+from .figures import RasterizedFigure, SerializedPlotlyFigure
+from .frames import ArrowFrame, data_shape, get_preview_policy, head_tail
+from .utils import is_series
+
+#: Session state entry holding the keys of the components whose full data is shown
+SHOW_FULL_STATE_KEY = "srmh_show_full"
+
+# The MessageComponent whose content is being rendered, set by the component
+_rendering_component: contextvars.ContextVar[Optional[Any]] = contextvars.ContextVar(
+    "rendering_component", default=None
+)
+
+
+def render_text(content: Any, kwargs: Mapping[str, Any]) -> None:
+    """Render markdown text."""
+    st.markdown(content)
+
+
+def render_error(content: Any, kwargs: Mapping[str, Any]) -> None:
+    """Render an error message."""
+    st.error(content)
+
+
+def render_code(content: Any, kwargs: Mapping[str, Any]) -> None:
+    """Render a code snippet with syntax highlighting."""
+    language = kwargs.get("language", "python")
+    st.code(content, language=language)
+
+
+def render_dataframe(content: Any, kwargs: Mapping[str, Any]) -> None:
+    """Render a pandas DataFrame, or a preview of it if it is too large."""
+    use_container_width = kwargs.get("use_container_width", True)
+    height = kwargs.get("height", None)
+    if _render_preview(
+        content,
+        kwargs,
+        lambda sample: st.dataframe(sample, use_container_width=use_container_width),
+    ):
+        return
+    if isinstance(content, ArrowFrame):
+        _render_arrow_frame(content, use_container_width, height)
+        return
+    st.dataframe(
+        content, use_container_width=use_container_width, **_height_option(height)
+    )
+
+
+def render_series(content: Any, kwargs: Mapping[str, Any]) -> None:
+    """Render a pandas Series as a single-column dataframe, or a preview of it."""
+    if _render_preview(
+        content,
+        kwargs,
+        # A preview of an ArrowFrame without its series is a DataFrame already
+        lambda sample: st.dataframe(sample.to_frame() if is_series(sample) else sample),
+    ):
+        return
+    if isinstance(content, ArrowFrame):
+        _render_arrow_frame(content, True, None)
+        return
+    st.dataframe(content.to_frame())
+
+
+def _render_arrow_frame(
+    content: ArrowFrame, use_container_width: bool, height: Optional[int]
+) -> None:
+    """
+    Render the pyarrow Table an ArrowFrame keeps, without converting the frame.
+
+    st.dataframe still writes the Table out as Arrow IPC bytes, but that skips
+    the pandas to Arrow conversion, which is most of the work for large frames.
+    """
+    content.refresh()
+    st.dataframe(
+        content.table(),
+        use_container_width=use_container_width,
+        **_height_option(height),
+    )
+
+
+def _height_option(height: Optional[int]) -> Dict[str, int]:
+    """Get the height argument of st.dataframe or st.plotly_chart, which reject None."""
+    return {"height": height} if height else {}
+
+
+def render_matplotlib_figure(content: Any, kwargs: Mapping[str, Any]) -> None:
+    """Render a matplotlib figure, or the cached image of a rasterized one."""
+    if isinstance(content, RasterizedFigure):
+        use_container_width = kwargs.get("use_container_width", True)
+        st.image(content.data, use_container_width=use_container_width)
+    else:
+        st.pyplot(content)
+
+
+def render_plotly_figure(content: Any, kwargs: Mapping[str, Any]) -> None:
+    """Render a plotly figure, or the cached spec of a serialized one."""
+    use_container_width = kwargs.get("use_container_width", True)
+    height = kwargs.get("height", None)
+    if isinstance(content, SerializedPlotlyFigure):
+        # st.plotly_chart takes figure dicts; parsing the cached spec with json
+        # skips serializing the figure, and keeps no figure object between reruns
+        content = json.loads(content.spec)
+    st.plotly_chart(
+        content, use_container_width=use_container_width, **_height_option(height)
+    )
+
+
+def render_number(
+    content: Any, kwargs: Mapping[str, Any], title: Optional[str] = None
+) -> None:
+    """Render a number, labelled with the component title."""
+    label = title or "Result"
+    format_str = kwargs.get("format", None)
+    if format_str:
+        st.write(f"{label}: {format_str.format(content)}")
+    else:
+        st.write(f"{label}: {content}")
+
+
+def render_metric(
+    content: Any, kwargs: Mapping[str, Any], title: Optional[str] = None
+) -> None:
+    """Render a metric, labelled with the component title."""
+    delta = kwargs.get("delta", None)
+    delta_color = kwargs.get("delta_color", "normal")
+    st.metric(
+        label=title or "Metric",
+        value=content,
+        delta=delta,
+        delta_color=delta_color,
+    )
+
+
+def render_table(content: Any, kwargs: Mapping[str, Any]) -> None:
+    """Render a static table, or a preview of it if it is too large."""
+    if _render_preview(content, kwargs, st.table):
+        return
+    st.table(content)
+
+
+def _render_preview(
+    content: Any, kwargs: Mapping[str, Any], show: Callable[[Any], Any]
+) -> bool:
+    """
+    Render a head/tail preview of tabular content if the preview policy applies.
+
+    The preview is followed by a shape summary and a button that renders the full
+    data from the next rerun on. The choice is kept per component key, which is
+    saved with the component, in a single session state entry.
+
+    An ArrowFrame is previewed from its kept frame, or without one from the
+    pyarrow Table of its bytes, so that only the sampled rows are converted.
+
+    Args:
+        content: A DataFrame, Series, ArrowFrame, or a sequence of rows
+        kwargs: The keyword arguments of the component
+        show: Function rendering the sample
+
+    Returns:
+        bool: True if a preview was rendered, False if the full data should be
+              rendered instead
+    """
+    policy = get_preview_policy(kwargs)
+    component = _rendering_component.get()
+    if policy is None or component is None:
+        return False
+    key = component.key
+    if key in st.session_state.get(SHOW_FULL_STATE_KEY, ()):
+        return False
+    if isinstance(content, ArrowFrame):
+        content = content.frame if content.frame is not None else content.table()
+    if not policy.applies_to(content):
+        return False
+
+    rows, columns = data_shape(content)
+    show(head_tail(content, policy.sample_rows))
+    st.caption(
+        f"Showing the first and last {policy.sample_rows} of {rows:,} rows "
+        f"× {columns:,} columns"
+    )
+    st.button(
+        "Show full data",
+        key=f"srmh_show_full_{key}",
+        on_click=_show_full_data,
+        args=(key,),
+    )
+    return True
+
+
+def _show_full_data(key: str) -> None:
+    """Widget callback switching the preview of a component to the full data."""
+    st.session_state[SHOW_FULL_STATE_KEY] = {
+        *st.session_state.get(SHOW_FULL_STATE_KEY, ()),
+        key,
+    }
+
+
+def render_json(content: Any, kwargs: Mapping[str, Any]) -> None:
+    """Render JSON data."""
+    st.json(content)
+
+
+def render_html(content: Any, kwargs: Mapping[str, Any]) -> None:
+    """
+    Render raw HTML.
+
+    st.html has no height or scrolling options, so HTML with either of them is
+    rendered in an iframe through st.components.v1.html instead.
+    """
+    height = kwargs.get("height", None)
+    scrolling = kwargs.get("scrolling", False)
+    if height is None and not scrolling:
+        st.html(content)
+    else:
+        components.html(content, height=height, scrolling=scrolling)
+
+
+def render_fallback(content: Any, kwargs: Mapping[str, Any]) -> None:
+    """Render content of a type that has no renderer as plain text."""
+    st.write(str(content))
+
+
+BUILTIN_RENDERERS: Dict[ComponentType, Callable[..., None]] = {
+    ComponentType.TEXT: render_text,
+    ComponentType.ERROR: render_error,
+    ComponentType.CODE: render_code,
+    ComponentType.DATAFRAME: render_dataframe,
+    ComponentType.SERIES: render_series,
+    ComponentType.MATPLOTLIB_FIGURE: render_matplotlib_figure,
+    ComponentType.PLOTLY_FIGURE: render_plotly_figure,
+    ComponentType.NUMBER: render_number,
+    ComponentType.METRIC: render_metric,
+    ComponentType.TABLE: render_table,
+    ComponentType.JSON: render_json,
+    ComponentType.HTML: render_html,
+}
+
+#: Built-in types whose renderer takes the component title as a third argument
+TITLED_RENDERERS = frozenset({ComponentType.NUMBER, ComponentType.METRIC})
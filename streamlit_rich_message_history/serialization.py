@@ -0,0 +1,397 @@
+"""
+Persistence of message histories for the streamlit_rich_message_history package.
+
+A saved history is a zip archive with a versioned JSON manifest holding the
+messages, their components and all text and metadata, and one stored entry per
+heavy payload, encoded as by spill.encode_payload: DataFrames and Series as
+Parquet, matplotlib figures as PNG or SVG and plotly figures as their JSON spec.
+Loading only reads the manifest; payloads are read the first time their
+component is rendered.
+
+The message encoding itself does not depend on the zip container: payloads are
+handed to a callback that stores them and returns a reference, which the message
+log uses to store payloads inside its records.
+"""
+
+import json
+import os
+import tempfile
+import zipfile
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+from .components import MessageComponent
+from .enums import ComponentRegistry, ComponentType
+from .messages import AssistantMessage, ErrorMessage, Message, UserMessage
+from .spill import DeferredPayload, decode_payload, encode_payload
+from .utils import is_instance_of_loaded
+
+FORMAT_NAME = "streamlit-rich-message-history"
+FORMAT_VERSION = 1
+
+_MANIFEST = "manifest.json"
+# Component types whose key is saved, since widget state such as the choice to
+# show a preview in full is tied to it
+_KEYED_TYPES = frozenset(
+    {
+        ComponentType.DATAFRAME,
+        ComponentType.SERIES,
+        ComponentType.TABLE,
+        ComponentType.LIST,
+        ComponentType.TUPLE,
+        ComponentType.DICT,
+    }
+)
+_MESSAGE_CLASSES = {
+    cls.__name__: cls for cls in (Message, UserMessage, AssistantMessage, ErrorMessage)
+}
+
+
+class ArchivedPayload(DeferredPayload):
+    """
+    Component content stored in a saved history, read on first render.
+
+    Attributes:
+        path: Path of the archive
+        node: The manifest node describing the content
+    """
+
+    __slots__ = ("path", "node")
+
+    def __init__(self, path: str, node: Dict[str, Any]):
+        """
+        Initialize an archived payload.
+
+        Args:
+            path: Path of the archive
+            node: The manifest node describing the content
+        """
+        self.path = path
+        self.node = node
+
+    def read(self) -> Any:
+        """
+        Read the content from the archive.
+
+        Returns:
+            The content, with its payloads decoded
+        """
+        with zipfile.ZipFile(self.path) as archive:
+            return decode_node(self.node, archive.read)
+
+    def __repr__(self) -> str:
+        return f"ArchivedPayload(path={self.path!r})"
+
+
+def save_messages(messages: Sequence[Message], path: str) -> None:
+    """
+    Save messages to a history archive.
+
+    The archive is written to a temporary file first and then moved into place,
+    so an existing archive is only replaced once the new one is complete.
+    Content that has been spilled or not been read from an archive yet is saved
+    without rendering it.
+
+    Args:
+        messages: The messages to save
+        path: Path of the archive to write
+
+    Raises:
+        TypeError: If a component holds content that cannot be saved
+        ValueError: If a DataFrame or Series cannot be represented in Parquet
+    """
+    path = os.path.abspath(path)
+    directory = os.path.dirname(path)
+    fd, temp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+    os.close(fd)
+    # Components read from the archive being replaced, with their new nodes
+    rebound: List[Tuple[MessageComponent, Dict[str, Any]]] = []
+    try:
+        with zipfile.ZipFile(temp_path, "w", zipfile.ZIP_DEFLATED) as archive:
+
+            def write_payload(data: bytes) -> str:
+                entry = f"payloads/{len(archive.namelist())}"
+                archive.writestr(entry, data, compress_type=zipfile.ZIP_STORED)
+                return entry
+
+            records = []
+            for message in messages:
+                record = encode_message(message, write_payload)
+                for component, component_record in zip(
+                    message.components, record["components"]
+                ):
+                    content = component.content
+                    if isinstance(content, ArchivedPayload) and content.path == path:
+                        rebound.append((component, component_record["content"]))
+                records.append(record)
+            manifest = {
+                "format": FORMAT_NAME,
+                "version": FORMAT_VERSION,
+                "messages": records,
+            }
+            archive.writestr(_MANIFEST, json.dumps(manifest, separators=(",", ":")))
+        os.replace(temp_path, path)
+    except BaseException:
+        os.remove(temp_path)
+        raise
+
+    for component, node in rebound:
+        component.content = ArchivedPayload(path, node)
+
+
+def load_messages(path: str) -> List[Message]:
+    """
+    Load messages from a history archive.
+
+    Only the manifest is read. Components holding DataFrames, Series or figures
+    get an ArchivedPayload as content, which is read from the archive the first
+    time the component is rendered, so the archive has to stay in place until
+    then.
+
+    Args:
+        path: Path of the archive to read
+
+    Returns:
+        list: The loaded messages
+
+    Raises:
+        ValueError: If the file is not a history archive, or was written by a
+                    newer version of this package
+    """
+    path = os.path.abspath(path)
+    with zipfile.ZipFile(path) as archive:
+        try:
+            manifest = json.loads(archive.read(_MANIFEST))
+        except KeyError:
+            raise ValueError(f"{path} is not a message history archive") from None
+
+    if manifest.get("format") != FORMAT_NAME:
+        raise ValueError(f"{path} is not a message history archive")
+    if manifest.get("version", 0) > FORMAT_VERSION:
+        raise ValueError(
+            f"{path} uses format version {manifest['version']}, newer than the "
+            f"supported version {FORMAT_VERSION}"
+        )
+
+    return [
+        decode_message(record, lambda node: ArchivedPayload(path, node))
+        for record in manifest["messages"]
+    ]
+
+
+def encode_message(
+    message: Message, write_payload: Callable[[bytes], Any]
+) -> Dict[str, Any]:
+    """
+    Encode a message to a JSON-serializable record.
+
+    Text, metadata and other plain content is stored in the record. Heavy
+    payloads are encoded as by spill.encode_payload and passed to
+    ``write_payload``, which stores them and returns a JSON-serializable
+    reference to put in the record instead. Content that has been spilled or
+    not been read yet is encoded without rendering it, and lazy content that
+    has not been produced yet is produced to encode it. Component keyword
+    arguments that are not JSON-serializable are left out.
+
+    Args:
+        message: The message to encode
+        write_payload: Callback storing payload bytes and returning a reference
+
+    Returns:
+        dict: The message record
+
+    Raises:
+        TypeError: If a component holds content that cannot be encoded
+        ValueError: If a DataFrame or Series cannot be represented in Parquet
+    """
+    return {
+        "class": type(message).__name__,
+        "user": message.user,
+        "avatar": message.avatar,
+        "components": [
+            encode_component(component, write_payload)
+            for component in message.components
+        ],
+    }
+
+
+def decode_message(
+    record: Dict[str, Any], defer: Callable[[Dict[str, Any]], DeferredPayload]
+) -> Message:
+    """
+    Create a message from a record made by encode_message.
+
+    Args:
+        record: The message record
+        defer: Callback creating the deferred content of a component from a
+               content node that refers to payloads
+
+    Returns:
+        Message: The message, with the content of components holding payloads
+        deferred until they are rendered
+    """
+    cls = _MESSAGE_CLASSES.get(record["class"], Message)
+    message = cls.__new__(cls)
+    Message.__init__(message, record["user"], record["avatar"])
+    for component_record in record["components"]:
+        node = component_record["content"]
+        content = defer(node) if has_payload(node) else decode_node(node)
+        component = MessageComponent(
+            content,
+            component_type=_component_type(component_record["type"]),
+            title=component_record["title"],
+            description=component_record["description"],
+            expanded=component_record["expanded"],
+            **component_record["kwargs"],
+        )
+        component._key = component_record.get("key")
+        message.components.append(component)
+    return message
+
+
+def decode_node(
+    node: Dict[str, Any], read_payload: Optional[Callable[[Any], bytes]] = None
+) -> Any:
+    """
+    Decode a content node of a message record.
+
+    Args:
+        node: The content node
+        read_payload: Callback reading the bytes of a payload from its reference;
+                      only needed if the node refers to payloads
+
+    Returns:
+        The content, with its payloads decoded
+    """
+    if "value" in node:
+        return node["value"]
+    if "list" in node:
+        return [decode_node(item, read_payload) for item in node["list"]]
+    if "tuple" in node:
+        return tuple(decode_node(item, read_payload) for item in node["tuple"])
+    if "dict" in node:
+        return {key: decode_node(value, read_payload) for key, value in node["dict"]}
+    if read_payload is None:
+        raise ValueError("Decoding a payload needs a way to read it")
+    data = read_payload(node["payload"])
+    if node["kind"] == "bytes":
+        return data
+    return decode_payload(node["kind"], data, node.get("name"))
+
+
+def has_payload(node: Dict[str, Any]) -> bool:
+    """
+    Check whether a content node refers to any payload.
+
+    Args:
+        node: The content node
+
+    Returns:
+        bool: True if decoding the node needs to read payloads
+    """
+    if "payload" in node:
+        return True
+    if "list" in node:
+        return any(has_payload(item) for item in node["list"])
+    if "tuple" in node:
+        return any(has_payload(item) for item in node["tuple"])
+    if "dict" in node:
+        return any(has_payload(value) for _, value in node["dict"])
+    return False
+
+
+def encode_component(
+    component: MessageComponent, write_payload: Callable[[bytes], Any]
+) -> Dict[str, Any]:
+    """
+    Encode a component to a record, as it is stored in a message record.
+
+    Args:
+        component: The component to encode
+        write_payload: Callback storing payload bytes and returning a reference
+
+    Returns:
+        dict: The component record
+
+    Raises:
+        TypeError: If the component holds content that cannot be encoded
+        ValueError: If a DataFrame or Series cannot be represented in Parquet
+    """
+    content = component.content
+    if isinstance(content, DeferredPayload):
+        content = content.read()
+    component_type = component.component_type
+    if component_type is ComponentType.LAZY:
+        component_type = component._detect_component_type(content)
+    kwargs = {}
+    for key, value in component.kwargs.items():
+        try:
+            json.dumps(value)
+        except (TypeError, ValueError):
+            # For example a PreviewPolicy; options like this are not saved
+            continue
+        kwargs[key] = value
+    record = {
+        "type": component_type.value,
+        "title": component.title,
+        "description": component.description,
+        "expanded": component.expanded,
+        "kwargs": kwargs,
+        "content": _encode_node(content, write_payload),
+    }
+    if component_type in _KEYED_TYPES:
+        record["key"] = component.key
+    return record
+
+
+def _component_type(value: str) -> ComponentType:
+    """Get a built-in or custom component type by its value."""
+    try:
+        return ComponentType(value)
+    except ValueError:
+        pass
+    custom_type = ComponentRegistry.get_custom_type(value)
+    if custom_type is None:
+        custom_type = ComponentRegistry.register_component_type(value)
+    return custom_type
+
+
+def _encode_node(content: Any, write_payload: Callable[[bytes], Any]) -> Dict[str, Any]:
+    """
+    Encode content to a content node.
+
+    Scalars are stored inline, NumPy scalars as the equivalent Python scalar,
+    collections are encoded item by item, and heavy payloads and bytes are
+    passed to write_payload.
+    """
+    content = _python_scalar(content)
+    if content is None or isinstance(content, (str, bool, int, float)):
+        return {"value": content}
+    if isinstance(content, (list, tuple)):
+        items = [_encode_node(item, write_payload) for item in content]
+        return {"tuple" if isinstance(content, tuple) else "list": items}
+    if isinstance(content, dict):
+        pairs = [(_python_scalar(k), v) for k, v in content.items()]
+        for key, _ in pairs:
+            if not isinstance(key, (str, int, float, bool)) and key is not None:
+                raise TypeError(f"Cannot save dict with key of type {type(key)}")
+        return {"dict": [[k, _encode_node(v, write_payload)] for k, v in pairs]}
+    if isinstance(content, (bytes, bytearray)):
+        kind, data = "bytes", bytes(content)
+    else:
+        encoded = encode_payload(content)
+        if encoded is None:
+            raise TypeError(f"Cannot save content of type {type(content).__name__}")
+        kind, data = encoded
+
+    node: Dict[str, Any] = {"payload": write_payload(data), "kind": kind}
+    if kind == "series":
+        name = content.name
+        node["name"] = name if isinstance(name, (str, int, float)) else None
+    return node
+
+
+def _python_scalar(value: Any) -> Any:
+    """Convert a NumPy scalar, such as a numpy.int64, to the Python scalar."""
+    if is_instance_of_loaded(value, "numpy", "generic"):
+        return value.item()
+    return value
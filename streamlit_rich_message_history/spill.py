@@ -0,0 +1,246 @@
+"""
+Spilling of heavy payloads to disk for the streamlit_rich_message_history package.
+
+This module encodes DataFrames, Series and figures to bytes and back: frames as
+Parquet, cached Arrow frames as Arrow IPC, matplotlib figures as PNG or SVG and
+plotly figures as their JSON spec. It uses those encodings to write payloads to
+files in a cache directory and to read them back when they are rendered again.
+"""
+
+import abc
+import io
+import os
+import uuid
+from typing import Any, Dict, Hashable, Optional, Tuple
+
+from .figures import (
+    RasterizedFigure,
+    SerializedPlotlyFigure,
+    rasterize_figure,
+    serialize_plotly_figure,
+)
+from .frames import ArrowFrame, _frame_fingerprint
+from .utils import is_dataframe, is_matplotlib_figure, is_plotly_figure, is_series
+
+# Column name used for Series, since Parquet only supports string column names
+_SERIES_COLUMN = "__series__"
+
+
+class DeferredPayload(abc.ABC):
+    """
+    Base class for component content that is kept outside of memory.
+
+    MessageComponent replaces deferred content with the result of load() when
+    it is rendered. Subclasses implement read().
+    """
+
+    __slots__ = ()
+
+    @abc.abstractmethod
+    def read(self) -> Any:
+        """
+        Read the payload without releasing where it is stored.
+
+        Returns:
+            The payload, ready to be rendered
+        """
+
+    def load(self) -> Any:
+        """
+        Read the payload for rendering, releasing what is only needed to read it.
+
+        Returns:
+            The payload, ready to be rendered
+        """
+        return self.read()
+
+    def discard(self) -> None:
+        """Release the stored payload without reading it."""
+
+
+class SpilledPayload(DeferredPayload):
+    """
+    A component payload written to a file, read back on first render.
+
+    The file is kept when the payload is read back, so that a component whose
+    content is spilled again unchanged does not encode and write it again. It
+    is deleted by discard().
+
+    Attributes:
+        path: Path of the file holding the payload
+        kind: What the file holds; see encode_payload
+        name: For a Series, its name
+        sizes: Size estimates of the payload read back, by the ``deep`` flag of
+               MessageComponent.memory_usage, filled in as they are computed
+    """
+
+    __slots__ = ("path", "kind", "name", "sizes")
+
+    def __init__(self, path: str, kind: str, name: Optional[Hashable] = None):
+        """
+        Initialize a spilled payload.
+
+        Args:
+            path: Path of the file holding the payload
+            kind: What the file holds
+            name: For a Series, its name
+        """
+        self.path = path
+        self.kind = kind
+        self.name = name
+        self.sizes: Dict[bool, int] = {}
+
+    def read(self) -> Any:
+        """
+        Read the payload back from its file.
+
+        Matplotlib figures come back as a RasterizedFigure and plotly figures as
+        a SerializedPlotlyFigure, which render the same as the original figure.
+
+        Returns:
+            The payload, ready to be rendered
+        """
+        with open(self.path, "rb") as f:
+            return decode_payload(self.kind, f.read(), self.name)
+
+    def discard(self) -> None:
+        """Delete the file holding the payload, if it still exists."""
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
+
+    def __repr__(self) -> str:
+        return f"SpilledPayload(kind={self.kind!r}, path={self.path!r})"
+
+
+def encode_payload(content: Any, close: bool = False) -> Optional[Tuple[str, bytes]]:
+    """
+    Encode a heavy payload to bytes.
+
+    The kinds are "dataframe" and "series" for Parquet, "arrow" for the Arrow IPC
+    bytes of an ArrowFrame, "png" and "svg" for matplotlib figures and rasterized
+    figures, and "plotly" for the UTF-8 JSON spec of a plotly figure.
+
+    Args:
+        content: The payload to encode
+        close: Whether to close matplotlib figures once they are rasterized
+
+    Returns:
+        tuple: (kind, data), or None if the content is not a DataFrame, Series or
+        figure
+
+    Raises:
+        ValueError: If a DataFrame or Series cannot be represented in Parquet
+    """
+    if is_dataframe(content) or is_series(content):
+        buffer = io.BytesIO()
+        try:
+            if is_series(content):
+                content.to_frame(name=_SERIES_COLUMN).to_parquet(buffer)
+                return "series", buffer.getvalue()
+            content.to_parquet(buffer)
+            return "dataframe", buffer.getvalue()
+        except (TypeError, NotImplementedError) as e:
+            raise ValueError(f"Cannot store frame as Parquet: {e}") from e
+    if isinstance(content, ArrowFrame):
+        return "arrow", content.refresh()
+    if is_matplotlib_figure(content):
+        content = rasterize_figure(content, close=close)
+    if isinstance(content, RasterizedFigure):
+        data = content.data
+        return content.format, data.encode("utf-8") if isinstance(data, str) else data
+    if is_plotly_figure(content):
+        content = serialize_plotly_figure(content, keep_figure=False)
+    if isinstance(content, SerializedPlotlyFigure):
+        return "plotly", content.spec.encode("utf-8")
+    return None
+
+
+def decode_payload(kind: str, data: bytes, name: Optional[Hashable] = None) -> Any:
+    """
+    Decode a payload encoded by encode_payload.
+
+    Args:
+        kind: The kind returned by encode_payload
+        data: The encoded bytes
+        name: For a Series, its name
+
+    Returns:
+        The decoded payload
+
+    Raises:
+        ValueError: If the kind is unknown
+    """
+    if kind in ("dataframe", "series"):
+        import pandas as pd
+
+        frame = pd.read_parquet(io.BytesIO(data))
+        if kind == "series":
+            series = frame[_SERIES_COLUMN]
+            series.name = name
+            return series
+        return frame
+    if kind == "arrow":
+        return ArrowFrame(data)
+    if kind == "png":
+        return RasterizedFigure(data, "png")
+    if kind == "svg":
+        return RasterizedFigure(data.decode("utf-8"), "svg")
+    if kind == "plotly":
+        return SerializedPlotlyFigure(data.decode("utf-8"))
+    raise ValueError(f"Unknown payload kind: {kind!r}")
+
+
+def spill_payload(content: Any, directory: str) -> Optional[SpilledPayload]:
+    """
+    Write a heavy payload to a new file in a directory.
+
+    Args:
+        content: The payload to write
+        directory: Existing directory to write the file to
+
+    Returns:
+        SpilledPayload: The spilled payload, or None if the content is not a
+        DataFrame, Series or figure, or could not be written, in which case it
+        should stay in memory
+    """
+    try:
+        encoded = encode_payload(content, close=True)
+    except ValueError:
+        # For example object columns Parquet cannot represent
+        return None
+    if encoded is None:
+        return None
+
+    kind, data = encoded
+    path = os.path.join(directory, uuid.uuid4().hex)
+    try:
+        with open(path, "wb") as f:
+            f.write(data)
+    except OSError:
+        if os.path.exists(path):
+            os.remove(path)
+        return None
+    return SpilledPayload(path, kind, content.name if kind == "series" else None)
+
+
+def content_fingerprint(content: Any) -> Any:
+    """
+    Get a cheap fingerprint of a payload read back from a spill file.
+
+    A spill file is only reused for the same content object with the same
+    fingerprint. The fingerprint catches structural changes to DataFrames and
+    Series and rebuilt Arrow bytes; figures read back are not changed in place.
+
+    Args:
+        content: The payload read back
+
+    Returns:
+        A hashable fingerprint, or None for payloads without one
+    """
+    if is_dataframe(content) or is_series(content):
+        return _frame_fingerprint(content)
+    if isinstance(content, ArrowFrame):
+        return id(content.refresh())
+    return None
@@ -0,0 +1,618 @@
+"""
+SQLite message store for the streamlit_rich_message_history package.
+
+This module defines SQLiteMessageStore, a list of messages backed by a SQLite
+database that can hold many conversations. Messages are stored one row each,
+indexed by conversation, position and role, with a row per component holding
+its metadata and content node as made by serialization.encode_message, and a
+blob per heavy payload. Indexing, slicing, "last N" and role filtering are
+indexed queries: only the messages they return are decoded, and their
+DataFrames and figures are only read when they are rendered.
+"""
+
+import json
+import sqlite3
+import threading
+from collections import OrderedDict
+from collections.abc import MutableSequence
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
+
+from .components import MessageComponent
+from .messages import Message
+from .serialization import decode_message, decode_node, encode_component
+from .spill import DeferredPayload
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS messages (
+    id INTEGER PRIMARY KEY,
+    conversation TEXT NOT NULL,
+    position INTEGER NOT NULL,
+    class TEXT NOT NULL,
+    role TEXT NOT NULL,
+    avatar TEXT
+);
+CREATE INDEX IF NOT EXISTS messages_by_position
+    ON messages (conversation, position);
+CREATE INDEX IF NOT EXISTS messages_by_role
+    ON messages (conversation, role, position);
+CREATE TABLE IF NOT EXISTS components (
+    message_id INTEGER NOT NULL REFERENCES messages (id) ON DELETE CASCADE,
+    idx INTEGER NOT NULL,
+    type TEXT NOT NULL,
+    title TEXT,
+    description TEXT,
+    expanded INTEGER NOT NULL,
+    kwargs TEXT NOT NULL,
+    content TEXT NOT NULL,
+    component_key TEXT,
+    PRIMARY KEY (message_id, idx)
+);
+CREATE TABLE IF NOT EXISTS payloads (
+    id INTEGER PRIMARY KEY,
+    message_id INTEGER NOT NULL REFERENCES messages (id) ON DELETE CASCADE,
+    data BLOB NOT NULL
+);
+CREATE INDEX IF NOT EXISTS payloads_by_message ON payloads (message_id);
+"""
+
+# Keeps IN (...) queries below SQLite's limit on host parameters
+_CHUNK_SIZE = 500
+
+
+class StoredPayload(DeferredPayload):
+    """
+    Component content stored in a SQLite message store, read on first render.
+
+    Attributes:
+        store: The store holding the payload
+        node: The content node of the component, referring to payload rows
+    """
+
+    __slots__ = ("store", "node")
+
+    def __init__(self, store: "SQLiteMessageStore", node: Dict[str, Any]):
+        """
+        Initialize a stored payload.
+
+        Args:
+            store: The store holding the payload
+            node: The content node of the component
+        """
+        self.store = store
+        self.node = node
+
+    def read(self) -> Any:
+        """
+        Read the content from the database.
+
+        Returns:
+            The content, with its payloads decoded
+        """
+        return decode_node(self.node, self.store._read_payload)
+
+    def __repr__(self) -> str:
+        return f"StoredPayload(conversation={self.store.conversation_id!r})"
+
+
+class SQLiteMessageStore(MutableSequence):
+    """
+    A list of the messages of one conversation, backed by a SQLite database.
+
+    The database may hold any number of conversations, so one file can serve
+    every session of a Streamlit server. The store keeps the last
+    ``cache_size`` messages it has decoded or been given, and nothing else, in
+    memory; the least recently used ones are dropped beyond that, and decoded
+    again when accessed. Components added to a message after it was stored are
+    written by sync, or when the message is dropped from memory; changes made
+    to a message after it was dropped are not written.
+
+    Attributes:
+        path: Path of the database file
+        conversation_id: Id of the conversation held by this store
+        cache_size: Number of messages kept in memory
+    """
+
+    def __init__(
+        self, path: str, conversation_id: str = "default", cache_size: int = 1000
+    ):
+        """
+        Open a conversation in a SQLite database, creating the tables if needed.
+
+        Args:
+            path: Path of the database file, or ":memory:"
+            conversation_id: Id of the conversation to open
+            cache_size: Number of decoded messages kept in memory
+
+        Raises:
+            ValueError: If cache_size is smaller than 1
+        """
+        if cache_size < 1:
+            raise ValueError(f"cache_size must be at least 1, got {cache_size}")
+        self.path = path
+        self.conversation_id = conversation_id
+        self.cache_size = cache_size
+        # Streamlit runs each script rerun in its own thread
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._lock = threading.RLock()
+        self._conn.execute("PRAGMA foreign_keys = ON")
+        if path != ":memory:":
+            self._conn.execute("PRAGMA journal_mode = WAL")
+        with self._conn:
+            self._conn.executescript(_SCHEMA)
+            columns = {
+                row[1] for row in self._conn.execute("PRAGMA table_info(components)")
+            }
+            if "component_key" not in columns:
+                # Databases created before component keys were stored
+                self._conn.execute(
+                    "ALTER TABLE components ADD COLUMN component_key TEXT"
+                )
+        # Decoded messages by id, least recently used first
+        self._cache: "OrderedDict[int, Message]" = OrderedDict()
+        self._counts: Dict[int, int] = {}
+
+    @staticmethod
+    def conversations(path: str) -> List[str]:
+        """
+        List the conversations stored in a database.
+
+        Args:
+            path: Path of the database file
+
+        Returns:
+            list: The conversation ids, sorted
+        """
+        store = SQLiteMessageStore(path, "")
+        try:
+            return [
+                row[0]
+                for row in store._conn.execute(
+                    "SELECT DISTINCT conversation FROM messages ORDER BY conversation"
+                )
+            ]
+        finally:
+            store.close()
+
+    def _query_ids(
+        self, where: str = "", params: Sequence[Any] = (), tail: str = ""
+    ) -> List[int]:
+        """Get the ids of the messages of this conversation matching a condition."""
+        sql = f"SELECT id FROM messages WHERE conversation = ? {where} {tail}"
+        with self._lock:
+            rows = self._conn.execute(sql, (self.conversation_id, *params)).fetchall()
+        return [row[0] for row in rows]
+
+    def _message(self, message_id: int) -> Message:
+        """Get a message by id, decoding it on first access."""
+        message = self._cache.get(message_id)
+        if message is not None:
+            self._cache.move_to_end(message_id)
+            return message
+        with self._lock:
+            cls, role, avatar = self._conn.execute(
+                "SELECT class, role, avatar FROM messages WHERE id = ?", (message_id,)
+            ).fetchone()
+            rows = self._conn.execute(
+                "SELECT type, title, description, expanded, kwargs, content, "
+                "component_key FROM components WHERE message_id = ? ORDER BY idx",
+                (message_id,),
+            ).fetchall()
+        record = {
+            "class": cls,
+            "user": role,
+            "avatar": avatar,
+            "components": [
+                {
+                    "type": type_,
+                    "title": title,
+                    "description": description,
+                    "expanded": bool(expanded),
+                    "kwargs": json.loads(kwargs),
+                    "content": json.loads(content),
+                    "key": key,
+                }
+                for type_, title, description, expanded, kwargs, content, key in rows
+            ],
+        }
+        message = decode_message(record, lambda node: StoredPayload(self, node))
+        self._cache[message_id] = message
+        self._counts[message_id] = len(message.components)
+        self._evict()
+        return message
+
+    def _evict(self) -> None:
+        """Drop the least recently used messages beyond cache_size from memory."""
+        while len(self._cache) > self.cache_size:
+            message_id, message = next(iter(self._cache.items()))
+            if len(message.components) > self._counts[message_id]:
+                self._store_added_components(message_id, message)
+            elif len(message.components) < self._counts[message_id]:
+                _, records = self._write(message, message_id=message_id)
+                _rebind(message.components, records)
+            del self._cache[message_id]
+            del self._counts[message_id]
+
+    def _read_payload(self, payload_id: int) -> bytes:
+        """Read the bytes of a payload row."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT data FROM payloads WHERE id = ?", (payload_id,)
+            ).fetchone()
+        if row is None:
+            raise ValueError(f"Payload {payload_id} is missing from {self.path}")
+        return row[0]
+
+    def _store(
+        self,
+        message: Message,
+        position: Optional[int] = None,
+        message_id: Optional[int] = None,
+    ) -> int:
+        """
+        Write a message, as a new row at a position or replacing a message row.
+
+        Returns:
+            int: The id of the message row
+        """
+        message_id, records = self._write(message, position, message_id)
+        previous = self._cache.get(message_id)
+        if previous is not None and previous is not message:
+            _detach(previous)
+        self._cache[message_id] = message
+        self._cache.move_to_end(message_id)
+        self._counts[message_id] = len(message.components)
+        _rebind(message.components, records)
+        self._evict()
+        return message_id
+
+    def _write(
+        self,
+        message: Message,
+        position: Optional[int] = None,
+        message_id: Optional[int] = None,
+    ) -> Tuple[int, List[Dict[str, Any]]]:
+        """
+        Write the rows of a message, without updating the cache.
+
+        Returns:
+            tuple: The id of the message row and the component records
+        """
+        with self._lock, self._conn as conn:
+            if message_id is None:
+                assert position is not None
+                message_id = conn.execute(
+                    "INSERT INTO messages "
+                    "(conversation, position, class, role, avatar) "
+                    "VALUES (?, ?, ?, ?, ?)",
+                    (
+                        self.conversation_id,
+                        position,
+                        type(message).__name__,
+                        message.user,
+                        message.avatar,
+                    ),
+                ).lastrowid
+                old_payloads: List[Tuple[int]] = []
+            else:
+                old_payloads = conn.execute(
+                    "SELECT id FROM payloads WHERE message_id = ?", (message_id,)
+                ).fetchall()
+                conn.execute(
+                    "UPDATE messages SET class = ?, role = ?, avatar = ? WHERE id = ?",
+                    (type(message).__name__, message.user, message.avatar, message_id),
+                )
+                conn.execute(
+                    "DELETE FROM components WHERE message_id = ?", (message_id,)
+                )
+            assert message_id is not None
+            # Old payloads are deleted only after encoding, which may read them
+            records = self._insert_components(conn, message_id, message.components)
+            conn.executemany("DELETE FROM payloads WHERE id = ?", old_payloads)
+        return message_id, records
+
+    def _store_added_components(self, message_id: int, message: Message) -> None:
+        """Write the components added to a message since it was stored."""
+        start = self._counts[message_id]
+        added = message.components[start:]
+        with self._lock, self._conn as conn:
+            records = self._insert_components(conn, message_id, added, start)
+        self._counts[message_id] = len(message.components)
+        _rebind(added, records)
+
+    @staticmethod
+    def _insert_components(
+        conn: sqlite3.Connection,
+        message_id: int,
+        components: Sequence[MessageComponent],
+        start: int = 0,
+    ) -> List[Dict[str, Any]]:
+        """
+        Insert component rows and their payloads, numbering them from start.
+
+        Returns:
+            list: The component records
+        """
+
+        def write_payload(data: bytes) -> Optional[int]:
+            return conn.execute(
+                "INSERT INTO payloads (message_id, data) VALUES (?, ?)",
+                (message_id, data),
+            ).lastrowid
+
+        records = [
+            encode_component(component, write_payload) for component in components
+        ]
+        conn.executemany(
+            "INSERT INTO components (message_id, idx, type, title, description, "
+            "expanded, kwargs, content, component_key) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            [
+                (
+                    message_id,
+                    idx,
+                    record["type"],
+                    record["title"],
+                    record["description"],
+                    record["expanded"],
+                    json.dumps(record["kwargs"]),
+                    json.dumps(record["content"], separators=(",", ":")),
+                    record.get("key"),
+                )
+                for idx, record in enumerate(records, start)
+            ],
+        )
+        return records
+
+    def __len__(self) -> int:
+        with self._lock:
+            (count,) = self._conn.execute(
+                "SELECT COUNT(*) FROM messages WHERE conversation = ?",
+                (self.conversation_id,),
+            ).fetchone()
+        return count
+
+    def __iter__(self) -> Iterator[Message]:
+        for message_id in self._query_ids(tail="ORDER BY position"):
+            yield self._message(message_id)
+
+    def _id_at(self, index: int) -> Tuple[int, int]:
+        """Get the position and message id for an index, which may be negative."""
+        position = range(len(self))[index]
+        return position, self._query_ids("AND position = ?", (position,))[0]
+
+    def __getitem__(self, index: Any) -> Any:
+        """
+        Get a message, or a list of messages for a slice.
+
+        Slices with a step of 1 are a single range query on the position index.
+
+        Args:
+            index: Position of the message, or a slice of positions
+
+        Returns:
+            The message, or a list of messages for a slice
+        """
+        if isinstance(index, slice):
+            start, stop, step = index.indices(len(self))
+            if step != 1:
+                return [self[i] for i in range(start, stop, step)]
+            ids = self._query_ids(
+                "AND position >= ? AND position < ?", (start, stop), "ORDER BY position"
+            )
+            return [self._message(message_id) for message_id in ids]
+        _, message_id = self._id_at(index)
+        return self._message(message_id)
+
+    def __setitem__(self, index: Any, message: Any) -> None:
+        """Replace a message, or the messages in a slice."""
+        if isinstance(index, slice):
+            messages = list(message)
+            start, stop, step = index.indices(len(self))
+            if step != 1:
+                positions = range(start, stop, step)
+                if len(positions) != len(messages):
+                    raise ValueError(
+                        f"attempt to assign sequence of size {len(messages)} to "
+                        f"extended slice of size {len(positions)}"
+                    )
+                for position, item in zip(positions, messages):
+                    self[position] = item
+                return
+            del self[index]
+            for offset, item in enumerate(messages):
+                self.insert(start + offset, item)
+            return
+        position, message_id = self._id_at(index)
+        self._store(message, message_id=message_id)
+
+    def __delitem__(self, index: Any) -> None:
+        """Delete a message, or the messages in a slice."""
+        if isinstance(index, slice):
+            for position in sorted(range(len(self))[index], reverse=True):
+                del self[position]
+            return
+        position, message_id = self._id_at(index)
+        message = self._cache.pop(message_id, None)
+        self._counts.pop(message_id, None)
+        if message is not None:
+            _detach(message)
+        with self._lock, self._conn as conn:
+            conn.execute("DELETE FROM messages WHERE id = ?", (message_id,))
+            conn.execute(
+                "UPDATE messages SET position = position - 1 "
+                "WHERE conversation = ? AND position > ?",
+                (self.conversation_id, position),
+            )
+
+    def insert(self, index: int, message: Message) -> None:
+        """
+        Insert a message before a position.
+
+        Args:
+            index: Position to insert the message at
+            message: The message to insert
+        """
+        length = len(self)
+        position = min(max(index + length if index < 0 else index, 0), length)
+        with self._lock:
+            if position < length:
+                with self._conn:
+                    self._conn.execute(
+                        "UPDATE messages SET position = position + 1 "
+                        "WHERE conversation = ? AND position >= ?",
+                        (self.conversation_id, position),
+                    )
+            try:
+                self._store(message, position)
+            except BaseException:
+                if position < length:
+                    with self._conn:
+                        self._conn.execute(
+                            "UPDATE messages SET position = position - 1 "
+                            "WHERE conversation = ? AND position > ?",
+                            (self.conversation_id, position),
+                        )
+                raise
+
+    def append(self, message: Message) -> None:
+        """
+        Append a message to the conversation.
+
+        Args:
+            message: The message to append
+        """
+        self._store(message, len(self))
+
+    def clear(self) -> None:
+        """Delete all messages of the conversation."""
+        for message in self._cache.values():
+            _detach(message)
+        self._cache.clear()
+        self._counts.clear()
+        with self._lock, self._conn as conn:
+            conn.execute(
+                "DELETE FROM messages WHERE conversation = ?", (self.conversation_id,)
+            )
+
+    def last(self, n: int) -> List[Message]:
+        """
+        Get the last n messages, oldest first.
+
+        Args:
+            n: Number of messages
+
+        Returns:
+            list: The messages
+        """
+        ids = self._query_ids(tail="ORDER BY position DESC LIMIT ?", params=(n,))
+        return [self._message(message_id) for message_id in reversed(ids)]
+
+    def page(self, page: int, page_size: int = 20) -> List[Message]:
+        """
+        Get a page of messages, counting from the oldest.
+
+        Args:
+            page: Index of the page, starting at 0
+            page_size: Number of messages per page
+
+        Returns:
+            list: The messages on the page, which is empty past the last page
+        """
+        start = page * page_size
+        stop = start + page_size
+        return self[start:stop]
+
+    def by_role(self, role: str, limit: Optional[int] = None) -> List[Message]:
+        """
+        Get the messages with a role, oldest first.
+
+        Args:
+            role: The role, as in ``Message.user``
+            limit: Optional number of messages; the most recent ones are returned
+
+        Returns:
+            list: The messages
+        """
+        if limit is None:
+            ids = self._query_ids("AND role = ?", (role,), "ORDER BY position")
+        else:
+            ids = self._query_ids(
+                "AND role = ?", (role, limit), "ORDER BY position DESC LIMIT ?"
+            )
+            ids.reverse()
+        return [self._message(message_id) for message_id in ids]
+
+    @property
+    def materialized(self) -> List[Tuple[int, Message]]:
+        """The (position, message) pairs decoded or added so far."""
+        ids = list(self._cache)
+        positions: Dict[int, int] = {}
+        with self._lock:
+            for start in range(0, len(ids), _CHUNK_SIZE):
+                stop = start + _CHUNK_SIZE
+                chunk = ids[start:stop]
+                placeholders = ", ".join("?" * len(chunk))
+                positions.update(
+                    self._conn.execute(
+                        "SELECT id, position FROM messages "
+                        f"WHERE id IN ({placeholders})",
+                        chunk,
+                    ).fetchall()
+                )
+        return sorted(
+            (positions[message_id], message)
+            for message_id, message in self._cache.items()
+            if message_id in positions
+        )
+
+    def sync(self) -> int:
+        """
+        Write messages whose components changed since they were stored.
+
+        A message is considered changed if its number of components changed,
+        which covers adding components to a message after adding the message to
+        the history; only the rows of the added components are written then.
+        After changing a component in place, assign the message again instead,
+        as in ``store[i] = store[i]``.
+
+        Returns:
+            int: The number of messages written
+        """
+        changed = [
+            message_id
+            for message_id, message in self._cache.items()
+            if len(message.components) != self._counts.get(message_id)
+        ]
+        for message_id in changed:
+            message = self._cache[message_id]
+            if len(message.components) > self._counts[message_id]:
+                self._store_added_components(message_id, message)
+            else:
+                self._store(message, message_id=message_id)
+        return len(changed)
+
+    def close(self) -> None:
+        """Close the database connection."""
+        self._conn.close()
+
+    def __repr__(self) -> str:
+        return (
+            f"SQLiteMessageStore(path={self.path!r}, "
+            f"conversation_id={self.conversation_id!r})"
+        )
+
+
+def _detach(message: Message) -> None:
+    """Read the stored payloads of a message that no longer refers to the store."""
+    for component in message.components:
+        if isinstance(component.content, StoredPayload):
+            component.content = component.content.read()
+
+
+def _rebind(
+    components: Sequence[MessageComponent], records: List[Dict[str, Any]]
+) -> None:
+    """Point the stored payloads of components at their new content nodes."""
+    for component, record in zip(components, records):
+        if isinstance(component.content, StoredPayload):
+            component.content.node = record["content"]
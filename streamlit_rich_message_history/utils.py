@@ -0,0 +1,88 @@
+"""
+Utility helpers for the streamlit_rich_message_history package.
+
+The heavy optional libraries (pandas, matplotlib, plotly) are never imported
+eagerly by this package. Content produced by one of them can only exist once the
+library itself has been imported by the caller, so type checks consult
+``sys.modules`` instead of importing anything.
+"""
+
+import sys
+from typing import Any, FrozenSet, Mapping, Optional
+
+
+def loaded_type(module_name: str, attribute: str) -> Optional[type]:
+    """
+    Get a class from a module only if that module has already been imported.
+
+    Args:
+        module_name: Fully qualified module name, e.g. ``"pandas"``
+        attribute: Name of the class within the module, e.g. ``"DataFrame"``
+
+    Returns:
+        type: The class if the module is loaded, None otherwise
+    """
+    module = sys.modules.get(module_name)
+    if module is None:
+        return None
+    return getattr(module, attribute, None)
+
+
+def is_instance_of_loaded(content: Any, module_name: str, attribute: str) -> bool:
+    """
+    Check ``isinstance(content, module.attribute)`` without importing the module.
+
+    Args:
+        content: The object to check
+        module_name: Fully qualified module name that defines the class
+        attribute: Name of the class within the module
+
+    Returns:
+        bool: True if the module is loaded and content is an instance of the class
+    """
+    cls = loaded_type(module_name, attribute)
+    return cls is not None and isinstance(content, cls)
+
+
+def is_dataframe(content: Any) -> bool:
+    """Check whether content is a pandas DataFrame."""
+    return is_instance_of_loaded(content, "pandas", "DataFrame")
+
+
+def is_series(content: Any) -> bool:
+    """Check whether content is a pandas Series."""
+    return is_instance_of_loaded(content, "pandas", "Series")
+
+
+def is_arrow_table(content: Any) -> bool:
+    """Check whether content is a pyarrow Table."""
+    return is_instance_of_loaded(content, "pyarrow", "Table")
+
+
+def is_matplotlib_figure(content: Any) -> bool:
+    """Check whether content is a matplotlib Figure."""
+    return is_instance_of_loaded(content, "matplotlib.figure", "Figure")
+
+
+def is_plotly_figure(content: Any) -> bool:
+    """Check whether content is a plotly graph_objects Figure."""
+    return is_instance_of_loaded(content, "plotly.graph_objs._figure", "Figure")
+
+
+def detection_flags(kwargs: Mapping[str, Any]) -> FrozenSet[str]:
+    """
+    Get the set of active detection flags from component kwargs.
+
+    Detection flags are the truthy ``is_*`` keyword arguments, such as
+    ``is_code`` or ``is_table``. Together with the content class they determine
+    the result of built-in and cacheable type detection.
+
+    Args:
+        kwargs: The keyword arguments of a component
+
+    Returns:
+        frozenset: Names of the active flags
+    """
+    if not kwargs:
+        return frozenset()
+    return frozenset(k for k, v in kwargs.items() if v and k.startswith("is_"))
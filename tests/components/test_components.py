@@ -1,7 +1,10 @@
+from unittest.mock import patch
+
 import matplotlib.pyplot as plt
 import pandas as pd
 
 from streamlit_rich_message_history import ComponentType, MessageComponent
+from streamlit_rich_message_history.enums import ComponentRegistry
 
 
 def test_text_component_detection():
@@ -54,3 +57,120 @@ def test_matplotlib_figure_detection():
     ax.plot([1, 2, 3], [4, 5, 6])
     component = MessageComponent(fig)
     assert component.component_type == ComponentType.MATPLOTLIB_FIGURE
+
+
+def test_every_builtin_type_has_a_renderer():
+    for comp_type in ComponentType:
+        assert ComponentRegistry.get_renderer(comp_type) is not None
+
+
+def test_builtin_renderer_can_be_wrapped():
+    original = ComponentRegistry.get_renderer(ComponentType.TEXT)
+    seen = []
+
+    def wrapped(content, kwargs):
+        seen.append(content)
+        original(content, kwargs)
+
+    ComponentRegistry.register_renderer(ComponentType.TEXT, wrapped)
+    try:
+        with patch("streamlit_rich_message_history.renderers.st") as mock_st:
+            MessageComponent("Hello")._render_content()
+    finally:
+        ComponentRegistry.register_renderer(ComponentType.TEXT, original)
+
+    assert seen == ["Hello"]
+    mock_st.markdown.assert_called_once_with("Hello")
+
+
+def test_number_renderer_uses_title():
+    component = MessageComponent(3.14159, format="{:.2f}", title="Pi")
+    with patch("streamlit_rich_message_history.renderers.st") as mock_st:
+        component._render_content()
+
+    mock_st.write.assert_called_once_with("Pi: 3.14")
+
+
+def test_custom_renderer_kwargs_exclude_title():
+    received = []
+    original = ComponentRegistry.get_renderer(ComponentType.TEXT)
+    ComponentRegistry.register_renderer(
+        ComponentType.TEXT, lambda content, kwargs: received.append(dict(kwargs))
+    )
+    try:
+        MessageComponent("Hello", title="Greeting", language="en")._render_content()
+    finally:
+        ComponentRegistry.register_renderer(ComponentType.TEXT, original)
+
+    assert received == [{"language": "en"}]
+
+
+def test_collection_children_are_built_once():
+    component = MessageComponent(["a", 1, "b"], language="sql")
+
+    first = component.children
+    assert [index for index, _ in first] == [0, 1, 2]
+    assert [child.component_type for _, child in first] == [
+        ComponentType.TEXT,
+        ComponentType.NUMBER,
+        ComponentType.TEXT,
+    ]
+    assert all(child.kwargs == {"language": "sql"} for _, child in first)
+
+    with patch("streamlit_rich_message_history.renderers.st"):
+        component._render_content()
+        component._render_content()
+    assert component.children is first
+
+
+def test_children_follow_in_place_edits():
+    items = ["a", "b"]
+    mapping = {"x": "a"}
+    list_component = MessageComponent(items)
+    dict_component = MessageComponent(mapping)
+    first, second = list_component.children
+    dict_component.children
+
+    items[0] = "c"
+    mapping["x"] = "d"
+
+    assert [child.content for _, child in list_component.children] == ["c", "b"]
+    assert list_component.children[1] is second
+    assert list_component.children[0] is not first
+    assert dict_component.children[0][1].content == "d"
+
+
+def test_dict_children_render_values():
+    component = MessageComponent({"greeting": "hi", "answer": 42})
+    with patch("streamlit_rich_message_history.renderers.st") as mock_st:
+        component._render_content()
+
+    mock_st.markdown.assert_called_once_with("hi")
+    mock_st.write.assert_called_once_with("Result: 42")
+
+
+def test_non_collection_has_no_children():
+    assert MessageComponent(42).children == []
+
+
+def test_html_renderer_uses_iframe_for_height():
+    with (
+        patch("streamlit_rich_message_history.renderers.st") as mock_st,
+        patch("streamlit_rich_message_history.renderers.components") as mock_components,
+    ):
+        MessageComponent("<b>hi</b>", is_html=True)._render_content()
+        MessageComponent("<b>hi</b>", is_html=True, height=300)._render_content()
+
+    mock_st.html.assert_called_once_with("<b>hi</b>")
+    mock_components.html.assert_called_once_with(
+        "<b>hi</b>", height=300, scrolling=False
+    )
+
+
+def test_components_are_slotted():
+    component = MessageComponent("Hello")
+
+    assert not hasattr(component, "__dict__")
+    assert component.kwargs == {}
+    component.kwargs["language"] = "en"
+    assert MessageComponent("World").kwargs == {}
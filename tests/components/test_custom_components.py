@@ -20,6 +20,7 @@ class TestCustomComponents:
             if hasattr(ComponentRegistry, "_type_detectors")
             else {}
         )
+        self._original_detector_options = ComponentRegistry._detector_options.copy()
         self._original_type_renderers = (
             ComponentRegistry._type_renderers.copy()
             if hasattr(ComponentRegistry, "_type_renderers")
@@ -56,6 +57,7 @@ class TestCustomComponents:
         """Restore original registry state after each test."""
         ComponentRegistry._custom_types = self._original_custom_types
         ComponentRegistry._type_detectors = self._original_type_detectors
+        ComponentRegistry._detector_options = self._original_detector_options
         ComponentRegistry._type_renderers = self._original_type_renderers
         Message._custom_component_methods = self._original_methods
 
@@ -265,3 +267,151 @@ class TestCustomComponents:
 
         # Verify debug info was shown
         mock_st.expander.assert_called()
+
+    def test_cacheable_detector_runs_once_per_class(self):
+        """Test that a cacheable detector is only run once per content class."""
+        marker_type = MessageHistory.register_component_type("marker")
+        calls = []
+
+        class Marker:
+            pass
+
+        def is_marker(content, kwargs):
+            calls.append(content)
+            return isinstance(content, Marker)
+
+        MessageHistory.register_component_detector(
+            marker_type, is_marker, cacheable=True
+        )
+
+        for _ in range(3):
+            assert MessageComponent(Marker()).component_type == marker_type
+        assert MessageComponent("text").component_type == ComponentType.TEXT
+        assert MessageComponent("text").component_type == ComponentType.TEXT
+
+        assert len(calls) == 2
+
+    def test_value_dependent_detector_runs_every_time(self):
+        """Test that detectors are value-dependent unless declared cacheable."""
+        special_type = MessageHistory.register_component_type("special")
+
+        def is_special(content, kwargs):
+            return isinstance(content, dict) and content.get("special") is True
+
+        MessageHistory.register_component_detector(special_type, is_special)
+
+        assert MessageComponent({"special": True}).component_type == special_type
+        assert MessageComponent({"special": False}).component_type == (
+            ComponentType.DICT
+        )
+        assert MessageComponent({"special": True}).component_type == special_type
+
+    def test_register_detector_invalidates_cache(self):
+        """Test that registering a detector clears cached detection results."""
+        assert MessageComponent("hello").component_type == ComponentType.TEXT
+
+        shout_type = MessageHistory.register_component_type("shout")
+        MessageHistory.register_component_detector(
+            shout_type, lambda content, kwargs: isinstance(content, str), True
+        )
+
+        assert MessageComponent("hello").component_type == shout_type
+
+    def test_detection_cache_is_keyed_on_flags(self):
+        """Test that the is_* flags are part of the detection cache key."""
+        assert MessageComponent("x").component_type == ComponentType.TEXT
+        assert MessageComponent("x", is_code=True).component_type == (
+            ComponentType.CODE
+        )
+        assert MessageComponent("x", is_code=False).component_type == (
+            ComponentType.TEXT
+        )
+
+    def test_detector_types_hint_skips_other_classes(self):
+        """Test that detectors with types hints only run for matching content."""
+        number_type = MessageHistory.register_component_type("fancy_number")
+        calls = []
+
+        def is_fancy(content, kwargs):
+            calls.append(content)
+            return content > 100
+
+        MessageHistory.register_component_detector(
+            number_type, is_fancy, types=(int, float)
+        )
+
+        assert MessageComponent("text").component_type == ComponentType.TEXT
+        assert MessageComponent(500).component_type == number_type
+        assert MessageComponent(5).component_type == ComponentType.NUMBER
+        assert calls == [500, 5]
+
+    def test_detector_priority_order(self):
+        """Test that higher priority detectors run before earlier registered ones."""
+        low_type = MessageHistory.register_component_type("low")
+        high_type = MessageHistory.register_component_type("high")
+
+        MessageHistory.register_component_detector(
+            low_type, lambda content, kwargs: True, priority=0
+        )
+        MessageHistory.register_component_detector(
+            high_type, lambda content, kwargs: True, priority=10
+        )
+
+        assert MessageComponent("anything").component_type == high_type
+
+    def test_detector_stats(self):
+        """Test that detector hit rates are reported when enabled."""
+        special_type = MessageHistory.register_component_type("special")
+
+        def is_special(content, kwargs):
+            return isinstance(content, dict) and content.get("special") is True
+
+        MessageHistory.register_component_detector(special_type, is_special)
+
+        ComponentRegistry.reset_detector_stats()
+        ComponentRegistry.enable_detector_stats()
+        try:
+            MessageComponent({"special": True})
+            MessageComponent({"special": False})
+            MessageComponent("text")
+        finally:
+            ComponentRegistry.enable_detector_stats(False)
+
+        stats = ComponentRegistry.get_detector_stats()[special_type]
+        assert stats["calls"] == 3
+        assert stats["hits"] == 1
+        assert stats["hit_rate"] == 1 / 3
+        assert stats["total_ms"] >= 0
+
+    def test_detector_stats_count_cached_results(self):
+        """Test that reused results of cacheable detectors are counted."""
+        special_type = MessageHistory.register_component_type("special")
+        MessageHistory.register_component_detector(
+            special_type,
+            lambda content, kwargs: isinstance(content, set),
+            cacheable=True,
+        )
+
+        ComponentRegistry.reset_detector_stats()
+        ComponentRegistry.enable_detector_stats()
+        try:
+            for content in ({1}, {2}, "a", "b", "c"):
+                MessageComponent(content)
+        finally:
+            ComponentRegistry.enable_detector_stats(False)
+
+        stats = ComponentRegistry.get_detector_stats()[special_type]
+        assert stats["calls"] == 5
+        assert stats["hits"] == 2
+
+    def test_replacing_detector_table_drops_stale_options(self):
+        """Test that detector options are reset with the detector table."""
+        special_type = MessageHistory.register_component_type("special")
+        MessageHistory.register_component_detector(
+            special_type, lambda content, kwargs: True, cacheable=True, priority=5
+        )
+
+        ComponentRegistry._type_detectors = {}
+        ComponentRegistry.clear_detection_cache()
+
+        assert special_type not in ComponentRegistry._detector_options
@@ -0,0 +1,102 @@
+import threading
+
+import pandas as pd
+import streamlit
+
+from streamlit_rich_message_history import AssistantMessage, MessageHistory
+from streamlit_rich_message_history.backends import (
+    NullBackend,
+    RecordingBackend,
+    StreamlitBackend,
+    get_render_backend,
+    st,
+    use_render_backend,
+)
+from streamlit_rich_message_history.frames import PreviewPolicy
+
+
+def make_message():
+    message = AssistantMessage("🤖")
+    message.add_text("Intro", title="Details", description="More")
+    message.add_dataframe(pd.DataFrame({"a": [1, 2]}))
+    message.add_list(["one", 2])
+    return message
+
+
+def test_streamlit_is_the_default_backend():
+    backend = get_render_backend()
+    assert isinstance(backend, StreamlitBackend)
+    assert backend.is_streamlit
+    assert st.markdown is streamlit.markdown
+
+
+def test_records_element_calls_with_their_containers():
+    with use_render_backend(RecordingBackend()) as backend:
+        make_message().render()
+
+    assert backend.names() == [
+        "chat_message",
+        "expander",
+        "markdown",
+        "markdown",
+        "dataframe",
+        "markdown",
+        "write",
+    ]
+    chat, expander = backend.calls[0], backend.calls[1]
+    assert chat.kwargs == {"name": "assistant", "avatar": "🤖"}
+    assert expander.args == ("Details",) and expander.parent == 0
+    assert [call.parent for call in backend.calls[2:4]] == [1, 1]
+    assert all(call.parent == 0 for call in backend.calls[4:])
+    assert get_render_backend() is not backend
+
+
+def test_records_calls_on_returned_elements():
+    message = AssistantMessage("🤖")
+    with use_render_backend(RecordingBackend()) as backend:
+        message.add_stream(iter(["Hel", "lo"]), update_interval=0)
+
+    empty = backend.find("empty")[0]
+    updates = [call for call in backend.calls if call.name == "markdown"]
+    assert [call.args[0] for call in updates] == ["Hel", "Hello", "Hello"]
+    assert {call.parent for call in updates} == {backend.calls.index(empty)}
+
+
+def test_preview_shows_button_without_session():
+    message = AssistantMessage("🤖")
+    message.add_dataframe(
+        pd.DataFrame({"a": range(50)}), preview=PreviewPolicy(max_rows=10)
+    )
+    with use_render_backend(RecordingBackend()) as backend:
+        message.render()
+
+    assert backend.names() == ["chat_message", "dataframe", "caption", "button"]
+    assert len(backend.calls[1].args[0]) == 10
+
+
+def test_history_renders_with_session_state_of_backend():
+    history = MessageHistory(use_fragments=True)
+    for i in range(5):
+        history.add_user_message_create("😈", f"Message {i}")
+
+    with use_render_backend(RecordingBackend()) as backend:
+        backend.session_state["message_history_window"] = 3
+        history.render_window(page_size=2)
+
+    assert backend.names().count("chat_message") == 3
+    assert backend.calls[0].args == ("Load earlier messages (2 hidden)",)
+
+
+def test_null_backend_discards_calls():
+    with use_render_backend(NullBackend()) as backend:
+        make_message().render()
+    assert backend.calls == []
+
+
+def test_backend_is_local_to_thread():
+    seen = []
+    with use_render_backend(RecordingBackend()):
+        thread = threading.Thread(target=lambda: seen.append(get_render_backend()))
+        thread.start()
+        thread.join()
+    assert isinstance(seen[0], StreamlitBackend)
@@ -0,0 +1,235 @@
+import json
+from unittest.mock import patch
+
+import matplotlib.pyplot as plt
+import pytest
+
+from streamlit_rich_message_history import ComponentType, Message
+from streamlit_rich_message_history.figures import (
+    RasterizedFigure,
+    SerializedPlotlyFigure,
+    lttb_indices,
+    optimize_plotly_figure,
+    rasterize_figure,
+    serialize_plotly_figure,
+)
+
+
+def make_figure():
+    fig, ax = plt.subplots()
+    ax.plot([1, 2, 3], [4, 5, 6])
+    return fig
+
+
+def test_rasterize_png_closes_figure():
+    fig = make_figure()
+    image = rasterize_figure(fig)
+
+    assert image.format == "png"
+    assert image.data.startswith(b"\x89PNG")
+    assert not plt.fignum_exists(fig.number)
+
+
+def test_rasterize_svg():
+    image = rasterize_figure(make_figure(), format="svg")
+
+    assert image.format == "svg"
+    assert "<svg" in image.data
+
+
+def test_rasterize_rejects_unknown_format():
+    with pytest.raises(ValueError):
+        rasterize_figure(make_figure(), format="gif")
+
+
+def test_add_rasterized_matplotlib_figure():
+    message = Message(user="assistant", avatar="🤖")
+    message.add_matplotlib_figure(make_figure(), rasterize="png")
+
+    component = message.components[0]
+    assert component.component_type == ComponentType.MATPLOTLIB_FIGURE
+    assert isinstance(component.content, RasterizedFigure)
+
+    with patch("streamlit_rich_message_history.renderers.st") as mock_st:
+        component._render_content()
+
+    mock_st.pyplot.assert_not_called()
+    mock_st.image.assert_called_once_with(
+        component.content.data, use_container_width=True
+    )
+
+
+def test_rasterized_figure_is_detected():
+    message = Message(user="assistant", avatar="🤖")
+    message.add(rasterize_figure(make_figure()))
+
+    assert message.components[0].component_type == ComponentType.MATPLOTLIB_FIGURE
+
+
+def test_serialize_plotly_figure():
+    import plotly.graph_objects as go
+    import plotly.io
+
+    fig = go.Figure(data=go.Scatter(y=[1, 3, 2]))
+
+    serialized = serialize_plotly_figure(fig)
+    assert serialized.spec == plotly.io.to_json(fig, validate=False)
+    assert serialized.figure is fig
+
+    assert serialize_plotly_figure(fig, keep_figure=False).figure is None
+
+
+def test_add_serialized_plotly_figure():
+    import plotly.graph_objects as go
+
+    message = Message(user="assistant", avatar="🤖")
+    message.add_plotly_figure(
+        go.Figure(data=go.Bar(y=[2, 3, 1])),
+        serialize=True,
+        keep_figure=False,
+        height=300,
+    )
+
+    component = message.components[0]
+    assert component.component_type == ComponentType.PLOTLY_FIGURE
+    assert isinstance(component.content, SerializedPlotlyFigure)
+    assert component.content.figure is None
+
+    with patch("streamlit_rich_message_history.renderers.st") as mock_st:
+        component._render_content()
+
+    # The cached spec is passed as a dict, without keeping a figure around
+    (spec,), kwargs = mock_st.plotly_chart.call_args
+    assert spec == json.loads(component.content.spec)
+    assert kwargs["height"] == 300
+    assert component.content.figure is None
+
+
+def test_serialized_plotly_figure_rendered_by_streamlit():
+    from streamlit.testing.v1 import AppTest
+
+    def app():
+        import numpy as np
+        import plotly.graph_objects as go
+
+        from streamlit_rich_message_history import Message
+
+        message = Message(user="assistant", avatar="🤖")
+        message.add_plotly_figure(
+            go.Figure(data=go.Scatter(y=np.arange(5.0))),
+            serialize=True,
+            keep_figure=False,
+            height=300,
+        )
+        message.render()
+
+    at = AppTest.from_function(app).run()
+
+    assert not at.exception and not at.error
+    (chart,) = at.get("plotly_chart")
+    (trace,) = json.loads(chart.proto.spec)["data"]
+    assert trace["type"] == "scatter"
+    assert trace["y"]["dtype"] == "f8"
+
+
+def test_lttb_keeps_endpoints_and_extremes():
+    import numpy as np
+
+    y = np.zeros(1000)
+    y[500] = 10.0
+    indices = lttb_indices(np.arange(1000), y, 20)
+
+    assert len(indices) == 20
+    assert indices[0] == 0 and indices[-1] == 999
+    assert 500 in indices
+    assert np.all(np.diff(indices) > 0)
+
+
+def test_lttb_returns_all_points_below_target():
+    import numpy as np
+
+    assert list(lttb_indices([0, 1, 2], [1, 2, 3], 10)) == [0, 1, 2]
+    assert np.array_equal(lttb_indices(range(5), range(5), 5), np.arange(5))
+
+
+def test_optimize_plotly_figure():
+    import numpy as np
+    import plotly.graph_objects as go
+
+    n = 10_000
+    fig = go.Figure(
+        data=[
+            go.Scatter(y=np.random.randn(n), text=[str(i) for i in range(n)]),
+            go.Scatter(y=[1, 2, 3]),
+            go.Bar(y=np.arange(n)),
+        ],
+        layout={"title": {"text": "Big"}},
+    )
+
+    optimized = optimize_plotly_figure(fig, webgl_threshold=1_000, max_points=500)
+
+    big, small, bar = optimized.data
+    assert big.type == "scattergl"
+    assert len(big.x) == len(big.y) == len(big.text) == 500
+    assert small.type == "scatter" and len(small.y) == 3
+    assert bar.type == "bar" and len(bar.y) == n
+    assert optimized.layout.title.text == "Big"
+    # The input figure is left untouched
+    assert fig.data[0].type == "scatter" and len(fig.data[0].y) == n
+
+
+def test_optimize_plotly_figure_keeps_implicit_x_positions():
+    import numpy as np
+    import plotly.graph_objects as go
+
+    n = 10_000
+    y = np.random.randn(n)
+    fig = go.Figure(
+        data=[
+            go.Scatter(y=y, x0=10, dx=0.5),
+            go.Scatter(y=y, x0="2024-01-01", dx=60_000),
+        ]
+    )
+
+    numeric, dated = optimize_plotly_figure(fig, max_points=500).data
+
+    # Each kept point is placed where x0 + i * dx put it
+    positions = (np.asarray(numeric.x) - 10) / 0.5
+    assert positions[0] == 0 and positions[-1] == n - 1
+    np.testing.assert_array_equal(numeric.y, y[positions.astype(int)])
+    assert numeric.x0 is None and numeric.dx is None
+    last = np.datetime64("2024-01-01") + np.timedelta64(n - 1, "m")
+    assert np.datetime64(dated.x[-1]) == last
+    assert dated.x0 is None and dated.dx is None
+
+
+def test_optimize_plotly_figure_keeps_scatter_only_traces():
+    import numpy as np
+    import plotly.graph_objects as go
+
+    y = np.random.randn(2_000)
+    fig = go.Figure(
+        data=[
+            go.Scatter(y=y, stackgroup="one", line_shape="spline"),
+            go.Scatter(y=y, line_shape="hv", marker_color="red"),
+        ]
+    )
+
+    stacked, stepped = optimize_plotly_figure(fig, webgl_threshold=1_000).data
+
+    assert stacked.type == "scatter"
+    assert stacked.stackgroup == "one" and stacked.line.shape == "spline"
+    assert stepped.type == "scattergl"
+    assert stepped.line.shape == "hv" and stepped.marker.color == "red"
+
+
+def test_add_plotly_figure_with_decimation():
+    import numpy as np
+    import plotly.graph_objects as go
+
+    message = Message(user="assistant", avatar="🤖")
+    message.add_plotly_figure(
+        go.Figure(data=go.Scatter(y=np.random.randn(5_000))), max_points=100
+    )
+
+    assert len(message.components[0].content.data[0].y) == 100
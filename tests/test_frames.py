@@ -0,0 +1,309 @@
+from unittest.mock import MagicMock, patch
+
+import pandas as pd
+import pytest
+
+from streamlit_rich_message_history import (
+    ComponentType,
+    Message,
+    MessageComponent,
+    MessageHistory,
+)
+from streamlit_rich_message_history.frames import (
+    ArrowFrame,
+    PreviewPolicy,
+    data_shape,
+    get_preview_policy,
+    head_tail,
+    set_preview_policy,
+    to_arrow_frame,
+)
+
+
+@pytest.fixture
+def preview_policy():
+    set_preview_policy(PreviewPolicy(max_rows=10, sample_rows=2))
+    yield
+    set_preview_policy(None)
+
+
+def test_policy_thresholds():
+    policy = PreviewPolicy(max_rows=10, max_bytes=1000, sample_rows=2)
+
+    assert not policy.applies_to(pd.DataFrame({"a": range(10)}))
+    assert policy.applies_to(pd.DataFrame({"a": range(11)}))
+    # Twenty float columns use 1600 bytes at 10 rows
+    wide = pd.DataFrame({str(c): [0.5] * 10 for c in range(20)})
+    assert policy.applies_to(wide)
+    assert policy.applies_to([[i] for i in range(11)])
+    # A preview would show every row, or cannot be taken at all
+    assert not policy.applies_to(wide.head(4))
+    assert not policy.applies_to(pd.DataFrame({"a": range(100)}).style)
+
+
+def test_get_preview_policy_overrides(preview_policy):
+    assert get_preview_policy({}).max_rows == 10
+    assert get_preview_policy({"preview": False}) is None
+    assert get_preview_policy({"preview": True}).max_rows == 1000
+    custom = PreviewPolicy(max_rows=3)
+    assert get_preview_policy({"preview": custom}) is custom
+
+
+def test_head_tail_and_shape():
+    df = pd.DataFrame({"a": range(100), "b": range(100)})
+    sample = head_tail(df, 3)
+
+    assert list(sample.index) == [0, 1, 2, 97, 98, 99]
+    assert data_shape(df) == (100, 2)
+    assert data_shape(df["a"]) == (100, 1)
+    assert head_tail([[1, 2], [3, 4], [5, 6]], 1) == [[1, 2], [5, 6]]
+    assert data_shape([[1, 2], [3, 4], [5, 6]]) == (3, 2)
+    assert list(head_tail(df.head(5), 3).index) == [0, 1, 2, 3, 4]
+
+
+@patch("streamlit_rich_message_history.renderers.st")
+def test_dataframe_preview_until_requested(mock_st, preview_policy):
+    mock_st.session_state = {}
+    df = pd.DataFrame({"a": range(100)})
+    component = MessageComponent(df)
+
+    component.render()
+
+    shown = mock_st.dataframe.call_args[0][0]
+    assert len(shown) == 4
+    assert "100 rows" in mock_st.caption.call_args[0][0]
+
+    # Clicking the button renders the full frame from the next rerun on
+    callback = mock_st.button.call_args.kwargs["on_click"]
+    callback(*mock_st.button.call_args.kwargs["args"])
+    mock_st.reset_mock()
+    component.render()
+
+    assert mock_st.dataframe.call_args[0][0] is df
+    mock_st.button.assert_not_called()
+
+
+@patch("streamlit_rich_message_history.renderers.st")
+def test_preview_choice_is_per_component(mock_st, preview_policy, tmp_path):
+    mock_st.session_state = {}
+    df = pd.DataFrame({"a": range(100)})
+    history = MessageHistory()
+    message = history.add_assistant_message_create("🤖")
+    message.add_dataframe(df).add_dataframe(df)
+    first, second = message.components
+
+    first.render()
+    second.render()
+    keys = [call.kwargs["key"] for call in mock_st.button.call_args_list]
+    assert len(set(keys)) == 2
+
+    # Showing the first in full leaves the second as a preview
+    callback = mock_st.button.call_args_list[0].kwargs["on_click"]
+    callback(*mock_st.button.call_args_list[0].kwargs["args"])
+    mock_st.reset_mock()
+    first.render()
+    second.render()
+    assert mock_st.dataframe.call_args_list[0][0][0] is df
+    assert len(mock_st.dataframe.call_args_list[1][0][0]) == 4
+
+    # The choice survives saving and loading
+    path = str(tmp_path / "chat.srmh")
+    history.save(path)
+    loaded = MessageHistory.load(path).messages[0].components
+    mock_st.reset_mock()
+    loaded[0].render()
+    loaded[1].render()
+    assert len(mock_st.dataframe.call_args_list[0][0][0]) == 100
+    assert len(mock_st.dataframe.call_args_list[1][0][0]) == 4
+
+
+@patch("streamlit_rich_message_history.renderers.st")
+def test_small_and_opted_out_content_rendered_in_full(mock_st, preview_policy):
+    mock_st.session_state = {}
+    small = pd.DataFrame({"a": range(5)})
+    large = pd.DataFrame({"a": range(100)})
+
+    MessageComponent(small).render()
+    MessageComponent(large, preview=False).render()
+
+    assert [call[0][0] for call in mock_st.dataframe.call_args_list] == [small, large]
+    mock_st.button.assert_not_called()
+
+
+@patch("streamlit_rich_message_history.renderers.st")
+def test_series_and_table_previews(mock_st, preview_policy):
+    mock_st.session_state = {}
+    mock_st.table = MagicMock()
+
+    MessageComponent(pd.Series(range(50))).render()
+    MessageComponent([[i, i] for i in range(50)], is_table=True).render()
+
+    assert len(mock_st.dataframe.call_args[0][0]) == 4
+    assert mock_st.table.call_args[0][0] == [[0, 0], [1, 1], [48, 48], [49, 49]]
+    assert mock_st.button.call_count == 2
+
+
+def test_arrow_frame_rebuilt_only_on_change():
+    df = pd.DataFrame({"a": [1, 2, 3]})
+    frame = to_arrow_frame(df)
+    data = frame.data
+
+    assert frame.refresh() is data
+    assert frame.to_pandas() is df
+
+    df["b"] = ["x", "y", "z"]
+    assert frame.is_stale
+    assert frame.refresh() is not data
+
+    # Values changed in place are detected in small frames
+    data = frame.data
+    df.loc[0, "a"] = 10
+    assert frame.refresh() is not data
+    assert frame.table().column("a").to_pylist() == [10, 2, 3]
+
+
+def test_values_hashed_only_in_small_frames(monkeypatch):
+    from streamlit_rich_message_history import frames
+
+    df = pd.DataFrame({"a": [1, 2, 3]})
+    changed = pd.DataFrame({"a": [10, 2, 3]}, index=df.index)
+    assert frames._frame_fingerprint(df) != frames._frame_fingerprint(changed)
+
+    monkeypatch.setattr(frames, "VALUE_HASH_MAX_CELLS", 2)
+    assert frames._frame_fingerprint(df) == frames._frame_fingerprint(changed)
+    frame = to_arrow_frame(df)
+    data = frame.data
+    frame.invalidate()
+    assert frame.refresh() is not data
+
+
+def test_arrow_frame_without_frame():
+    df = pd.DataFrame({"a": [1, 2, 3]}, index=[5, 6, 7])
+    frame = to_arrow_frame(df, keep_frame=False)
+
+    assert frame.frame is None
+    assert not frame.is_stale
+    pd.testing.assert_frame_equal(frame.to_pandas(), df)
+
+
+def test_add_dataframe_with_cached_arrow():
+    message = Message(user="assistant", avatar="🤖")
+    message.add_dataframe(pd.DataFrame({"a": [1]}), cache_arrow=True)
+    message.add_series(pd.Series([1, 2]), cache_arrow=True, keep_frame=False)
+
+    assert isinstance(message.components[0].content, ArrowFrame)
+    assert message.components[0].component_type == ComponentType.DATAFRAME
+    assert message.components[1].component_type == ComponentType.SERIES
+    assert MessageComponent(message.components[1].content).component_type == (
+        ComponentType.DATAFRAME
+    )
+
+
+@patch("streamlit_rich_message_history.renderers.st")
+def test_arrow_frame_rendered_from_cached_table(mock_st):
+    component = MessageComponent(
+        to_arrow_frame(pd.DataFrame({"a": range(10)}), keep_frame=False)
+    )
+
+    component.render()
+    component.render()
+
+    # The bytes are only read once, and the same Table is rendered every time
+    first, second = (call.args[0] for call in mock_st.dataframe.call_args_list)
+    assert first is second is component.content.table()
+    assert first.column("a").to_pylist() == list(range(10))
+
+
+def test_arrow_frame_rendered_by_streamlit():
+    from streamlit.testing.v1 import AppTest
+
+    def app():
+        import pandas as pd
+
+        from streamlit_rich_message_history import Message
+
+        message = Message(user="assistant", avatar="🤖")
+        message.add_dataframe(
+            pd.DataFrame({"a": range(10), "b": list("abcdefghij")}),
+            cache_arrow=True,
+            keep_frame=False,
+            height=200,
+        )
+        message.render()
+
+    at = AppTest.from_function(app).run()
+
+    assert not at.exception and not at.error
+    (frame,) = at.dataframe
+    pd.testing.assert_frame_equal(
+        frame.value, pd.DataFrame({"a": range(10), "b": list("abcdefghij")})
+    )
+
+
+@patch("streamlit_rich_message_history.renderers.st")
+def test_preview_of_arrow_frame_without_frame(mock_st, preview_policy):
+    mock_st.session_state = {}
+    df = pd.DataFrame({"a": range(100)}, index=range(200, 300))
+    message = Message(user="assistant", avatar="🤖")
+    message.add_dataframe(df, cache_arrow=True, keep_frame=False)
+    message.add_series(df["a"], cache_arrow=True, keep_frame=False)
+
+    for component in message.components:
+        component.render()
+
+    frame_sample, series_sample = (
+        call.args[0] for call in mock_st.dataframe.call_args_list
+    )
+    assert list(frame_sample.index) == [200, 201, 298, 299]
+    assert list(frame_sample["a"]) == [0, 1, 98, 99]
+    assert list(series_sample["a"]) == [0, 1, 98, 99]
+    assert mock_st.button.call_count == 2
+
+
+def test_show_full_data_survives_rebuilt_history():
+    from streamlit.testing.v1 import AppTest
+
+    def app():
+        import pandas as pd
+
+        from streamlit_rich_message_history import AssistantMessage, MessageHistory
+        from streamlit_rich_message_history.frames import PreviewPolicy
+
+        # The history is rebuilt on every rerun, as in the README
+        history = MessageHistory()
+        message = AssistantMessage("🤖")
+        message.add_text("Here is the data:")
+        message.add_dataframe(
+            pd.DataFrame({"a": range(100)}),
+            preview=PreviewPolicy(max_rows=10, sample_rows=2),
+        )
+        history.add_assistant_message(message)
+        history.render_all()
+
+    at = AppTest.from_function(app).run()
+    assert len(at.dataframe[0].value) == 4
+
+    at.button[0].click().run()
+    assert not at.exception
+    assert len(at.dataframe[0].value) == 100
+    assert at.session_state["srmh_show_full"] == {"message_history/0/1"}
+
+    at.run()
+    assert len(at.dataframe[0].value) == 100
+    assert not at.button
+
+
+def test_user_supplied_component_key():
+    message = Message(user="assistant", avatar="🤖")
+    message.add_dataframe(pd.DataFrame({"a": [1]}), key="results")
+    message.add_list([pd.DataFrame({"a": [1]})])
+    history = MessageHistory()
+    history.add_message(message)
+
+    with patch("streamlit_rich_message_history.renderers.st"):
+        history.render_last(key="chat")
+
+    assert message.components[0].key == "results"
+    assert "key" not in message.components[0].kwargs
+    assert message.components[1].key == "chat/0/1"
+    assert message.components[1].children[0][1].key == "chat/0/1/0"
@@ -1,3 +1,7 @@
+import copy
+import pickle
+from unittest.mock import patch
+
 from streamlit_rich_message_history import Message, MessageHistory
 
 
@@ -10,6 +14,20 @@ def test_history_add_message():
     assert history.messages[0] is message
 
 
+def test_history_can_be_pickled_and_copied():
+    history = MessageHistory()
+    history.add_user_message_create("😈", "Hello")
+    message = history.add_assistant_message_create("☃️")
+    message.add_text("Hi there")
+    message.add_metric(42, "Answer")
+
+    for restored in (pickle.loads(pickle.dumps(history)), copy.deepcopy(history)):
+        components = restored.messages[1].components
+        assert [c.content for c in components] == ["Hi there", 42]
+        assert components[0].kwargs == {}
+        assert components[1].title == "Answer"
+
+
 def test_history_render_last():
     history = MessageHistory()
     message1 = Message(user="user", avatar="😈")
@@ -22,3 +40,91 @@ def test_history_render_last():
     # Just testing the basic functionality without rendering
     assert len(history.messages) == 2
     assert history.messages[-1] is message2
+
+
+@patch.object(Message, "render")
+@patch("streamlit_rich_message_history.history.st")
+def test_history_render_window(mock_st, mock_render):
+    mock_st.session_state = {}
+    history = MessageHistory()
+    for i in range(5):
+        history.add_user_message_create("😈", f"Message {i}")
+
+    history.render_window(page_size=2)
+
+    assert mock_render.call_count == 2
+    mock_st.button.assert_called_once()
+    assert "3 hidden" in mock_st.button.call_args[0][0]
+
+    # Clicking the button grows the window for the next rerun
+    callback = mock_st.button.call_args.kwargs["on_click"]
+    callback(*mock_st.button.call_args.kwargs["args"])
+    assert mock_st.session_state["message_history_window"] == 4
+
+    mock_render.reset_mock()
+    mock_st.button.reset_mock()
+    history.render_window(page_size=2)
+    assert mock_render.call_count == 4
+
+    mock_render.reset_mock()
+    mock_st.button.reset_mock()
+    mock_st.session_state["message_history_window"] = 6
+    history.render_window(page_size=2)
+    assert mock_render.call_count == 5
+    mock_st.button.assert_not_called()
+
+
+@patch("streamlit_rich_message_history.history.st")
+def test_history_render_all_with_budget(mock_st):
+    mock_st.session_state = {}
+    history = MessageHistory()
+    messages = [Message(user="user", avatar="😈") for _ in range(4)]
+    for message in messages:
+        history.add_message(message)
+
+    rendered = []
+    with (
+        patch.object(Message, "render", autospec=True, side_effect=rendered.append),
+        patch("streamlit_rich_message_history.history.time.perf_counter") as clock,
+    ):
+        # Each message takes 10ms, the budget fits two of them
+        clock.side_effect = [0.0, 0.010, 0.020]
+        history.render_all(budget_ms=20, newest_first=True)
+
+    assert rendered == [messages[3], messages[2]]
+    # One container per rendered message and one for the skipped ones
+    assert mock_st.container.call_count == 3
+    mock_st.button.assert_called_once()
+    assert "Render 2 remaining" in mock_st.button.call_args[0][0]
+
+    rendered.clear()
+    mock_st.button.reset_mock()
+    with (
+        patch.object(Message, "render", autospec=True, side_effect=rendered.append),
+        patch("streamlit_rich_message_history.history.time.perf_counter") as clock,
+    ):
+        clock.side_effect = [0.0, 0.030]
+        history.render_all(budget_ms=20, newest_first=False)
+
+    assert rendered == [messages[0]]
+    assert "Render 3 remaining" in mock_st.button.call_args[0][0]
+
+    # After clicking, the budget no longer applies in this session
+    callback = mock_st.button.call_args.kwargs["on_click"]
+    callback(*mock_st.button.call_args.kwargs["args"])
+    rendered.clear()
+    with patch.object(Message, "render", autospec=True, side_effect=rendered.append):
+        history.render_all(budget_ms=20)
+    assert rendered == messages
+
+
+@patch("streamlit_rich_message_history.history._render_message_fragment")
+def test_history_render_with_fragments(mock_fragment):
+    history = MessageHistory(use_fragments=True)
+    message = history.add_user_message_create("😈", "Hello")
+
+    with patch.object(Message, "render") as mock_render:
+        history.render_last()
+
+    mock_fragment.assert_called_once_with(message)
+    mock_render.assert_not_called()
@@ -0,0 +1,34 @@
+import json
+import subprocess
+import sys
+
+HEAVY_MODULES = ["pandas", "numpy", "matplotlib", "matplotlib.pyplot", "plotly"]
+
+PROBE = """
+import json, sys
+import streamlit
+before = set(sys.modules)
+import streamlit_rich_message_history
+print(json.dumps(sorted(set(sys.modules) - before)))
+"""
+
+
+def test_package_import_does_not_load_heavy_libraries():
+    # Run in a fresh interpreter, the test session has already imported them
+    result = subprocess.run(
+        [sys.executable, "-c", PROBE], capture_output=True, text=True, check=True
+    )
+    newly_loaded = set(json.loads(result.stdout))
+
+    assert newly_loaded.isdisjoint(HEAVY_MODULES)
+
+
+def test_detection_without_heavy_libraries_loaded():
+    probe = """
+import sys
+from streamlit_rich_message_history import ComponentType, MessageComponent
+assert MessageComponent("hello").component_type == ComponentType.TEXT
+assert MessageComponent(3.5).component_type == ComponentType.NUMBER
+assert "matplotlib.pyplot" not in sys.modules
+"""
+    subprocess.run([sys.executable, "-c", probe], check=True)
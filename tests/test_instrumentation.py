@@ -0,0 +1,159 @@
+import threading
+
+import pandas as pd
+import pytest
+
+from streamlit_rich_message_history import (
+    AssistantMessage,
+    ComponentType,
+    MessageComponent,
+    MessageHistory,
+)
+from streamlit_rich_message_history.backends import RecordingBackend, use_render_backend
+from streamlit_rich_message_history.enums import ComponentRegistry
+from streamlit_rich_message_history.instrumentation import (
+    add_render_listener,
+    is_instrumented,
+    listen_to_renders,
+    remove_render_listener,
+)
+
+
+def make_message():
+    message = AssistantMessage("🤖")
+    message.add_text("Hello")
+    message.add_dataframe(pd.DataFrame({"a": range(100)}))
+    return message
+
+
+def test_records_components_and_messages():
+    message = make_message()
+    records = []
+    with use_render_backend(RecordingBackend()), listen_to_renders(records.append):
+        message.render()
+
+    text, frame, whole = records
+    assert [r.kind for r in records] == ["component", "component", "message"]
+    assert text.component_type == ComponentType.TEXT
+    assert text.renderer == "streamlit_rich_message_history.renderers.render_text"
+    assert frame.component_type == ComponentType.DATAFRAME
+    assert frame.payload_bytes >= 800
+    assert frame.component is message.components[1]
+    assert all(r.message is message for r in records)
+    assert whole.component is None and whole.component_type is None
+    assert whole.payload_bytes == text.payload_bytes + frame.payload_bytes
+    assert whole.elapsed_ms >= text.elapsed_ms + frame.elapsed_ms
+    assert not any(r.failed for r in records)
+
+
+def test_records_caught_errors_and_custom_renderers():
+    slow_type = ComponentRegistry.register_component_type("instrumented_failing")
+
+    def failing_renderer(content, kwargs):
+        raise RuntimeError("boom")
+
+    ComponentRegistry.register_renderer(slow_type, failing_renderer)
+    component = MessageComponent("content", component_type=slow_type)
+    records = []
+    with use_render_backend(RecordingBackend()), listen_to_renders(records.append):
+        component.render()
+
+    (record,) = records
+    assert record.failed
+    assert record.renderer.endswith("failing_renderer")
+    assert record.message is None
+
+
+def test_global_listener_and_removal():
+    records = []
+    add_render_listener(records.append)
+    try:
+        assert is_instrumented()
+        with use_render_backend(RecordingBackend()):
+            MessageComponent("Hello").render()
+    finally:
+        remove_render_listener(records.append)
+    assert not is_instrumented()
+    assert len(records) == 1
+    with pytest.raises(ValueError):
+        remove_render_listener(records.append)
+
+
+def test_context_listener_only_sees_its_thread():
+    records = []
+
+    def render_elsewhere():
+        with use_render_backend(RecordingBackend()):
+            MessageComponent("Elsewhere").render()
+
+    with use_render_backend(RecordingBackend()), listen_to_renders(records.append):
+        thread = threading.Thread(target=render_elsewhere)
+        thread.start()
+        thread.join()
+        MessageComponent("Here").render()
+
+    assert [r.component.content for r in records] == ["Here"]
+
+
+def test_failing_listener_does_not_break_rendering():
+    def broken(record):
+        raise KeyError("oops")
+
+    backend = RecordingBackend()
+    with use_render_backend(backend), listen_to_renders(broken):
+        with pytest.warns(RuntimeWarning, match="oops"):
+            MessageComponent("Hello").render()
+    assert backend.names() == ["markdown"]
+
+
+def test_history_profile_ranks_messages_and_components():
+    history = MessageHistory(profile=True)
+    history.add_user_message_create("👤", "Hi")
+    history.add_message(make_message())
+    custom_type = ComponentRegistry.register_component_type("profiled_custom")
+
+    def custom_renderer(content, kwargs):
+        pass
+
+    ComponentRegistry.register_renderer(custom_type, custom_renderer)
+    history.messages[-1].add_custom("x", "profiled_custom")
+
+    with use_render_backend(RecordingBackend()):
+        history.render_all()
+
+    profile = history.last_profile
+    assert profile.message_count == 2 and profile.component_count == 4
+    assert profile.failed_count == 0
+    assert {row["message"] for row in profile.slowest_messages()} == {0, 1}
+    assert len(profile.slowest_components(2)) == 2
+    times = [row["ms"] for row in profile.slowest_components()]
+    assert times == sorted(times, reverse=True)
+    by_type = {row["type"]: row for row in profile.by_type()}
+    assert by_type["text"]["count"] == 2
+    assert by_type["profiled_custom"]["count"] == 1
+    renderers = {row["renderer"]: row["custom"] for row in profile.by_renderer()}
+    assert renderers["streamlit_rich_message_history.renderers.render_text"] is False
+    assert any(
+        custom for name, custom in renderers.items() if "custom_renderer" in name
+    )
+
+
+def test_render_profile_panel_enables_profiling():
+    history = MessageHistory()
+    history.add_message(make_message())
+    backend = RecordingBackend()
+    with use_render_backend(backend):
+        history.render_profile()
+        assert history.profile and history.last_profile is None
+        assert backend.names() == ["sidebar.expander", "caption"]
+
+        history.render_all()
+        backend.clear()
+        history.render_profile(location="expander", top=1)
+    assert backend.names()[:2] == ["expander", "caption"]
+    slowest, *_ = backend.find("dataframe")
+    assert len(slowest.args[0]) == 1
+    assert len(backend.find("dataframe")) == 4
+
+    with pytest.raises(ValueError):
+        history.render_profile(location="main")
@@ -0,0 +1,141 @@
+from unittest.mock import patch
+
+import pandas as pd
+import pytest
+
+from streamlit_rich_message_history import (
+    AssistantMessage,
+    ComponentType,
+    LazyContent,
+    MessageComponent,
+    MessageHistory,
+)
+from streamlit_rich_message_history.lazy import lazy
+from streamlit_rich_message_history.serialization import load_messages, save_messages
+
+
+class CountingFactory:
+    def __init__(self, value):
+        self.value = value
+        self.calls = 0
+
+    def __call__(self):
+        self.calls += 1
+        return self.value
+
+
+def test_lazy_content_needs_a_callable():
+    with pytest.raises(TypeError):
+        LazyContent("not callable")
+
+
+def test_declared_type_is_used_without_evaluating():
+    factory = CountingFactory(pd.DataFrame({"a": [1]}))
+    component = MessageComponent(LazyContent(factory, ComponentType.DATAFRAME))
+
+    assert component.component_type == ComponentType.DATAFRAME
+    assert factory.calls == 0
+
+
+@patch("streamlit_rich_message_history.renderers.st")
+@patch("streamlit_rich_message_history.components.st")
+def test_evaluated_on_first_render_and_memoized(mock_components_st, mock_st):
+    factory = CountingFactory("Expensive text")
+    component = MessageComponent(LazyContent(factory))
+    assert component.component_type == ComponentType.LAZY
+    assert factory.calls == 0
+
+    component.render()
+    component.render()
+
+    assert factory.calls == 1
+    assert component.component_type == ComponentType.TEXT
+    assert component.content == "Expensive text"
+    assert mock_st.markdown.call_count == 2
+
+
+@patch("streamlit_rich_message_history.renderers.st")
+@patch("streamlit_rich_message_history.components.st")
+def test_evict_recomputes_on_next_render(mock_components_st, mock_st):
+    factory = CountingFactory([1, 2, 3])
+    component = MessageComponent(LazyContent(factory))
+    assert not component.evict()
+
+    component.render()
+    assert component.component_type == ComponentType.LIST
+    assert component.evict()
+    assert isinstance(component.content, LazyContent)
+    assert not component.evict()
+
+    component.render()
+    assert factory.calls == 2
+
+
+@patch("streamlit_rich_message_history.renderers.st")
+@patch("streamlit_rich_message_history.components.st")
+def test_failing_factory_is_retried(mock_components_st, mock_st):
+    calls = []
+
+    def factory():
+        calls.append(1)
+        if len(calls) == 1:
+            raise RuntimeError("database unavailable")
+        return "Recovered"
+
+    component = MessageComponent(LazyContent(factory))
+    component.render()
+    mock_components_st.error.assert_called_once()
+
+    component.render()
+    assert component.content == "Recovered"
+
+
+def test_memory_usage_counts_evaluated_content():
+    content = LazyContent(lambda: list(range(10000)))
+    component = MessageComponent(content)
+    pending = component.memory_usage()
+
+    content.read()
+    assert component.memory_usage(refresh=True) > pending + 80000
+
+
+def test_add_lazy_and_decorator():
+    @lazy(ComponentType.TEXT)
+    def summary():
+        return "Summary"
+
+    message = AssistantMessage("🤖")
+    message.add_lazy(lambda: 42, title="Answer").add(summary)
+
+    assert message.components[0].component_type == ComponentType.LAZY
+    assert message.components[0].title == "Answer"
+    assert message.components[1].component_type == ComponentType.TEXT
+    assert message.components[1].content is summary
+
+
+def test_saving_evaluates_and_resolves_type(tmp_path):
+    message = AssistantMessage("🤖")
+    message.add_lazy(lambda: pd.DataFrame({"a": [1, 2]}))
+    path = str(tmp_path / "chat.srmh")
+    save_messages([message], path)
+
+    (loaded,) = load_messages(path)
+    assert loaded.components[0].component_type == ComponentType.DATAFRAME
+
+
+@patch("streamlit_rich_message_history.renderers.st")
+@patch("streamlit_rich_message_history.components.st")
+@patch("streamlit_rich_message_history.messages.st")
+@patch("streamlit_rich_message_history.history.st")
+def test_history_evicts_older_messages(mock_st, *mocks):
+    history = MessageHistory()
+    factories = []
+    for i in range(3):
+        factory = CountingFactory(f"Result {i}")
+        factories.append(factory)
+        history.add_assistant_message_create("🤖").add_lazy(factory)
+    history.render_all()
+
+    assert history.evict_lazy_content(keep_last=1) == 2
+    history.render_all()
+    assert [factory.calls for factory in factories] == [2, 2, 1]
@@ -0,0 +1,70 @@
+from unittest.mock import patch
+
+import matplotlib.pyplot as plt
+import numpy as np
+import pandas as pd
+import plotly.graph_objects as go
+
+from streamlit_rich_message_history import MessageComponent, MessageHistory
+from streamlit_rich_message_history.figures import rasterize_figure
+from streamlit_rich_message_history.memory import estimate_size
+
+
+def test_estimate_size_of_frames():
+    df = pd.DataFrame({"a": ["some text"] * 100})
+
+    assert estimate_size(df) == df.memory_usage(deep=True).sum()
+    assert estimate_size(df, deep=False) == df.memory_usage(deep=False).sum()
+    assert estimate_size(df["a"]) == df["a"].memory_usage(deep=True)
+
+
+def test_estimate_size_of_figures():
+    fig, ax = plt.subplots()
+    ax.plot(np.arange(10_000), np.zeros(10_000))
+    plotly_fig = go.Figure(go.Scatter(y=np.zeros(10_000)))
+
+    # Both figures hold at least their point data
+    assert estimate_size(fig) > 2 * 8 * 10_000
+    assert estimate_size(plotly_fig) > 8 * 10_000
+
+    image = rasterize_figure(fig)
+    assert estimate_size(image) >= len(image.data)
+
+
+def test_estimate_size_follows_collections():
+    items = ["x" * 1000, "y" * 1000]
+
+    assert estimate_size(items) > 2000
+    assert estimate_size(items, deep=False) < 1000
+    # Shared objects are only counted once
+    assert estimate_size([items[0], items[0]]) < 2000
+
+
+def test_component_memory_usage_is_cached():
+    component = MessageComponent(pd.DataFrame({"a": range(100)}))
+
+    with patch(
+        "streamlit_rich_message_history.components.estimate_size", return_value=10
+    ) as estimate:
+        assert component.memory_usage() == 10
+        assert component.memory_usage() == 10
+        assert estimate.call_count == 1
+        component.memory_usage(deep=False)
+        component.memory_usage(refresh=True)
+        assert estimate.call_count == 3
+
+
+def test_history_memory_usage_breakdown():
+    history = MessageHistory()
+    history.add_user_message_create("😈", "Show me the data")
+    message = history.add_assistant_message_create("🤖")
+    df = pd.DataFrame({"a": range(1000)})
+    message.add_text("Here it is").add_dataframe(df)
+
+    usage = history.memory_usage()
+
+    assert set(usage["by_type"]) == {"text", "dataframe"}
+    assert usage["by_type"]["dataframe"] == df.memory_usage(deep=True).sum()
+    assert usage["total"] == sum(m["total"] for m in usage["messages"])
+    assert [m["user"] for m in usage["messages"]] == ["user", "assistant"]
+    assert set(usage["messages"][0]["by_type"]) == {"text"}
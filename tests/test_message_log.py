@@ -0,0 +1,239 @@
+import os
+from unittest.mock import patch
+
+import pandas as pd
+import pytest
+
+from streamlit_rich_message_history import MessageHistory, UserMessage
+from streamlit_rich_message_history.message_log import (
+    _RECORD_HEADER,
+    LoggedPayload,
+    MessageLog,
+)
+from streamlit_rich_message_history.messages import Message
+
+
+def make_message(text, rows=3):
+    message = UserMessage("😈", text)
+    message.add_dataframe(pd.DataFrame({"a": range(rows)}))
+    return message
+
+
+def test_append_and_reopen_lazily(tmp_path):
+    path = str(tmp_path / "chat.log")
+    log = MessageLog(path)
+    for i in range(3):
+        log.append(make_message(f"Message {i}"))
+    log.close()
+
+    log = MessageLog(path)
+    assert len(log) == 3
+    assert log.materialized == []
+
+    message = log[1]
+    assert [position for position, _ in log.materialized] == [1]
+    assert message.components[0].content == "Message 1"
+    payload = message.components[1].content
+    assert isinstance(payload, LoggedPayload)
+    pd.testing.assert_frame_equal(payload.read(), pd.DataFrame({"a": range(3)}))
+
+
+def test_sync_logs_added_components(tmp_path):
+    path = str(tmp_path / "chat.log")
+    log = MessageLog(path)
+    message = make_message("Hello")
+    log.append(message)
+    message.add_text("Streamed")
+
+    assert log.sync() == 1
+    assert log.sync() == 0
+    assert log.garbage_bytes > 0
+    log.close()
+
+    reopened = MessageLog(path)
+    assert len(reopened) == 1
+    assert reopened[0].components[-1].content == "Streamed"
+
+
+def test_torn_record_is_discarded(tmp_path):
+    path = str(tmp_path / "chat.log")
+    log = MessageLog(path)
+    log.append(make_message("Kept"))
+    log.append(make_message("Torn"))
+    log.close()
+    size = os.path.getsize(path)
+    with open(path, "r+b") as f:
+        f.truncate(size - 5)
+
+    log = MessageLog(path)
+    assert len(log) == 1
+    assert log[0].components[0].content == "Kept"
+    # Opening only ignores the torn record, the next record overwrites it
+    assert os.path.getsize(path) == size - 5
+    log.append(make_message("After"))
+    log.close()
+    reopened = MessageLog(path)
+    assert len(reopened) == 2
+    assert reopened[1].components[0].content == "After"
+
+
+def test_invalid_record_before_end_raises(tmp_path):
+    path = str(tmp_path / "chat.log")
+    log = MessageLog(path)
+    for i in range(3):
+        log.append(make_message(f"Message {i}"))
+    second = log._offsets[1] - _RECORD_HEADER.size
+    log.close()
+    with open(path, "r+b") as f:
+        f.seek(second)
+        f.write(b"X")
+    with open(path, "rb") as f:
+        data = f.read()
+
+    with pytest.raises(ValueError, match="Invalid record"):
+        MessageLog(path)
+    with open(path, "rb") as f:
+        assert f.read() == data
+
+
+def test_instances_on_one_file_append_in_turn(tmp_path):
+    path = str(tmp_path / "chat.log")
+    first, second = MessageLog(path), MessageLog(path)
+    first.append(make_message("A"))
+    second.append(make_message("B"))
+    first.append(make_message("C"))
+    assert len(first) == 3 and len(second) == 2
+
+    contents = [m.components[0].content for m in MessageLog(path)]
+    assert contents == ["A", "B", "C"]
+    assert first[1].components[0].content == "B"
+
+
+def test_update_by_other_instance_supersedes_cached_message(tmp_path):
+    path = str(tmp_path / "chat.log")
+    first = MessageLog(path)
+    first.append(make_message("Hello"))
+    stale = first[0]
+    second = MessageLog(path)
+    second[0].add_text("Streamed")
+    second.sync()
+
+    first.append(make_message("Next"))
+
+    # The stale message keeps its payload, and the log serves the new record
+    pd.testing.assert_frame_equal(
+        stale.components[1].content, pd.DataFrame({"a": range(3)})
+    )
+    assert first[0].components[-1].content == "Streamed"
+
+
+def test_write_after_rewrite_by_other_instance_raises(tmp_path):
+    path = str(tmp_path / "chat.log")
+    first = MessageLog(path)
+    first.append(make_message("Hello"))
+    MessageLog(path).clear()
+
+    with pytest.raises(RuntimeError, match="open it again"):
+        first.append(make_message("Lost"))
+
+
+def test_numpy_scalars_logged(tmp_path):
+    import numpy as np
+
+    path = str(tmp_path / "chat.log")
+    log = MessageLog(path)
+    message = Message("assistant", "🤖")
+    message.add_metric(np.float64(1.5), "Score").add_list([np.int64(1), 2])
+    log.append(message)
+    log.close()
+
+    contents = [c.content for c in MessageLog(path)[0].components]
+    assert contents == [1.5, [1, 2]]
+
+
+def test_not_a_log(tmp_path):
+    path = tmp_path / "other.log"
+    path.write_bytes(b"something else")
+    with pytest.raises(ValueError):
+        MessageLog(str(path))
+
+
+def test_compaction_drops_superseded_records(tmp_path):
+    path = str(tmp_path / "chat.log")
+    log = MessageLog(path, compact_threshold=1)
+    log.append(make_message("First", rows=100))
+    log.append(make_message("Second"))
+    for i in range(3):
+        log[1] = make_message(f"Second {i}")
+
+    assert log.garbage_bytes == 0
+    log.close()
+    log = MessageLog(path)
+    assert log.garbage_bytes == 0
+    assert log[1].components[0].content == "Second 2"
+
+
+def test_compaction_keeps_payloads_readable(tmp_path):
+    path = str(tmp_path / "chat.log")
+    log = MessageLog(path)
+    log.append(make_message("First", rows=10))
+    log.append(make_message("Second"))
+    log.close()
+
+    log = MessageLog(path)
+    first = log[0]
+    log[1] = make_message("Replaced")
+    log.compact()
+    assert log.garbage_bytes == 0
+    pd.testing.assert_frame_equal(
+        first.components[1].content.read(), pd.DataFrame({"a": range(10)})
+    )
+
+
+def test_delete_and_insert(tmp_path):
+    path = str(tmp_path / "chat.log")
+    log = MessageLog(path)
+    for i in range(3):
+        log.append(make_message(f"Message {i}"))
+    removed = log[0]
+    del log[0]
+    log.insert(1, make_message("Inserted"))
+
+    assert [m.components[0].content for m in log] == [
+        "Message 1",
+        "Inserted",
+        "Message 2",
+    ]
+    # Removed messages no longer refer to the log
+    assert isinstance(removed.components[1].content, pd.DataFrame)
+
+
+def test_clear_truncates(tmp_path):
+    path = str(tmp_path / "chat.log")
+    log = MessageLog(path)
+    log.append(make_message("Hello", rows=1000))
+    log.clear()
+
+    assert len(log) == 0
+    assert os.path.getsize(path) == 8
+
+
+@patch.object(Message, "render")
+@patch("streamlit_rich_message_history.history.st")
+def test_history_with_log(mock_st, mock_render, tmp_path):
+    path = str(tmp_path / "chat.log")
+    history = MessageHistory(log_path=path)
+    history.add_user_message_create("😈", "Question")
+    answer = history.add_assistant_message_create("🤖")
+    answer.add_text("Answer")
+    answer.add_dataframe(pd.DataFrame({"a": [1, 2]}))
+    history.render_all()
+    history.messages.close()
+
+    reopened = MessageHistory(log_path=path)
+    assert len(reopened.messages) == 2
+    assert len(reopened.messages[1].components) == 2
+    assert [entry["index"] for entry in reopened.memory_usage()["messages"]] == [1]
+
+    reopened.clear()
+    assert len(reopened.messages) == 0
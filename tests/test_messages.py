@@ -1,4 +1,10 @@
+import asyncio
+from unittest.mock import patch
+
+import pytest
+
 from streamlit_rich_message_history import ComponentType, Message
+from streamlit_rich_message_history.backends import RecordingBackend, use_render_backend
 
 
 def test_message_chaining():
@@ -18,3 +24,90 @@ def test_message_add_methods():
     assert message.components[0].component_type == ComponentType.TEXT
     assert message.components[1].component_type == ComponentType.ERROR
     assert message.components[2].component_type == ComponentType.METRIC
+
+
+def test_register_component_method_on_slotted_message():
+    from streamlit_rich_message_history.enums import ComponentRegistry
+
+    badge_type = ComponentRegistry.register_component_type("slotted_badge")
+    Message.register_component_method("add_slotted_badge", badge_type)
+    try:
+        message = Message(user="assistant", avatar="☃️")
+        message.add_slotted_badge({"label": "New"})
+        assert message.components[0].component_type == badge_type
+    finally:
+        delattr(Message, "add_slotted_badge")
+        del Message._custom_component_methods["add_slotted_badge"]
+        del ComponentRegistry._custom_types["slotted_badge"]
+
+
+@patch("streamlit_rich_message_history.messages.st")
+def test_add_stream_from_generator(mock_st):
+    placeholder = mock_st.empty.return_value
+    message = Message(user="assistant", avatar="☃️")
+
+    message.add_stream(iter(["Hel", "lo", " ", 42]), update_interval=0)
+
+    assert [c.args[0] for c in placeholder.markdown.call_args_list] == [
+        "Hel",
+        "Hello",
+        "Hello ",
+        "Hello 42",
+        "Hello 42",
+    ]
+    assert message.components[0].component_type == ComponentType.TEXT
+    assert message.components[0].content == "Hello 42"
+
+
+@patch("streamlit_rich_message_history.messages.st")
+def test_add_stream_coalesces_updates(mock_st):
+    placeholder = mock_st.empty.return_value
+    message = Message(user="assistant", avatar="☃️")
+
+    message.add_stream(iter(["a"] * 100), update_interval=3600)
+
+    # Only the final update is drawn
+    placeholder.markdown.assert_called_once_with("a" * 100)
+    assert message.components[0].content == "a" * 100
+
+
+@patch("streamlit_rich_message_history.messages.st")
+def test_add_stream_from_async_generator(mock_st):
+    async def tokens():
+        for token in ["async ", "tokens"]:
+            yield token
+
+    message = Message(user="assistant", avatar="☃️")
+    message.add_stream(tokens(), title="Answer")
+
+    assert message.components[0].content == "async tokens"
+    assert message.components[0].title == "Answer"
+
+
+def test_add_stream_rejects_async_iterator_in_running_loop():
+    async def tokens():
+        yield "never"
+
+    async def main():
+        stream = tokens()
+        with pytest.raises(RuntimeError, match="synchronous iterator"):
+            message.add_stream(stream)
+        await stream.aclose()
+
+    message = Message(user="assistant", avatar="☃️")
+    asyncio.run(main())
+    assert message.components == []
+
+
+def test_add_stream_placeholder_shows_title_and_description():
+    message = Message(user="assistant", avatar="☃️")
+    with use_render_backend(RecordingBackend()) as backend:
+        message.add_stream(
+            iter(["a", "b"]), update_interval=3600, title="Answer", description="Notes"
+        )
+        streamed = backend.names()
+        backend.clear()
+        message.components[0].render()
+
+    assert streamed == ["empty", "container", "expander", "markdown", "markdown"]
+    assert backend.names() == ["expander", "markdown", "markdown"]
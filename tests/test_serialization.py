@@ -0,0 +1,155 @@
+import json
+import zipfile
+from unittest.mock import patch
+
+import matplotlib.pyplot as plt
+import pandas as pd
+import plotly.graph_objects as go
+import pytest
+
+from streamlit_rich_message_history import (
+    AssistantMessage,
+    ComponentType,
+    MessageHistory,
+    UserMessage,
+)
+from streamlit_rich_message_history.figures import (
+    RasterizedFigure,
+    SerializedPlotlyFigure,
+)
+from streamlit_rich_message_history.frames import PreviewPolicy
+from streamlit_rich_message_history.serialization import FORMAT_VERSION, ArchivedPayload
+
+
+def make_history():
+    history = MessageHistory()
+    history.add_user_message_create("😈", "Show me everything")
+    message = history.add_assistant_message_create("🤖")
+    fig, ax = plt.subplots()
+    ax.plot([1, 2, 3])
+    message.add_text("Here you go", title="Intro", description="Summary")
+    message.add_code("print(1)", language="python")
+    message.add_dataframe(pd.DataFrame({"a": [1, 2]}), preview=PreviewPolicy())
+    message.add_series(pd.Series([1.5, 2.5], name="s"))
+    message.add_matplotlib_figure(fig)
+    message.add_plotly_figure(go.Figure(go.Bar(y=[1, 2])))
+    message.add_metric(42, "Answer", delta=1)
+    message.add_list(["item", pd.DataFrame({"b": [3]})])
+    message.add_dict({"x": 1, 2: "two"}, is_json=True)
+    return history
+
+
+def test_save_and_load_round_trip(tmp_path):
+    path = str(tmp_path / "chat.srmh")
+    history = make_history()
+    history.save(path)
+
+    loaded = MessageHistory.load(path)
+
+    assert [type(m) for m in loaded.messages] == [UserMessage, AssistantMessage]
+    original = history.messages[1].components
+    components = loaded.messages[1].components
+    assert [c.component_type for c in components] == [
+        c.component_type for c in original
+    ]
+    assert components[0].content == "Here you go"
+    assert components[0].title == "Intro"
+    assert components[0].description == "Summary"
+    assert components[1].kwargs["language"] == "python"
+    # Options that are not JSON-serializable are dropped
+    assert "preview" not in components[2].kwargs
+    assert components[6].kwargs["delta"] == 1
+
+    # Heavy payloads are only read when needed
+    for index in (2, 3, 4, 5, 7):
+        assert isinstance(components[index].content, ArchivedPayload)
+    assert components[8].content == {"x": 1, 2: "two"}
+
+    pd.testing.assert_frame_equal(components[2].content.read(), original[2].content)
+    pd.testing.assert_series_equal(components[3].content.read(), original[3].content)
+    assert isinstance(components[4].content.read(), RasterizedFigure)
+    assert isinstance(components[5].content.read(), SerializedPlotlyFigure)
+    items = components[7].content.read()
+    assert items[0] == "item"
+    pd.testing.assert_frame_equal(items[1], pd.DataFrame({"b": [3]}))
+
+
+@patch("streamlit_rich_message_history.renderers.st")
+def test_loaded_payload_read_on_render(mock_st, tmp_path):
+    path = str(tmp_path / "chat.srmh")
+    make_history().save(path)
+    component = MessageHistory.load(path).messages[1].components[2]
+
+    component.render()
+
+    assert isinstance(component.content, pd.DataFrame)
+    mock_st.dataframe.assert_called_once()
+
+
+def test_manifest_is_versioned(tmp_path):
+    path = str(tmp_path / "chat.srmh")
+    make_history().save(path)
+
+    with zipfile.ZipFile(path) as archive:
+        manifest = json.loads(archive.read("manifest.json"))
+        # Payloads are stored as is, they are compressed already
+        payloads = [i for i in archive.infolist() if i.filename != "manifest.json"]
+    assert manifest["version"] == FORMAT_VERSION
+    assert all(i.compress_type == zipfile.ZIP_STORED for i in payloads)
+
+    manifest["version"] = FORMAT_VERSION + 1
+    with zipfile.ZipFile(path, "w") as archive:
+        archive.writestr("manifest.json", json.dumps(manifest))
+    with pytest.raises(ValueError, match="newer"):
+        MessageHistory.load(path)
+
+
+def test_save_over_loaded_archive(tmp_path):
+    path = str(tmp_path / "chat.srmh")
+    make_history().save(path)
+    history = MessageHistory.load(path)
+    history.messages[1].add_text("One more thing")
+
+    history.save(path)
+
+    content = history.messages[1].components[2].content
+    assert isinstance(content, ArchivedPayload)
+    assert list(content.read()["a"]) == [1, 2]
+    assert len(MessageHistory.load(path).messages[1].components) == 10
+
+
+def test_unsupported_content_not_saved(tmp_path):
+    history = MessageHistory()
+    MessageHistory.register_component_type("unsaveable")
+    history.add_assistant_message_create("🤖").add_custom(object(), "unsaveable")
+
+    with pytest.raises(TypeError):
+        history.save(str(tmp_path / "chat.srmh"))
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_numpy_scalars_saved_as_python_scalars(tmp_path):
+    import numpy as np
+
+    history = MessageHistory()
+    message = history.add_assistant_message_create("🤖")
+    message.add_metric(np.int64(42), "Answer")
+    message.add_dict({np.int32(1): np.float32(0.5), "flag": np.bool_(True)})
+    path = str(tmp_path / "chat.srmh")
+    history.save(path)
+
+    loaded = MessageHistory.load(path).messages[0].components
+    assert loaded[0].content == 42 and type(loaded[0].content) is int
+    assert loaded[1].content == {1: 0.5, "flag": True}
+
+
+def test_custom_component_type_round_trip(tmp_path):
+    path = str(tmp_path / "chat.srmh")
+    history = MessageHistory()
+    custom_type = MessageHistory.register_component_type("saved_custom")
+    history.add_assistant_message_create("🤖").add_custom("data", "saved_custom")
+    history.save(path)
+
+    component = MessageHistory.load(path).messages[0].components[0]
+    assert component.component_type is custom_type
+    assert component.component_type != ComponentType.TEXT
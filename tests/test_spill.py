@@ -0,0 +1,180 @@
+import os
+from unittest.mock import patch
+
+import matplotlib.pyplot as plt
+import pandas as pd
+import plotly.graph_objects as go
+import pytest
+
+from streamlit_rich_message_history import Message, MessageComponent, MessageHistory
+from streamlit_rich_message_history.figures import (
+    RasterizedFigure,
+    SerializedPlotlyFigure,
+)
+from streamlit_rich_message_history.frames import to_arrow_frame
+from streamlit_rich_message_history.spill import (
+    DeferredPayload,
+    SpilledPayload,
+    spill_payload,
+)
+
+
+def test_spill_and_load_frames(tmp_path):
+    df = pd.DataFrame({"a": [1, 2], "b": ["x", "y"]}, index=[10, 20])
+    series = pd.Series([1.5, 2.5], name=3)
+
+    for content in (df, series):
+        payload = spill_payload(content, str(tmp_path))
+        assert os.path.exists(payload.path)
+        loaded = payload.load()
+        # The file is kept until the payload is discarded
+        assert os.path.exists(payload.path)
+        payload.discard()
+        assert not os.path.exists(payload.path)
+        if isinstance(content, pd.Series):
+            pd.testing.assert_series_equal(loaded, content)
+        else:
+            pd.testing.assert_frame_equal(loaded, content)
+
+    frame = to_arrow_frame(df)
+    assert spill_payload(frame, str(tmp_path)).load().data == frame.data
+
+
+def test_spill_and_load_figures(tmp_path):
+    fig, ax = plt.subplots()
+    ax.plot([1, 2, 3])
+    plotly_fig = go.Figure(go.Bar(y=[1, 2]))
+
+    image = spill_payload(fig, str(tmp_path)).load()
+    spec = spill_payload(plotly_fig, str(tmp_path)).load()
+
+    assert isinstance(image, RasterizedFigure) and image.format == "png"
+    assert isinstance(spec, SerializedPlotlyFigure)
+    assert spec.spec == plotly_fig.to_json()
+
+
+def test_small_and_unsupported_content_not_spilled(tmp_path):
+    assert spill_payload("text", str(tmp_path)) is None
+    # Parquet cannot store a column of mixed Python objects
+    mixed = pd.DataFrame({"a": [object(), object()]})
+    assert spill_payload(mixed, str(tmp_path)) is None
+    assert os.listdir(tmp_path) == []
+
+
+@patch("streamlit_rich_message_history.renderers.st")
+def test_spilled_component_reloaded_on_render(mock_st, tmp_path):
+    df = pd.DataFrame({"a": range(100)})
+    component = MessageComponent(df)
+
+    assert component.spill(str(tmp_path))
+    assert component.is_spilled
+    assert component.memory_usage() < df.memory_usage().sum()
+
+    component.render()
+
+    assert not component.is_spilled
+    pd.testing.assert_frame_equal(mock_st.dataframe.call_args[0][0], df)
+
+
+@patch.object(Message, "render")
+def test_history_spills_least_recently_rendered(mock_render, tmp_path):
+    history = MessageHistory(spill_dir=str(tmp_path), spill_threshold=1000)
+    messages = []
+    for _ in range(3):
+        message = history.add_assistant_message_create("🤖")
+        message.add_text("Here is a frame")
+        message.add_dataframe(pd.DataFrame({"a": range(500)}))
+        messages.append(message)
+
+    # Render the first message last, making the second the least recent
+    history.render_last(2)
+    history._render_message(messages[0])
+    history.memory_budget = 10_000
+    assert history.enforce_memory_budget() == 1
+
+    spilled = [m.components[1].is_spilled for m in messages]
+    assert spilled == [False, True, False]
+    assert not any(m.components[0].is_spilled for m in messages)
+    assert history.memory_usage()["total"] <= 10_000
+
+    history.clear()
+    assert os.listdir(tmp_path) == []
+
+
+@patch("streamlit_rich_message_history.renderers.st")
+def test_spill_file_reused_until_content_changes(mock_st, tmp_path):
+    component = MessageComponent(pd.DataFrame({"a": range(100)}))
+    assert component.spill(str(tmp_path))
+    path = component.content.path
+
+    component.render()
+    component.memory_usage()
+    with patch("streamlit_rich_message_history.components.spill_payload") as spill:
+        assert component.spill(str(tmp_path))
+    # The file is neither encoded nor written again, nor the content re-measured
+    spill.assert_not_called()
+    assert component.content.path == path
+    assert component.content.sizes
+
+    component.render()
+    component.content["b"] = 1
+    assert component.spill(str(tmp_path))
+    assert component.content.path != path
+    assert os.listdir(tmp_path) == [os.path.basename(component.content.path)]
+    component.render()
+    assert list(mock_st.dataframe.call_args[0][0].columns) == ["a", "b"]
+
+
+@patch("streamlit_rich_message_history.renderers.st")
+def test_history_keeps_spill_files_across_reruns(mock_st, tmp_path):
+    history = MessageHistory(
+        memory_budget=1000, spill_dir=str(tmp_path), spill_threshold=1000
+    )
+    message = history.add_assistant_message_create("🤖")
+    message.add_dataframe(pd.DataFrame({"a": range(500)}))
+    history.render_all()
+    (name,) = os.listdir(tmp_path)
+
+    with patch("streamlit_rich_message_history.components.spill_payload") as spill:
+        history.render_all()
+    spill.assert_not_called()
+    assert message.components[0].is_spilled
+    assert os.listdir(tmp_path) == [name]
+
+    history.clear()
+    assert os.listdir(tmp_path) == []
+
+
+@patch.object(Message, "render")
+def test_history_render_times_do_not_keep_messages_alive(mock_render):
+    history = MessageHistory()
+    message = history.add_assistant_message_create("🤖")
+    history._render_message(message)
+    assert history._last_rendered[message] == 0
+
+    history.messages.pop()
+    del message
+    assert len(history._last_rendered) == 0
+
+
+def test_history_without_budget_never_spills():
+    history = MessageHistory()
+    history.add_assistant_message_create("🤖").add_dataframe(
+        pd.DataFrame({"a": range(100_000)})
+    )
+
+    assert history.enforce_memory_budget() == 0
+
+
+def test_deferred_payload_requires_read():
+    class NoRead(DeferredPayload):
+        __slots__ = ()
+
+    with pytest.raises(TypeError):
+        NoRead()
+
+
+@pytest.mark.parametrize("kind", ["png", "svg"])
+def test_spilled_payload_repr(tmp_path, kind):
+    payload = SpilledPayload(str(tmp_path / "x"), kind)
+    assert kind in repr(payload)
@@ -0,0 +1,247 @@
+from unittest.mock import patch
+
+import pandas as pd
+import pytest
+
+from streamlit_rich_message_history import AssistantMessage, MessageHistory, UserMessage
+from streamlit_rich_message_history.messages import Message
+from streamlit_rich_message_history.sqlite_store import (
+    SQLiteMessageStore,
+    StoredPayload,
+)
+
+
+def make_message(text, rows=3):
+    message = UserMessage("😈", text)
+    message.add_dataframe(pd.DataFrame({"a": range(rows)}))
+    return message
+
+
+def make_store(path, n=5, conversation_id="default"):
+    store = SQLiteMessageStore(str(path), conversation_id)
+    for i in range(n):
+        if i % 2:
+            message = AssistantMessage("🤖")
+            message.add_text(f"Message {i}")
+            store.append(message)
+        else:
+            store.append(make_message(f"Message {i}"))
+    return store
+
+
+def texts(messages):
+    return [message.components[0].content for message in messages]
+
+
+def test_reopen_decodes_lazily(tmp_path):
+    path = tmp_path / "chat.db"
+    make_store(path).close()
+
+    store = SQLiteMessageStore(str(path))
+    assert len(store) == 5
+    assert store.materialized == []
+
+    message = store[-1]
+    assert message.components[0].content == "Message 4"
+    assert [position for position, _ in store.materialized] == [4]
+    payload = message.components[1].content
+    assert isinstance(payload, StoredPayload)
+    pd.testing.assert_frame_equal(payload.read(), pd.DataFrame({"a": range(3)}))
+
+
+def test_queries(tmp_path):
+    store = make_store(tmp_path / "chat.db", n=7)
+
+    assert texts(store[2:4]) == ["Message 2", "Message 3"]
+    assert texts(store.last(2)) == ["Message 5", "Message 6"]
+    assert texts(store.page(1, page_size=3)) == ["Message 3", "Message 4", "Message 5"]
+    assert store.page(5, page_size=3) == []
+    assert texts(store.by_role("assistant")) == ["Message 1", "Message 3", "Message 5"]
+    assert texts(store.by_role("user", limit=2)) == ["Message 4", "Message 6"]
+
+
+def test_conversations_are_separate(tmp_path):
+    path = tmp_path / "chat.db"
+    make_store(path, n=2, conversation_id="a")
+    make_store(path, n=3, conversation_id="b")
+
+    assert SQLiteMessageStore.conversations(str(path)) == ["a", "b"]
+    assert len(SQLiteMessageStore(str(path), "a")) == 2
+    assert len(SQLiteMessageStore(str(path), "b")) == 3
+
+
+def test_insert_delete_and_replace(tmp_path):
+    store = make_store(tmp_path / "chat.db", n=3)
+    removed = store[0]
+    del store[0]
+    store.insert(1, make_message("Inserted"))
+    store[0] = make_message("Replaced")
+
+    assert texts(store) == ["Replaced", "Inserted", "Message 2"]
+    # Removed messages no longer refer to the store
+    assert isinstance(removed.components[1].content, pd.DataFrame)
+
+    del store[1:]
+    assert texts(store) == ["Replaced"]
+
+
+def test_sync_writes_added_components(tmp_path):
+    path = tmp_path / "chat.db"
+    make_store(path, n=1).close()
+    store = SQLiteMessageStore(str(path))
+    message = store[0]
+    query = "SELECT rowid, message_id, idx FROM components ORDER BY idx"
+    before = store._conn.execute(query).fetchall()
+    (payload_id,) = store._conn.execute("SELECT id FROM payloads").fetchone()
+    message.add_text("Streamed")
+
+    assert store.sync() == 1
+    assert store.sync() == 0
+    # Only the row of the added component is written
+    after = store._conn.execute(query).fetchall()
+    assert after[:-1] == before and after[-1][2] == len(before)
+    assert store._conn.execute("SELECT id FROM payloads").fetchall() == [(payload_id,)]
+    # Payloads of the rewritten message stay readable
+    pd.testing.assert_frame_equal(
+        message.components[1].content.read(), pd.DataFrame({"a": range(3)})
+    )
+
+    reopened = SQLiteMessageStore(str(path))
+    assert reopened[0].components[-1].content == "Streamed"
+    (payloads,) = reopened._conn.execute("SELECT COUNT(*) FROM payloads").fetchone()
+    assert payloads == 1
+
+
+def test_sync_rewrites_message_with_removed_components(tmp_path):
+    path = tmp_path / "chat.db"
+    store = make_store(path, n=1)
+    message = store[0]
+    message.add_text("Extra")
+    store.sync()
+    del message.components[1:]
+
+    assert store.sync() == 1
+    reopened = SQLiteMessageStore(str(path))
+    assert [c.content for c in reopened[0].components] == ["Message 0"]
+    (payloads,) = reopened._conn.execute("SELECT COUNT(*) FROM payloads").fetchone()
+    assert payloads == 0
+
+
+def test_cache_keeps_recently_used_messages(tmp_path):
+    path = tmp_path / "chat.db"
+    make_store(path, n=10).close()
+    store = SQLiteMessageStore(str(path), cache_size=3)
+
+    assert texts(store) == [f"Message {i}" for i in range(10)]
+    assert [position for position, _ in store.materialized] == [7, 8, 9]
+
+    first = store[7]
+    assert store[7] is first
+    store[0]
+    store[1]
+    assert [position for position, _ in store.materialized] == [0, 1, 7]
+    store[2]
+    assert store[7] is not first
+
+
+def test_evicted_message_is_synced(tmp_path):
+    path = tmp_path / "chat.db"
+    make_store(path, n=3).close()
+    store = SQLiteMessageStore(str(path), cache_size=2)
+    store[0].add_text("Added")
+
+    store[1]
+    store[2]
+    assert [position for position, _ in store.materialized] == [1, 2]
+    store.close()
+
+    assert SQLiteMessageStore(str(path))[0].components[-1].content == "Added"
+
+
+def test_cache_size_must_be_positive(tmp_path):
+    with pytest.raises(ValueError, match="cache_size"):
+        SQLiteMessageStore(str(tmp_path / "chat.db"), cache_size=0)
+
+
+def test_component_keys_survive_reopen(tmp_path):
+    path = tmp_path / "chat.db"
+    store = make_store(path, n=1)
+    key = store[0].components[1].key
+    store.close()
+
+    assert SQLiteMessageStore(str(path))[0].components[1].key == key
+
+
+def test_database_without_component_keys_is_migrated(tmp_path):
+    path = tmp_path / "chat.db"
+    make_store(path, n=1).close()
+    store = SQLiteMessageStore(str(path))
+    with store._conn:
+        store._conn.execute("ALTER TABLE components DROP COLUMN component_key")
+    store.close()
+
+    store = SQLiteMessageStore(str(path))
+    assert store[0].components[1].key
+    store.append(make_message("New"))
+    assert store[1].components[0].content == "New"
+
+
+def test_unsupported_content_is_not_stored(tmp_path):
+    store = SQLiteMessageStore(str(tmp_path / "chat.db"))
+    message = UserMessage("😈", "Hello")
+    message.add_dict({"x": object()})
+
+    with pytest.raises(TypeError):
+        store.insert(0, message)
+    assert len(store) == 0
+
+
+def test_clear_only_affects_conversation(tmp_path):
+    path = tmp_path / "chat.db"
+    store = make_store(path, n=2, conversation_id="a")
+    make_store(path, n=2, conversation_id="b")
+    store.clear()
+
+    assert len(store) == 0
+    assert len(SQLiteMessageStore(str(path), "b")) == 2
+
+
+@patch.object(Message, "render")
+@patch("streamlit_rich_message_history.history.st")
+def test_history_with_database(mock_st, mock_render, tmp_path):
+    mock_st.session_state = {}
+    path = str(tmp_path / "chat.db")
+    history = MessageHistory(db_path=path, conversation_id="session-1")
+    for i in range(4):
+        history.add_user_message_create("😈", f"Question {i}")
+        answer = history.add_assistant_message_create("🤖")
+        answer.add_text(f"Answer {i}")
+    history.render_last(2)
+
+    reopened = MessageHistory(db_path=path, conversation_id="session-1")
+    assert len(reopened.messages) == 8
+    assert texts(reopened.messages_by_role("assistant", limit=1)) == ["Answer 3"]
+    reopened.render_window(page_size=3)
+    assert [entry["index"] for entry in reopened.memory_usage()["messages"]] == [
+        5,
+        6,
+        7,
+    ]
+
+
+def test_history_messages_by_role_in_memory():
+    history = MessageHistory()
+    for i in range(3):
+        history.add_user_message_create("😈", f"Question {i}")
+    history.add_error_message("⚠️", "Oops")
+
+    assert texts(history.messages_by_role("user", limit=2)) == [
+        "Question 1",
+        "Question 2",
+    ]
+    assert history.messages_by_role("user", limit=0) == []
+
+
+def test_history_rejects_two_stores(tmp_path):
+    with pytest.raises(ValueError):
+        MessageHistory(log_path=str(tmp_path / "a"), db_path=str(tmp_path / "b"))